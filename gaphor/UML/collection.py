@@ -48,16 +48,154 @@ class collectionlist(recursemixin, querymixin, getslicefix, list):
     """
 
 
+# The storage of empty collectionsets, never modified
+_no_items = ()
+_no_positions = {}
+
+
+class collectionset(object):
+    """
+    Ordered set: the items are kept in the order they are added, while
+    membership tests and removal take constant time.
+
+    Removed items leave a hole (None) in the item list, the holes are
+    cleared out when there are many of them, or when an item is looked up
+    by position. Items can be removed while the set is iterated.
+
+    An empty set shares its (empty) storage with all other empty sets, the
+    storage is allocated on the first append.
+
+    >>> c = collectionset()
+    >>> c.append('a')
+    >>> c.append('b')
+    >>> c.append('c')
+    >>> c.remove('b')
+    >>> c
+    ['a', 'c']
+    >>> 'b' in c, 'c' in c
+    (False, True)
+    >>> c[1], c.index('c')
+    ('c', 1)
+    >>> c[:]   # doctest: +ELLIPSIS
+    <gaphor.misc.listmixins.recurseproxy object at 0x...>
+    """
+
+    __slots__ = ("_items", "_positions", "_holes")
+
+    def __init__(self, items=()):
+        self._items = _no_items
+        # item: position in _items
+        self._positions = _no_positions
+        self._holes = 0
+        for item in items:
+            self.append(item)
+
+    def _compact(self):
+        if self._holes:
+            self._items = [i for i in self._items if i is not None]
+            self._positions = dict((item, n) for n, item in enumerate(self._items))
+            self._holes = 0
+        return self._items
+
+    def append(self, item):
+        if item not in self._positions:
+            if self._positions is _no_positions:
+                self._items = []
+                self._positions = {}
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def remove(self, item):
+        try:
+            n = self._positions.pop(item)
+        except KeyError:
+            raise ValueError("%s not in collection" % (item,))
+        items = self._items
+        if not self._positions:
+            # Give the storage back
+            self._items = _no_items
+            self._positions = _no_positions
+            self._holes = 0
+        elif n == len(items) - 1:
+            items.pop()
+            while items and items[-1] is None:
+                items.pop()
+                self._holes -= 1
+        else:
+            items[n] = None
+            self._holes += 1
+            if self._holes > len(self._positions):
+                self._compact()
+
+    def index(self, item):
+        if item not in self._positions:
+            raise ValueError("%s not in collection" % (item,))
+        self._compact()
+        return self._positions[item]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __bool__(self):
+        return bool(self._positions)
+
+    # Maintains Python2 Compatibility
+    __nonzero__ = __bool__
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def __iter__(self):
+        # Items can be removed while the set is iterated, and the item list
+        # may be compacted meanwhile: skip items that are no longer there
+        for item in self._items:
+            if item is not None and item in self._positions:
+                yield item
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._compact()[key]
+        # Slices and queries
+        return collectionlist(self._compact())[key]
+
+    def __setitem__(self, n, item):
+        items = self._compact()
+        old = items[n]
+        if self._positions.get(old) == n:
+            del self._positions[old]
+        items[n] = item
+        self._positions[item] = n
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    __str__ = __repr__
+
+
 class collection(object):
     """
     Collection (set-like) for model elements' 1:n and n:m relationships.
     """
 
+    __slots__ = ("property", "object", "type", "items")
+
     def __init__(self, property, object, type):
         self.property = property
         self.object = object
         self.type = type
-        self.items = collectionlist()
+        self.items = collectionset()
 
     def __len__(self):
         return len(self.items)
@@ -83,7 +221,7 @@ class collection(object):
     __repr__ = __str__
 
     def __bool__(self):
-        return self.items != []
+        return bool(self.items)
 
     # Maintains Python2 Compatibility
     __nonzero__ = __bool__
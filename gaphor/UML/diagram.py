@@ -7,10 +7,10 @@ The DiagramCanvas class extends the gaphas.Canvas class.
 
 from builtins import str
 from builtins import filter
-import uuid
 
 import gaphas
 
+from gaphor.UML.idallocator import new_id
 from gaphor.UML.uml2 import Namespace, PackageableElement
 
 
@@ -27,6 +27,7 @@ class DiagramCanvas(gaphas.Canvas):
         super(DiagramCanvas, self).__init__()
         self._diagram = diagram
         self._block_updates = False
+        self._revision = 0
 
     diagram = property(lambda s: s._diagram)
 
@@ -47,6 +48,30 @@ class DiagramCanvas(gaphas.Canvas):
             return
         super(DiagramCanvas, self).update_now()
 
+    def _update_views(self, dirty_items=(), dirty_matrix_items=(), removed_items=()):
+        """Count the changes made to the canvas, then notify the views."""
+
+        self._revision += 1
+        super(DiagramCanvas, self)._update_views(
+            dirty_items, dirty_matrix_items, removed_items
+        )
+
+    def reparent(self, item, parent, index=None):
+        """Set a new parent for an item."""
+
+        self._revision += 1
+        super(DiagramCanvas, self).reparent(item, parent, index)
+
+    def _get_revision(self):
+        """A number that changes every time the canvas items change. As long
+        as updates are pending the revision changes on every request."""
+
+        if self._dirty_items or self._dirty_matrix_items:
+            self._revision += 1
+        return self._revision
+
+    revision = property(_get_revision)
+
     def save(self, save_func):
         """Apply the supplied save function to all root diagram items."""
 
@@ -73,18 +98,43 @@ class Diagram(Namespace, PackageableElement):
         The diagram also has a canvas."""
 
         super(Diagram, self).__init__(id, factory)
-        self.canvas = DiagramCanvas(self)
+        self._canvas = DiagramCanvas(self)
+        self._canvas_loader = None
+
+    def _get_canvas(self):
+        """The diagram canvas. If the canvas items have not been loaded yet,
+        the canvas loader is invoked first (see storage.load(lazy=True))."""
+
+        if self._canvas_loader is not None:
+            self._canvas_loader.load()
+        return self._canvas
+
+    canvas = property(_get_canvas)
+
+    def _set_canvas_loader(self, loader):
+        """Set an object that creates the canvas items once the canvas is
+        requested. The loader should have a load() method, which resets
+        the canvas_loader to None, and a save() method that saves the
+        canvas content. Until the canvas is loaded, the loader is saved
+        in place of the canvas."""
+
+        self._canvas_loader = loader
+
+    canvas_loader = property(lambda s: s._canvas_loader, _set_canvas_loader)
 
     def save(self, save_func):
         """Apply the supplied save function to this diagram and the canvas."""
 
         super(Diagram, self).save(save_func)
-        save_func("canvas", self.canvas)
+        if self._canvas_loader is not None:
+            save_func("canvas", self._canvas_loader)
+        else:
+            save_func("canvas", self._canvas)
 
     def postload(self):
         """Handle post-load functionality for the diagram canvas."""
         super(Diagram, self).postload()
-        self.canvas.postload()
+        self._canvas.postload()
 
     def create(self, type, parent=None, subject=None):
         """Create a new canvas item on the canvas. It is created with
@@ -93,14 +143,16 @@ class Diagram(Namespace, PackageableElement):
         optional parent and subject."""
 
         assert issubclass(type, gaphas.Item)
-        obj = type(str(uuid.uuid1()))
+        obj = type(new_id())
         if subject:
             obj.subject = subject
         self.canvas.add(obj, parent)
         return obj
 
     def unlink(self):
-        """Unlink all canvas items then unlink this diagram."""
+        """Unlink all canvas items then unlink this diagram. Canvas items
+        that have not been loaded yet are loaded first, so unlinking them
+        can be undone."""
 
         for item in self.canvas.get_all_items():
             try:
@@ -5,16 +5,104 @@ Base class for UML model elements.
 
 __all__ = ["Element"]
 
-import threading
-import uuid
-
 from builtins import object
 from builtins import str
+from future.utils import with_metaclass
+
+from gaphor.UML.properties import (
+    association,
+    associationstub,
+    attribute,
+    derived,
+    enumeration,
+    redefine,
+    umlproperty,
+)
+from gaphor.UML.idallocator import new_id
 
-from gaphor.UML.properties import umlproperty
+# class: PropertyTable
+_property_tables = {}
 
 
-class Element(object):
+class PropertyTable(object):
+    """
+    The UML properties of a class, by kind. Each kind is a tuple, ordered
+    by property name.
+
+    ``saved``, ``postloaded`` and ``unlinked`` hold the properties that
+    take part in saving, postloading and unlinking an element.
+    ``references`` holds the associations, where redefined associations
+    are replaced by the association they redefine.
+    """
+
+    def __init__(self, cls):
+        props = []
+        for name in dir(cls):
+            if not name.startswith("_"):
+                prop = getattr(cls, name)
+                if isinstance(prop, umlproperty):
+                    props.append(prop)
+        self.all = tuple(props)
+
+        def select(*kinds):
+            return tuple(p for p in props if isinstance(p, kinds))
+
+        self.attributes = select(attribute, enumeration)
+        self.associations = select(association)
+        self.derived = select(derived)
+        self.redefines = select(redefine)
+        self.stubs = select(associationstub)
+
+        self.saved = select(attribute, enumeration, association, redefine)
+        self.postloaded = select(association, derived, redefine)
+        self.unlinked = select(association, associationstub, redefine)
+
+        references = {}
+        for prop in self.associations + self.redefines:
+            while isinstance(prop, redefine) and prop.original.name == prop.name:
+                prop = prop.original
+            if isinstance(prop, association):
+                references[prop.name] = prop
+        self.references = tuple(references[name] for name in sorted(references))
+
+
+def property_table(cls):
+    """
+    Return the PropertyTable of element class ``cls``.
+    """
+    try:
+        return _property_tables[cls]
+    except KeyError:
+        table = _property_tables[cls] = PropertyTable(cls)
+        return table
+
+
+class ElementMeta(type):
+    """
+    Metaclass of the elements. The property tables of a class and its
+    subclasses are dropped when a UML property is set on or removed from
+    the class.
+    """
+
+    def __setattr__(cls, name, value):
+        old = cls.__dict__.get(name)
+        type.__setattr__(cls, name, value)
+        if isinstance(value, umlproperty) or isinstance(old, umlproperty):
+            cls._invalidate_property_tables()
+
+    def __delattr__(cls, name):
+        old = cls.__dict__.get(name)
+        type.__delattr__(cls, name)
+        if isinstance(old, umlproperty):
+            cls._invalidate_property_tables()
+
+    def _invalidate_property_tables(cls):
+        for c in list(_property_tables):
+            if issubclass(c, cls):
+                del _property_tables[c]
+
+
+class Element(with_metaclass(ElementMeta, object)):
     """
     Base class for UML data classes.
     """
@@ -32,10 +120,9 @@ class Element(object):
         Factory can be provided to refer to the class that maintains the
         lifecycle of the element.
         """
-        self._id = id or (id is not False and str(uuid.uuid1()) or False)
+        self._id = id or (id is not False and new_id() or False)
         # The factory this element belongs to.
         self._factory = factory
-        self._unlink_lock = threading.Lock()
 
     id = property(lambda self: self._id, doc="Id")
 
@@ -47,19 +134,13 @@ class Element(object):
         """
         Iterate over all UML properties
         """
-        umlprop = umlproperty
-        class_ = type(self)
-        for propname in dir(class_):
-            if not propname.startswith("_"):
-                prop = getattr(class_, propname)
-                if isinstance(prop, umlprop):
-                    yield prop
+        return iter(property_table(type(self)).all)
 
     def save(self, save_func):
         """
         Save the state by calling save_func(name, value).
         """
-        for prop in self.umlproperties():
+        for prop in property_table(type(self)).saved:
             prop.save(self, save_func)
 
     def load(self, name, value):
@@ -80,29 +161,29 @@ class Element(object):
         """
         Fix up the odds and ends.
         """
-        for prop in self.umlproperties():
+        for prop in property_table(type(self)).postloaded:
             prop.postload(self)
 
-    def unlink(self):
+    # Set on the element while it is unlinked
+    _unlinking = False
 
+    def unlink(self):
         """Unlink the element. All the elements references are destroyed.
 
-        The unlink lock is acquired while unlinking this elements properties
-        to avoid recursion problems."""
-
-        if self._unlink_lock.locked():
-
+        The element is flagged while its properties are unlinked, to avoid
+        recursion problems."""
+        if self._unlinking:
             return
 
-        with self._unlink_lock:
-
-            for prop in self.umlproperties():
-
+        self._unlinking = True
+        try:
+            for prop in property_table(type(self)).unlinked:
                 prop.unlink(self)
 
             if self._factory:
-
                 self._factory._unlink_element(self)
+        finally:
+            del self._unlinking
 
     # OCL methods: (from SMW by Ivan Porres (http://www.abo.fi/~iporres/smw))
 
@@ -7,7 +7,6 @@ from builtins import object
 from builtins import str
 from zope.interface import implementer
 from zope import component
-import uuid
 from gaphor.core import inject
 from gaphor.misc import odict
 from gaphor.interfaces import IService, IEventFilter
@@ -22,11 +21,164 @@ from gaphor.UML.interfaces import (
 from gaphor.UML.event import (
     ElementCreateEvent,
     ElementDeleteEvent,
+    ElementsCreateEvent,
+    ElementsDeleteEvent,
     FlushFactoryEvent,
     ModelFactoryEvent,
 )
-from gaphor.UML.element import Element
+from gaphor.UML.element import Element, property_table
+from gaphor.UML.idallocator import new_id, new_ids
 from gaphor.UML.diagram import Diagram
+from gaphor.UML.properties import association, attribute, enumeration
+import gaphas
+
+# class: the classes it is registered as in the factory
+_element_classes = {}
+
+
+def element_classes(cls):
+    """
+    Return the classes in the MRO of ``cls`` that are Element subclasses.
+    Element itself is left out: all elements are instances of Element.
+    """
+    try:
+        return _element_classes[cls]
+    except KeyError:
+        classes = tuple(
+            c for c in cls.__mro__ if issubclass(c, Element) and c is not Element
+        )
+        _element_classes[cls] = classes
+        return classes
+
+
+class ReferenceIndex(object):
+    """
+    Index of the references between elements: for each element the elements
+    that refer to it through an association. For bi-directional associations
+    both ends are recorded, so references from elements that are not in the
+    factory, like canvas items, are known as well.
+
+    Elements that were referred to while they were not part of the model
+    (according to ``is_live``) are remembered as suspects: they are the
+    candidate orphans.
+    """
+
+    def __init__(self, is_live):
+        self.is_live = is_live
+        # target id: {(source id, property name): source}
+        self._referrers = {}
+        # id: element
+        self._suspects = {}
+
+    def add(self, source, name, target):
+        if not self.is_live(target):
+            self._suspects[target.id] = target
+        key = (source.id, name)
+        try:
+            self._referrers[target.id][key] = source
+        except KeyError:
+            self._referrers[target.id] = odict.odict({key: source})
+
+    def remove(self, source, name, target):
+        target_id = target.id
+        refs = self._referrers.get(target_id)
+        if refs:
+            refs.pop((source.id, name), None)
+            if not refs:
+                del self._referrers[target_id]
+
+    def add_element(self, element):
+        """
+        Add the references of ``element``.
+        """
+        for prop in property_table(type(element)).references:
+            values = getattr(element, prop._name, None)
+            if not values:
+                continue
+            if prop.upper == 1:
+                values = (values,)
+            name = prop.name
+            opposite = prop.opposite
+            for value in values:
+                self.add(element, name, value)
+                if opposite:
+                    self.add(value, opposite, element)
+
+    def referrers(self, element):
+        refs = self._referrers.get(element.id)
+        if not refs:
+            return []
+        return list(odict.odict((s.id, s) for s in refs.values()).values())
+
+    def is_referred(self, element):
+        return element.id in self._referrers
+
+    def suspect(self, element):
+        self._suspects[element.id] = element
+
+
+class AttributeIndex(object):
+    """
+    Index of elements by the value of a property (an attribute, enumeration
+    or association). Elements with a multi-valued association are indexed
+    by each element in the association.
+    """
+
+    def __init__(self, prop):
+        if not isinstance(prop, (attribute, enumeration, association)):
+            raise TypeError("Can not index %s" % prop)
+        self.prop = prop
+        self._many = isinstance(prop, association) and prop.upper != 1
+        # value: {id: element}
+        self._elements = {}
+        # id: values the element is indexed by
+        self._keys = {}
+        # class: True if the property is a property of class
+        self._applies = {}
+
+    def applies(self, element):
+        cls = type(element)
+        try:
+            return self._applies[cls]
+        except KeyError:
+            applies = getattr(cls, self.prop.name, None) is self.prop
+            self._applies[cls] = applies
+            return applies
+
+    def _values(self, element):
+        prop = self.prop
+        if self._many:
+            c = getattr(element, prop._name, None)
+            return tuple(c.items) if c else ()
+        return (prop._get(element),)
+
+    def add(self, element):
+        if not self.applies(element):
+            return
+        self.remove(element)
+        id = element.id
+        keys = self._keys[id] = self._values(element)
+        for key in keys:
+            try:
+                self._elements[key][id] = element
+            except KeyError:
+                self._elements[key] = odict.odict({id: element})
+
+    def remove(self, element):
+        id = element.id
+        keys = self._keys.pop(id, ())
+        for key in keys:
+            elements = self._elements[key]
+            del elements[id]
+            if not elements:
+                del self._elements[key]
+
+    def lookup(self, value):
+        """
+        Return the elements indexed by value, in the order they were indexed.
+        """
+        elements = self._elements.get(value)
+        return elements.values() if elements else []
 
 
 class ElementFactory(object):
@@ -41,17 +193,41 @@ class ElementFactory(object):
     model - a new model has been loaded (element is None)
     flush - model is flushed: all element are removed from the factory
             (element is None)
+
+    Elements are also registered per class (and superclass), so elements of
+    a specific type can be found without visiting the whole model (see
+    select_type()). A class is indexed once its elements are selected for
+    the first time, so only classes that are actually looked up add to the
+    cost of creating elements.
+
+    Additional indexes on attribute values can be added with add_index().
+
+    The references between elements are indexed the first time they are
+    queried (see referrers() and orphans()).
+
+    Many elements can be created and unlinked at once with create_many() and
+    unlink_many(). The service version of the factory sends one event for
+    the whole batch.
     """
 
     def __init__(self):
         self._elements = odict.odict()
+        # class: {id: element} for all elements that are instance of class,
+        # for the indexed classes
+        self._types = {}
+        # property: AttributeIndex
+        self._attribute_indexes = {}
+        # ReferenceIndex, once built
+        self._references = None
+        # The elements unlinked by unlink_many(), while it is running
+        self._deleted = None
         self._observers = list()
 
     def create(self, type):
         """
         Create a new model element of type ``type``.
         """
-        obj = self.create_as(type, str(uuid.uuid1()))
+        obj = self.create_as(type, new_id())
         return obj
 
     def create_as(self, type, id):
@@ -62,9 +238,41 @@ class ElementFactory(object):
         """
         assert issubclass(type, Element)
         obj = type(id, self)
-        self._elements[id] = obj
+        self._add_element(obj)
         return obj
 
+    def create_many(self, type, ids):
+        """
+        Create a model element of type ``type`` for each id in ``ids``. An id
+        None results in a new id. Returns the list of new elements.
+        """
+        ids = list(ids)
+        fresh = iter(new_ids(len([id for id in ids if not id])))
+        create_as = self.create_as
+        return [create_as(type, id or next(fresh)) for id in ids]
+
+    def unlink_many(self, elements):
+        """
+        Unlink all ``elements``. Returns the list of elements removed from
+        the factory, including those unlinked along with them (through
+        composite associations).
+        """
+        if self._deleted is not None:
+            # Part of a batch already
+            for element in list(elements):
+                element.unlink()
+            return []
+
+        deleted = self._deleted = []
+        try:
+            for element in list(elements):
+                element.unlink()
+        finally:
+            self._deleted = None
+            if deleted:
+                self._unlinked_many(deleted)
+        return deleted
+
     def bind(self, element):
         """
         Bind an already created element to the element factory.
@@ -76,7 +284,48 @@ class ElementFactory(object):
             raise AttributeError("an element already exists with the same id")
 
         element._factory = self
-        self._elements[element.id] = element
+        self._add_element(element)
+
+    def _add_element(self, element):
+        id = element.id
+        self._elements[id] = element
+        types = self._types
+        for cls in element_classes(type(element)):
+            elements = types.get(cls)
+            if elements is not None:
+                elements[id] = element
+        for index in self._attribute_indexes.values():
+            index.add(element)
+
+    def _remove_element(self, element):
+        id = element.id
+        if self._elements.get(id) is not element:
+            return
+        del self._elements[id]
+        types = self._types
+        for cls in element_classes(type(element)):
+            elements = types.get(cls)
+            if elements is not None:
+                del elements[id]
+        for index in self._attribute_indexes.values():
+            index.remove(element)
+        references = self._references
+        if references is not None and references.is_referred(element):
+            references.suspect(element)
+
+    def _index(self, type):
+        """
+        Return the {id: element} index of class ``type``.
+        """
+        if type is Element:
+            return self._elements
+        try:
+            return self._types[type]
+        except KeyError:
+            elements = self._types[type] = odict.odict(
+                (e.id, e) for e in self._elements.values() if isinstance(e, type)
+            )
+            return elements
 
     def size(self):
         """
@@ -113,6 +362,157 @@ class ElementFactory(object):
         """
         return list(self.select(expression))
 
+    def select_type(self, type):
+        """
+        Iterate elements that are an instance of class ``type``, in the
+        order they were created. Only the elements of that type are visited.
+        """
+        for e in self._index(type).values():
+            yield e
+
+    def count(self, type=None):
+        """
+        Return the amount of elements of class ``type``, or the amount of
+        all elements if no type is given.
+        """
+        if type is None:
+            return len(self._elements)
+        return len(self._index(type))
+
+    def add_index(self, prop):
+        """
+        Index the elements in the factory by the value of property ``prop``,
+        for example ``NamedElement.name``, so they can be found with
+        select_by(). The index is kept up to date when the property changes.
+        Adding an index that already exists does nothing.
+
+        Returns True if the index is added, so the caller that added it can
+        remove it with remove_index() once it is done.
+        """
+        if prop in self._attribute_indexes:
+            return False
+        self._attribute_indexes[prop] = self._build_index(prop)
+        return True
+
+    def has_index(self, prop):
+        """
+        Return True if the elements are indexed by property ``prop``.
+        """
+        return prop in self._attribute_indexes
+
+    def remove_index(self, prop):
+        """
+        Stop indexing property ``prop``.
+        """
+        self._attribute_indexes.pop(prop, None)
+
+    def _build_index(self, prop):
+        index = AttributeIndex(prop)
+        for element in self._elements.values():
+            index.add(element)
+        return index
+
+    def _update_indexes(self, event):
+        """
+        Update the indexes for the property changed by ``event``.
+        """
+        prop = getattr(event, "property", None)
+        index = self._attribute_indexes.get(prop)
+        if index is not None and self._elements.get(event.element.id) is event.element:
+            index.add(event.element)
+        references = self._references
+        if references is not None and isinstance(prop, association):
+            element = event.element
+            old_value = getattr(event, "old_value", None)
+            new_value = getattr(event, "new_value", None)
+            if old_value is not None:
+                references.remove(element, prop.name, old_value)
+                if prop.opposite:
+                    references.remove(old_value, prop.opposite, element)
+            if new_value is not None:
+                references.add(element, prop.name, new_value)
+                if prop.opposite:
+                    references.add(new_value, prop.opposite, element)
+
+    def reindex(self, element):
+        """
+        Update the indexes for ``element``, of which the values have been
+        loaded without sending change events.
+        """
+        if self._elements.get(element.id) is element:
+            for index in self._attribute_indexes.values():
+                index.add(element)
+        if self._references is not None:
+            self._references.add_element(element)
+
+    def _reference_index(self):
+        references = self._references
+        if references is None:
+            references = ReferenceIndex(self._is_live)
+            for element in self._elements.values():
+                references.add_element(element)
+            self._references = references
+        return references
+
+    def _is_live(self, element):
+        """
+        Return True if ``element`` is part of the model: it is in the
+        factory, or it is a canvas item on a canvas.
+        """
+        if self._elements.get(element.id) is element:
+            return True
+        return isinstance(element, gaphas.Item) and element.canvas is not None
+
+    def referrers(self, element):
+        """
+        Return the elements and canvas items that refer to ``element``
+        through an association.
+        """
+        return self._reference_index().referrers(element)
+
+    def is_orphan(self, element):
+        """
+        Return True if ``element`` is not part of the model, while elements
+        in the model refer to it.
+        """
+        return not self._is_live(element) and any(
+            self._is_live(r) for r in self.referrers(element)
+        )
+
+    def orphans(self):
+        """
+        Return the elements that are referred to from the model, but are
+        not part of it. Only elements that were referred to while they were
+        not in the model, or that were removed while they were referred to,
+        are checked.
+        """
+        references = self._reference_index()
+        suspects = references._suspects
+        orphans = []
+        for id, element in list(suspects.items()):
+            if self.is_orphan(element):
+                orphans.append(element)
+            elif self._is_live(element) or not references.is_referred(element):
+                del suspects[id]
+        return orphans
+
+    def select_by(self, prop, value):
+        """
+        Iterate the elements for which property ``prop`` has the value
+        ``value``, or, for multi-valued associations, contains ``value``.
+        The index of ``prop`` is used if one was added with add_index(),
+        otherwise all elements are visited.
+        """
+        index = self._attribute_indexes.get(prop)
+        if index is None:
+            index = AttributeIndex(prop)
+            for e in self._elements.values():
+                if index.applies(e) and value in index._values(e):
+                    yield e
+        else:
+            for e in index.lookup(value):
+                yield e
+
     def keys(self):
         """
         Return a list with all id's in the factory.
@@ -151,34 +551,61 @@ class ElementFactory(object):
         """
 
         flush_element = self._flush_element
-        for element in self.lselect(lambda e: isinstance(e, Diagram)):
-            element.canvas.block_updates = True
+        for element in list(self.select_type(Diagram)):
+            if element.canvas_loader is None:
+                element.canvas.block_updates = True
             flush_element(element)
 
         for element in self.lselect():
             flush_element(element)
+        self._references = None
 
     def _flush_element(self, element):
         element.unlink()
 
+    def notify_model(self):
+        """
+        Send notification that a new model has been loaded. The plain
+        element factory has no one to notify.
+        """
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self):
+        """
+        Elements are loaded without sending change events, so the indexes
+        are built again once a model is loaded.
+        """
+        for prop in list(self._attribute_indexes):
+            self._attribute_indexes[prop] = self._build_index(prop)
+        self._references = None
+
     def _unlink_element(self, element):
         """
         NOTE: Invoked from Element.unlink() to perform an element unlink.
         """
-        try:
-            del self._elements[element.id]
-        except KeyError:
-            pass
+        self._remove_element(element)
+        if self._deleted is not None:
+            self._deleted.append(element)
+
+    def _unlinked_many(self, elements):
+        """
+        NOTE: Invoked from unlink_many() once the elements are unlinked.
+        """
+        pass
 
     def swap_element(self, element, new_class):
-        assert element in list(self._elements.values())
+        assert self._elements.get(element.id) is element
         if element.__class__ is not new_class:
+            self._remove_element(element)
             element.__class__ = new_class
+            self._add_element(element)
 
     def _handle(self, event):
         """
         Handle events coming from elements.
         """
+        if self._attribute_indexes or self._references is not None:
+            self._update_indexes(event)
         # Invoke default handler, so properties get updated.
         component.handle(event)
 
@@ -205,6 +632,16 @@ class ElementFactoryService(ElementFactory):
         self.component_registry.handle(ElementCreateEvent(self, obj))
         return obj
 
+    def create_many(self, type, ids):
+        """
+        Create a model element of type ``type`` for each id in ``ids``. One
+        ElementsCreateEvent is sent for all elements.
+        """
+        elements = super(ElementFactoryService, self).create_many(type, ids)
+        if elements:
+            self.component_registry.handle(ElementsCreateEvent(self, elements))
+        return elements
+
     def flush(self):
         """Flush all elements (remove them from the factory).  First test
         if the element factory has a Gaphor application instance.  If yes,
@@ -233,19 +670,30 @@ class ElementFactoryService(ElementFactory):
         Send notification that a new model has been loaded by means of the
         ModelFactoryEvent event from gaphor.UML.event.
         """
+        self._rebuild_indexes()
         self.component_registry.handle(ModelFactoryEvent(self))
 
     def _unlink_element(self, element):
         """
         NOTE: Invoked from Element.unlink() to perform an element unlink.
+        Elements unlinked by unlink_many() are announced at once.
         """
-        self.component_registry.handle(ElementDeleteEvent(self, element))
+        if self._deleted is None:
+            self.component_registry.handle(ElementDeleteEvent(self, element))
         super(ElementFactoryService, self)._unlink_element(element)
 
+    def _unlinked_many(self, elements):
+        """
+        NOTE: Invoked from unlink_many() once the elements are unlinked.
+        """
+        self.component_registry.handle(ElementsDeleteEvent(self, elements))
+
     def _handle(self, event):
         """
         Handle events coming from elements (used internally).
         """
+        if self._attribute_indexes or self._references is not None:
+            self._update_indexes(event)
         self.component_registry.handle(event)
 
 
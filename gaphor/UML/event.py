@@ -4,10 +4,13 @@ from builtins import object
 
 from zope.interface import implementer
 
+from gaphor.misc.odict import odict
+
 from gaphor.UML.interfaces import (
     IAssociationAddEvent,
     IAssociationDeleteEvent,
     IElementCreateEvent,
+    IElementsCreateEvent,
 )
 from gaphor.UML.interfaces import (
     IAttributeChangeEvent,
@@ -15,9 +18,11 @@ from gaphor.UML.interfaces import (
     IAssociationSetEvent,
 )
 from gaphor.UML.interfaces import (
+    IElementChangeSetEvent,
     IElementFactoryEvent,
     IModelFactoryEvent,
     IElementDeleteEvent,
+    IElementsDeleteEvent,
     IFlushFactoryEvent,
 )
 
@@ -178,6 +183,52 @@ class RedefineDeleteEvent(AssociationChangeEvent):
         self.old_value = old_value
 
 
+class ElementChange(object):
+    """The change of a property of an element, as recorded in an
+    ElementChangeSet."""
+
+    def __init__(self, element, property, old_value, new_value):
+        self.element = element
+        self.property = property
+        self.old_value = old_value
+        self.new_value = new_value
+
+
+@implementer(IElementChangeSetEvent)
+class ElementChangeSet(object):
+    """The changes made to elements, coalesced per element and property.
+
+    For [0..*] associations the old and new values are the values removed
+    by the first change and added by the last change. Read the property
+    itself for its current value."""
+
+    def __init__(self):
+        self._changes = odict()
+
+    changes = property(lambda s: list(s._changes.values()))
+
+    def add(self, event):
+        """Add the change of element change event ``event``."""
+        key = (event.element, event.property)
+        change = self._changes.get(key)
+        new_value = getattr(event, "new_value", None)
+        if change:
+            change.new_value = new_value
+        else:
+            self._changes[key] = ElementChange(
+                event.element,
+                event.property,
+                getattr(event, "old_value", None),
+                new_value,
+            )
+
+    def __len__(self):
+        return len(self._changes)
+
+    def __iter__(self):
+        return iter(self._changes.values())
+
+
 @implementer(IElementCreateEvent)
 class DiagramItemCreateEvent(object):
     """A diagram item has been created."""
@@ -214,6 +265,32 @@ class ElementDeleteEvent(object):
         self.element = element
 
 
+@implementer(IElementsCreateEvent, IElementFactoryEvent)
+class ElementsCreateEvent(object):
+    """A batch of elements has been created."""
+
+    def __init__(self, service, elements):
+        """Constructor.  The service parameter is the service responsible
+        for creating the elements.  The elements parameter is the list of
+        elements created."""
+
+        self.service = service
+        self.elements = elements
+
+
+@implementer(IElementsDeleteEvent, IElementFactoryEvent)
+class ElementsDeleteEvent(object):
+    """A batch of elements has been deleted."""
+
+    def __init__(self, service, elements):
+        """Constructor.  The service parameter is the service responsible for
+        deleting the elements.  The elements parameter is the list of
+        elements deleted."""
+
+        self.service = service
+        self.elements = elements
+
+
 @implementer(IModelFactoryEvent)
 class ModelFactoryEvent(object):
     """A generic element factory event."""
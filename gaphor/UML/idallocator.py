@@ -0,0 +1,92 @@
+"""
+Allocation of element ids.
+
+Every element and canvas item gets a string id. Ids should be unique across
+models, since elements can be copied from one model to another. They used
+to be uuid1 strings, which are slow to generate. The default allocator
+hands out ids made of a random prefix, chosen once per session, and a
+counter:
+
+    >>> allocator = IdAllocator("a1b2")
+    >>> allocator.new_id()
+    'a1b2.1'
+    >>> allocator.new_ids(2)
+    ['a1b2.2', 'a1b2.3']
+
+Ids from files are kept as they are, whatever their format.
+
+Another allocator (any object with new_id() and new_ids() methods) can be
+installed with set_allocator().
+"""
+
+import itertools
+import uuid
+from builtins import object
+from builtins import range
+from builtins import str
+
+__all__ = ["IdAllocator", "UuidAllocator", "new_id", "new_ids", "set_allocator"]
+
+
+class IdAllocator(object):
+    """
+    Allocates ids with a fixed prefix and a counter. By default the prefix
+    is random (64 bits).
+    """
+
+    def __init__(self, prefix=None):
+        self.prefix = prefix or uuid.uuid4().hex[:16]
+        self._counter = itertools.count(1)
+
+    def new_id(self):
+        return "%s.%x" % (self.prefix, next(self._counter))
+
+    def new_ids(self, count):
+        """
+        Allocate a block of ``count`` ids.
+        """
+        prefix = self.prefix
+        counter = self._counter
+        return ["%s.%x" % (prefix, next(counter)) for n in range(count)]
+
+
+class UuidAllocator(object):
+    """
+    Allocates uuid1 ids, like older versions did.
+    """
+
+    def new_id(self):
+        return str(uuid.uuid1())
+
+    def new_ids(self, count):
+        return [str(uuid.uuid1()) for n in range(count)]
+
+
+_allocator = IdAllocator()
+
+
+def new_id():
+    """
+    Return a new id from the current allocator.
+    """
+    return _allocator.new_id()
+
+
+def new_ids(count):
+    """
+    Return a block of ``count`` new ids from the current allocator.
+    """
+    return _allocator.new_ids(count)
+
+
+def set_allocator(allocator):
+    """
+    Install ``allocator`` as the allocator of new ids. The previous
+    allocator is returned.
+    """
+    global _allocator
+    previous, _allocator = _allocator, allocator
+    return previous
+
+
+# vim:sw=4:et:ai
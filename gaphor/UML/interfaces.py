@@ -23,6 +23,20 @@ class IElementDeleteEvent(IElementEvent):
     """
 
 
+class IElementsCreateEvent(interface.Interface):
+    """A batch of new elements has been created.
+    """
+
+    elements = interface.Attribute("The created elements")
+
+
+class IElementsDeleteEvent(interface.Interface):
+    """A batch of elements is deleted from the model.
+    """
+
+    elements = interface.Attribute("The deleted elements")
+
+
 class IElementChangeEvent(IElementEvent):
     """
     Generic event fired when element state changes.
@@ -66,6 +80,16 @@ class IAssociationDeleteEvent(IAssociationChangeEvent):
     """
 
 
+class IElementChangeSetEvent(interface.Interface):
+    """
+    The changes made to model elements in a transaction, one change per
+    element and property. Each change holds the old value of the first
+    change and the new value of the last one.
+    """
+
+    changes = interface.Attribute("The ElementChange's, in order of first change")
+
+
 class IElementFactoryEvent(IServiceEvent):
     """
     Events related to individual model elements.
@@ -78,10 +78,10 @@ def find_instances(factory, element):
     """
     Find instance specification which extend classifier `element`.
     """
-    return factory.select(
-        lambda e: e.isKindOf(InstanceSpecification)
-        and e.classifier
-        and e.classifier[0] == element
+    return (
+        e
+        for e in factory.select_by(InstanceSpecification.classifier, element)
+        if e.classifier[0] is element
     )
 
 
@@ -116,7 +116,15 @@ def get_stereotypes(factory, element):
     names = set(c.__name__ for c in cls.__mro__ if issubclass(c, Element))
 
     # find stereotypes that extend element class
-    classes = factory.select(lambda e: e.isKindOf(Class) and e.name in names)
+    if factory.has_index(NamedElement.name):
+        classes = (
+            c
+            for name in names
+            for c in factory.select_by(NamedElement.name, name)
+            if isinstance(c, Class)
+        )
+    else:
+        classes = (c for c in factory.select_type(Class) if c.name in names)
 
     stereotypes = set(ext.ownedEnd.type for cls in classes for ext in cls.extension)
     return sorted(stereotypes, key=lambda st: st.name)
@@ -34,7 +34,7 @@ from builtins import object
 from builtins import str
 from zope import component
 
-from gaphor.UML.collection import collection, collectionlist
+from gaphor.UML.collection import collection, collectionset
 from gaphor.UML.event import AssociationAddEvent, AssociationDeleteEvent
 from gaphor.UML.event import AttributeChangeEvent, AssociationSetEvent
 from gaphor.UML.event import DerivedAddEvent, DerivedDeleteEvent
@@ -53,6 +53,32 @@ except ImportError:
 log = logging.getLogger(__name__)
 
 
+# umlproperty: the derived and redefined properties that depend on it
+_dependents = {}
+
+
+def add_dependent(prop, dependent):
+    """
+    Register derived or redefined property ``dependent`` to be notified
+    (through its ``_association_changed()`` method) of changes to ``prop``.
+    """
+    _dependents[prop] = _dependents.get(prop, ()) + (dependent,)
+
+
+@component.adapter(IElementChangeEvent)
+def _property_changed(event):
+    """
+    Pass a change event on to the properties that depend on the changed
+    property. This is the only handler for all derived and redefined
+    properties, so an event only reaches the properties it concerns.
+    """
+    for dependent in _dependents.get(event.property, ()):
+        dependent._association_changed(event)
+
+
+component.provideHandler(_property_changed)
+
+
 class umlproperty(object):
     """
     Superclass for attribute, enumeration and association.
@@ -270,6 +296,58 @@ class association(umlproperty):
         self.composite = composite
         self.opposite = opposite and intern(opposite)
         self.stub = None
+        # map element: [deferredreference], see defer()
+        self.deferred = {}
+
+    def __get__(self, obj, class_=None):
+        if obj:
+            if self.deferred and obj in self.deferred:
+                self._resolve(obj)
+            return self._get(obj)
+        return self
+
+    def defer(self, obj, id, loader):
+        """
+        Defer loading of a reference to element ``id`` on ``obj``, until
+        the value of this association is requested. At that moment
+        ``loader.load()`` is invoked, which should load the referenced
+        element and set the reference (e.g. through the opposite
+        association). The loader should call undefer() once it is done.
+
+        Deferred references are saved as if they were loaded.
+        """
+        assert self.upper != 1, "Only collections can have deferred values"
+        self.deferred.setdefault(obj, []).append(deferredreference(id, loader))
+
+    def undefer(self, obj, loader):
+        """
+        Remove all deferred references on ``obj`` that are loaded
+        by ``loader``.
+        """
+        refs = self.deferred.get(obj)
+        if refs:
+            refs = [r for r in refs if r.loader is not loader]
+            if refs:
+                self.deferred[obj] = refs
+            else:
+                del self.deferred[obj]
+
+    def _resolve(self, obj):
+        for ref in list(self.deferred.get(obj, ())):
+            ref.loader.load()
+        self.deferred.pop(obj, None)
+
+    def save(self, obj, save_func):
+        deferred = self.deferred and self.deferred.get(obj)
+        if deferred:
+            # Save the deferred references without loading them
+            c = collection(self, obj, self.type)
+            if hasattr(obj, self._name):
+                c.items.extend(self._get(obj))
+            c.items.extend(deferred)
+            save_func(self.name, c)
+        elif hasattr(obj, self._name):
+            save_func(self.name, self._get(obj))
 
     def load(self, obj, value):
         if not isinstance(value, self.type):
@@ -284,7 +362,7 @@ class association(umlproperty):
         In the postload step, ensure that bi-directional associations
         are bi-directional.
         """
-        values = self._get(obj)
+        values = getattr(obj, self._name, None)
         if not values:
             return
         if self.upper == 1:
@@ -313,17 +391,12 @@ class association(umlproperty):
     def _get(self, obj):
         # print '_get', self, obj
         # TODO: Handle lower and add items if lower > 0
-        try:
-            return getattr(obj, self._name)
-        except AttributeError:
-            if self.upper == 1:
-                return None
-            else:
-                # Create the empty collection here since it might be used to
-                # add
-                c = collection(self, obj, self.type)
-                setattr(obj, self._name, c)
-                return c
+        value = getattr(obj, self._name, None)
+        if value is None and self.upper != 1:
+            # An empty collection, that can be used to add. It is only
+            # stored on the element once a value is added (see _set())
+            return collection(self, obj, self.type)
+        return value
 
     def _set(self, obj, value, from_opposite=False, do_notify=True):
         """
@@ -359,8 +432,8 @@ class association(umlproperty):
 
         else:
             # Set the actual value
-            c = self._get(obj)
-            if not c:
+            c = getattr(obj, self._name, None)
+            if c is None:
                 c = collection(self, obj, self.type)
                 setattr(obj, self._name, c)
             elif value in c:
@@ -414,7 +487,7 @@ class association(umlproperty):
                 if do_notify:
                     event = AssociationSetEvent(obj, self, value, None)
         else:
-            c = self._get(obj)
+            c = getattr(obj, self._name, None)
             if c:
                 items = c.items
                 try:
@@ -433,7 +506,9 @@ class association(umlproperty):
             self.handle(event)
 
     def unlink(self, obj):
-        values = self._get(obj)
+        if self.deferred and obj in self.deferred:
+            self._resolve(obj)
+        values = getattr(obj, self._name, None)
         composite = self.composite
         if values:
             if self.upper == 1:
@@ -446,6 +521,17 @@ class association(umlproperty):
                     value.unlink()
 
 
+class deferredreference(object):
+    """
+    A reference to an element that is not loaded yet. It only provides
+    the element ``id``, which is enough to save the reference.
+    """
+
+    def __init__(self, id, loader):
+        self.id = id
+        self.loader = loader
+
+
 class AssociationStubError(Exception):
     pass
 
@@ -501,16 +587,24 @@ class associationstub(umlproperty):
             pass
         else:
             c.discard(value)
+            if not c:
+                delattr(obj, self._name)
 
 
 class unioncache(object):
     """
     Small cache helper object for derivedunions.
+
+    ``shared`` is set once the data has been handed out: the data is then
+    copied before it is changed.
     """
 
+    __slots__ = ("data", "version", "shared")
+
     def __init__(self, data, version):
         self.data = data
         self.version = version
+        self.shared = False
 
 
 class derived(umlproperty):
@@ -534,7 +628,8 @@ class derived(umlproperty):
         self.subsets = set(subsets)
         self.single = len(subsets) == 1
 
-        component.provideHandler(self._association_changed)
+        for subset in self.subsets:
+            add_dependent(subset, self)
 
     def load(self, obj, value):
         raise ValueError(
@@ -595,7 +690,6 @@ class derived(umlproperty):
     def _del(self, obj, value=None):
         raise AttributeError("Can not delete values on a union")
 
-    @component.adapter(IElementChangeEvent)
     def _association_changed(self, event):
         """
         Re-emit state change for the derived properties as Derived*Event's.
@@ -676,16 +770,95 @@ class derivedunion(derived):
                     except TypeError:
                         # [0..1] property
                         u.add(tmp)
-            return collectionlist(u)
+            return collectionset(u)
 
     # Filter is our default filter
     filter = _union
 
-    @component.adapter(IElementChangeEvent)
+    def postload(self, obj):
+        self._invalidate(obj)
+
+    def _update(self, obj):
+        uc = super(derivedunion, self)._update(obj)
+        # Empty unions share one cache
+        if uc.data is None:
+            uc = _no_value
+        elif type(uc.data) is collectionset and not uc.data:
+            uc = _no_values
+        else:
+            return uc
+        setattr(obj, self._name, uc)
+        return uc
+
+    def _get(self, obj):
+        # The cache of a derived union is kept per element, see
+        # _association_changed()
+        try:
+            uc = getattr(obj, self._name)
+        except AttributeError:
+            uc = self._update(obj)
+        uc.shared = True
+        return uc.data
+
+    def _invalidate(self, obj):
+        try:
+            delattr(obj, self._name)
+        except AttributeError:
+            pass
+
+    def _in_subsets(self, obj, value, exclude):
+        """
+        Return True if ``value`` is in one of the subsets of the union,
+        other than ``exclude``.
+        """
+        for s in self.subsets:
+            if s is exclude:
+                continue
+            tmp = s.__get__(obj)
+            if tmp is value:
+                return True
+            if tmp:
+                try:
+                    if value in tmp:
+                        return True
+                except TypeError:
+                    # [0..1] property
+                    pass
+        return False
+
+    # A cached union that has been handed out may be iterated while the
+    # union changes: it is copied before it is changed.
+
+    def _writable(self, uc):
+        if uc.shared:
+            uc.data = collectionset(uc.data)
+            uc.shared = False
+        return uc.data
+
+    def _add_value(self, obj, value):
+        uc = getattr(obj, self._name, None)
+        if uc is _no_values:
+            self._invalidate(obj)
+        elif uc is not None:
+            self._writable(uc).append(value)
+
+    def _remove_value(self, obj, value):
+        uc = getattr(obj, self._name, None)
+        if uc is _no_values:
+            self._invalidate(obj)
+        elif uc is not None:
+            try:
+                self._writable(uc).remove(value)
+            except ValueError:
+                self._invalidate(obj)
+
     def _association_changed(self, event):
         """
         Re-emit state change for the derived union (as Derived*Event's).
 
+        Only the cached union of the element that changed is updated. Unions
+        that subset this union are updated through the events sent from here.
+
         TODO: We should fetch the old and new state of the namespace item in
         stead of the old and new values of the item that changed.
 
@@ -696,23 +869,22 @@ class derivedunion(derived):
             if value not in derived union and 
         """
         if event.property in self.subsets:
-            # Make sure unions are created again
-            self.version += 1
+            element = event.element
 
             if not IAssociationChangeEvent.providedBy(event):
+                self._invalidate(element)
                 return
 
-            values = self._union(event.element, exclude=event.property)
-
             if self.upper == 1:
+                # Make sure the union is created again
+                self._invalidate(element)
+                values = self._union(element, exclude=event.property)
                 assert IAssociationSetEvent.providedBy(event)
                 old_value, new_value = event.old_value, event.new_value
                 # This is a [0..1] event
                 if self.single:
                     # Only one subset element, so pass the values on
-                    self.handle(
-                        DerivedSetEvent(event.element, self, old_value, new_value)
-                    )
+                    self.handle(DerivedSetEvent(element, self, old_value, new_value))
                 else:
                     new_values = set(values)
                     if new_value:
@@ -722,36 +894,58 @@ class derivedunion(derived):
                         return
                     if values:
                         new_value = next(iter(values))
-                    self.handle(
-                        DerivedSetEvent(event.element, self, old_value, new_value)
-                    )
+                    self.handle(DerivedSetEvent(element, self, old_value, new_value))
+                return
+
+            if self.single or "filter" in self.__dict__:
+                # The union is the subset itself, or can not be updated
+                # value by value
+                self._invalidate(element)
+                update = False
             else:
-                if IAssociationSetEvent.providedBy(event):
-                    old_value, new_value = event.old_value, event.new_value
-                    if old_value and old_value not in values:
-                        self.handle(DerivedDeleteEvent(event.element, self, old_value))
-                    if new_value and new_value not in values:
-                        self.handle(DerivedAddEvent(event.element, self, new_value))
+                update = True
 
-                elif IAssociationAddEvent.providedBy(event):
-                    new_value = event.new_value
-                    if new_value not in values:
-                        self.handle(DerivedAddEvent(event.element, self, new_value))
+            def in_union(value):
+                return self._in_subsets(element, value, event.property)
 
-                elif IAssociationDeleteEvent.providedBy(event):
-                    old_value = event.old_value
-                    if old_value not in values:
-                        self.handle(DerivedDeleteEvent(event.element, self, old_value))
+            if IAssociationSetEvent.providedBy(event):
+                old_value, new_value = event.old_value, event.new_value
+                if old_value and not in_union(old_value):
+                    if update:
+                        self._remove_value(element, old_value)
+                    self.handle(DerivedDeleteEvent(element, self, old_value))
+                if new_value and not in_union(new_value):
+                    if update:
+                        self._add_value(element, new_value)
+                    self.handle(DerivedAddEvent(element, self, new_value))
 
-                elif IAssociationChangeEvent.providedBy(event):
-                    self.handle(DerivedChangeEvent(event.element, self))
-                else:
-                    log.error(
-                        "Don"
-                        "t know how to handle event "
-                        + str(event)
-                        + " for derived union"
-                    )
+            elif IAssociationAddEvent.providedBy(event):
+                new_value = event.new_value
+                if not in_union(new_value):
+                    if update:
+                        self._add_value(element, new_value)
+                    self.handle(DerivedAddEvent(element, self, new_value))
+
+            elif IAssociationDeleteEvent.providedBy(event):
+                old_value = event.old_value
+                if not in_union(old_value):
+                    if update:
+                        self._remove_value(element, old_value)
+                    self.handle(DerivedDeleteEvent(element, self, old_value))
+
+            elif IAssociationChangeEvent.providedBy(event):
+                self._invalidate(element)
+                self.handle(DerivedChangeEvent(element, self))
+            else:
+                log.error(
+                    "Don"
+                    "t know how to handle event " + str(event) + " for derived union"
+                )
+
+
+# The caches of empty derived unions, never modified
+_no_value = unioncache(None, 0)
+_no_values = unioncache(collectionset(), 0)
 
 
 class redefine(umlproperty):
@@ -771,7 +965,7 @@ class redefine(umlproperty):
         self.type = type
         self.original = original
 
-        component.provideHandler(self._association_changed)
+        add_dependent(original, self)
 
     upper = property(lambda s: s.original.upper)
     lower = property(lambda s: s.original.lower)
@@ -825,7 +1019,6 @@ class redefine(umlproperty):
     def _del(self, obj, value, from_opposite=False):
         return self.original._del(obj, value, from_opposite)
 
-    @component.adapter(IAssociationChangeEvent)
     def _association_changed(self, event):
         if event.property is self.original and isinstance(
             event.element, self.decl_class
@@ -4,7 +4,7 @@ Test if the collection's list supports all trickery.
 
 from builtins import str
 import unittest
-from gaphor.UML.collection import collectionlist
+from gaphor.UML.collection import collectionlist, collectionset
 
 
 class CollectionlistTestCase(unittest.TestCase):
@@ -16,4 +16,79 @@ class CollectionlistTestCase(unittest.TestCase):
         assert str(c) == "['a', 'b', 'c']"
 
 
+class CollectionsetTestCase(unittest.TestCase):
+    def test_order(self):
+        c = collectionset("abcde")
+        c.remove("b")
+        c.remove("d")
+        c.append("b")
+        self.assertEqual(["a", "c", "e", "b"], list(c))
+        self.assertEqual(4, len(c))
+        self.assertEqual("e", c[2])
+        self.assertEqual("b", c[-1])
+        self.assertEqual(3, c.index("b"))
+        self.assertEqual(["c", "e"], list(c[1:3]))
+
+    def test_remove(self):
+        c = collectionset(range(100))
+        for n in range(0, 100, 2):
+            c.remove(n)
+        self.assertEqual(list(range(1, 100, 2)), list(c))
+        self.assertFalse(2 in c)
+        self.assertTrue(3 in c)
+        self.assertRaises(ValueError, c.remove, 2)
+        self.assertRaises(ValueError, c.index, 2)
+
+        for n in range(1, 100, 2):
+            c.remove(n)
+        self.assertFalse(c)
+        self.assertEqual([], list(c))
+
+    def test_swap(self):
+        c = collectionset("abc")
+        c.remove("a")
+        c[0], c[1] = c[1], c[0]
+        self.assertEqual(["c", "b"], list(c))
+        self.assertEqual(0, c.index("c"))
+        self.assertEqual(1, c.index("b"))
+
+    def test_no_duplicates(self):
+        c = collectionset("ab")
+        c.append("a")
+        self.assertEqual(["a", "b"], list(c))
+
+    def test_iterate_while_removing(self):
+        c = collectionset("abcd")
+        seen = []
+        for x in c:
+            seen.append(x)
+            if x == "a":
+                c.remove("b")
+        self.assertEqual(["a", "c", "d"], seen)
+
+        # The item list is compacted while iterating
+        c = collectionset(range(10))
+        seen = []
+        for x in c:
+            seen.append(x)
+            for y in range(x + 1, 10):
+                c.remove(y)
+        self.assertEqual([0], seen)
+
+    def test_empty_storage_is_shared(self):
+        c1 = collectionset()
+        c2 = collectionset()
+        self.assertTrue(c1._positions is c2._positions)
+
+        c1.append("a")
+        self.assertFalse(c1._positions is c2._positions)
+        self.assertEqual([], list(c2))
+
+        c1.remove("a")
+        self.assertTrue(c1._positions is c2._positions)
+        self.assertRaises(ValueError, c1.remove, "a")
+        self.assertRaises(IndexError, c1.__setitem__, 0, "a")
+        self.assertEqual([], list(c2))
+
+
 # vim:sw=4:et:ai
@@ -67,6 +67,181 @@ class ElementFactoryTestCase(unittest.TestCase):
 
         assert len(list(ef.values())) == 0, list(ef.values())
 
+    def testCreateMany(self):
+        ef = self.factory
+        classes = ef.create_many(Class, ["c1", None])
+        self.assertEqual(2, ef.size())
+        self.assertEqual("c1", classes[0].id)
+        self.assertTrue(classes[1].id)
+        self.assertEqual(classes, list(ef.select_type(Class)))
+
+    def testUnlinkMany(self):
+        ef = self.factory
+        p = ef.create(Package)
+        c1 = ef.create(Class)
+        c2 = ef.create(Class)
+        c3 = ef.create(Class)
+        c1.package = p
+        c2.package = p
+
+        # Owned elements are unlinked along with their owner
+        deleted = ef.unlink_many([p])
+        self.assertEqual(set([p, c1, c2]), set(deleted))
+        self.assertEqual([c3], list(ef.values()))
+
+    def testSelectType(self):
+        ef = self.factory
+        c1 = ef.create(Class)
+        s = ef.create(Stereotype)
+        c2 = ef.create(Class)
+        p = ef.create(Package)
+
+        self.assertEqual([c1, s, c2], list(ef.select_type(Class)))
+        self.assertEqual([s], list(ef.select_type(Stereotype)))
+        self.assertEqual([c1, s, c2, p], list(ef.select_type(Element)))
+        self.assertEqual([], list(ef.select_type(Diagram)))
+        self.assertEqual(3, ef.count(Class))
+        self.assertEqual(0, ef.count(Diagram))
+        self.assertEqual(4, ef.count())
+
+        c1.unlink()
+        self.assertEqual([s, c2], list(ef.select_type(Class)))
+        self.assertEqual(2, ef.count(Classifier))
+
+        # Indexed classes are kept up to date
+        d = ef.create(Diagram)
+        self.assertEqual([d], list(ef.select_type(Diagram)))
+
+        ef.flush()
+        self.assertEqual(0, ef.count(Element))
+
+    def testSelectTypeAfterSwap(self):
+        ef = self.factory
+        node = ef.create(ForkNode)
+        ef.swap_element(node, JoinNode)
+
+        self.assertEqual([], list(ef.select_type(ForkNode)))
+        self.assertEqual([node], list(ef.select_type(JoinNode)))
+        self.assertEqual([node], list(ef.select_type(ControlNode)))
+
+    def testSelectTypeBind(self):
+        ef = self.factory
+        c = Class("id")
+        ef.bind(c)
+        self.assertEqual([c], list(ef.select_type(Classifier)))
+
+    def testSelectBy(self):
+        ef = self.factory
+        c1 = ef.create(Class)
+        c1.name = "a"
+        c2 = ef.create(Class)
+        c2.name = "b"
+        p = ef.create(Package)
+        p.name = "a"
+
+        # Without index
+        self.assertEqual([c1, p], list(ef.select_by(NamedElement.name, "a")))
+
+        self.assertFalse(ef.has_index(NamedElement.name))
+        self.assertTrue(ef.add_index(NamedElement.name))
+        self.assertFalse(ef.add_index(NamedElement.name))
+        self.assertTrue(ef.has_index(NamedElement.name))
+        self.assertEqual([c1, p], list(ef.select_by(NamedElement.name, "a")))
+
+        c2.name = "a"
+        self.assertEqual([c1, p, c2], list(ef.select_by(NamedElement.name, "a")))
+        self.assertEqual([], list(ef.select_by(NamedElement.name, "b")))
+
+        p.unlink()
+        del c1.name
+        self.assertEqual([c2], list(ef.select_by(NamedElement.name, "a")))
+        self.assertEqual([c1], list(ef.select_by(NamedElement.name, None)))
+
+        c3 = ef.create(Class)
+        c3.name = "a"
+        self.assertEqual([c2, c3], list(ef.select_by(NamedElement.name, "a")))
+
+        ef.flush()
+        self.assertEqual([], list(ef.select_by(NamedElement.name, "a")))
+
+        ef.remove_index(NamedElement.name)
+        self.assertFalse(ef.has_index(NamedElement.name))
+
+    def testSelectByAssociation(self):
+        ef = self.factory
+        ef.add_index(InstanceSpecification.classifier)
+        c = ef.create(Class)
+        i1 = ef.create(InstanceSpecification)
+        i2 = ef.create(InstanceSpecification)
+        i1.classifier = c
+        i2.classifier = c
+
+        self.assertEqual(
+            [i1, i2], list(ef.select_by(InstanceSpecification.classifier, c))
+        )
+
+        i1.classifier.remove(c)
+        self.assertEqual([i2], list(ef.select_by(InstanceSpecification.classifier, c)))
+
+        c.unlink()
+        self.assertEqual([], list(ef.select_by(InstanceSpecification.classifier, c)))
+
+    def testReferrers(self):
+        ef = self.factory
+        c = ef.create(Class)
+        p = ef.create(Property)
+        a = ef.create(Association)
+        c.ownedAttribute = p
+        self.assertEqual([p], ef.referrers(c))
+        self.assertEqual([c], ef.referrers(p))
+
+        # The index is kept up to date
+        a.memberEnd = p
+        self.assertEqual([c, a], ef.referrers(p))
+        del c.ownedAttribute[p]
+        self.assertEqual([a], ef.referrers(p))
+
+        a.unlink()
+        self.assertEqual([], ef.referrers(p))
+
+    def testOrphans(self):
+        ef = self.factory
+        c = ef.create(Class)
+        self.assertFalse(ef.is_orphan(c))
+
+        comment = Comment(id="comment")
+        comment.annotatedElement = c
+        self.assertTrue(ef.is_orphan(comment))
+        self.assertEqual([comment], ef.orphans())
+
+        del comment.annotatedElement[c]
+        self.assertFalse(ef.is_orphan(comment))
+        self.assertEqual([], ef.orphans())
+
+    def testOrphanAfterRemove(self):
+        ef = self.factory
+        c = ef.create(Class)
+        p = ef.create(Property)
+        c.ownedAttribute = p
+        self.assertEqual([], ef.orphans())
+
+        # Remove the element without unlinking, like undo does
+        ef._remove_element(p)
+        self.assertEqual([p], ef.orphans())
+
+        ef._add_element(p)
+        self.assertEqual([], ef.orphans())
+
+    def testIndexAfterLoad(self):
+        ef = self.factory
+        ef.add_index(NamedElement.name)
+        c = Class("id")
+        ef.bind(c)
+        # Loaded values do not send events
+        NamedElement.name.load(c, "loaded")
+        ef.notify_model()
+        self.assertEqual([c], list(ef.select_by(NamedElement.name, "loaded")))
+
 
 from zope import component
 from gaphor.application import Application
@@ -128,6 +303,22 @@ class ElementFactoryServiceTestCase(unittest.TestCase):
         ef.notify_model()
         self.assertTrue(IModelFactoryEvent.providedBy(last_event))
 
+    def testCreateManyEvent(self):
+        ef = self.factory
+        classes = ef.create_many(Class, [None, None])
+        self.assertTrue(IElementsCreateEvent.providedBy(last_event))
+        self.assertEqual(classes, last_event.elements)
+        self.assertEqual([], [e for e in events if IElementCreateEvent.providedBy(e)])
+
+    def testUnlinkManyEvent(self):
+        ef = self.factory
+        classes = ef.create_many(Class, [None, None])
+        self.clearEvents()
+        ef.unlink_many(classes)
+        self.assertTrue(IElementsDeleteEvent.providedBy(last_event))
+        self.assertEqual(classes, last_event.elements)
+        self.assertEqual([], [e for e in events if IElementDeleteEvent.providedBy(e)])
+
     def testFlushEvent(self):
         ef = self.factory
         global handled
@@ -0,0 +1,36 @@
+import unittest
+
+from gaphor.UML import ElementFactory, Class
+from gaphor.UML.idallocator import IdAllocator, UuidAllocator, set_allocator
+
+
+class IdAllocatorTestCase(unittest.TestCase):
+    def test_unique_ids(self):
+        a1 = IdAllocator()
+        a2 = IdAllocator()
+        self.assertNotEqual(a1.prefix, a2.prefix)
+
+        ids = [a1.new_id() for n in range(100)] + a1.new_ids(100) + a2.new_ids(100)
+        self.assertEqual(300, len(set(ids)))
+
+    def test_set_allocator(self):
+        previous = set_allocator(IdAllocator("test"))
+        try:
+            factory = ElementFactory()
+            c = factory.create(Class)
+            self.assertTrue(c.id.startswith("test."))
+            classes = factory.create_many(Class, [None, "id", None])
+            self.assertEqual(["test.2", "id", "test.3"], [c.id for c in classes])
+            self.assertTrue(Class().id.startswith("test."))
+        finally:
+            set_allocator(previous)
+
+    def test_uuid_allocator(self):
+        previous = set_allocator(UuidAllocator())
+        try:
+            self.assertEqual(36, len(Class().id))
+        finally:
+            set_allocator(previous)
+
+
+# vim:sw=4:et:ai
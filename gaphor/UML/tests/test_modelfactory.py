@@ -97,6 +97,14 @@ class StereotypesTestCase(TestCaseBase):
         result = tuple(st.name for st in UML.model.get_stereotypes(self.factory, c1))
         self.assertEqual(("st1", "st2"), result)
 
+        # The factory is not indexed as a side effect
+        self.assertFalse(self.factory.has_index(UML.NamedElement.name))
+
+        # Stereotypes are looked up by name if the factory is indexed
+        self.factory.add_index(UML.NamedElement.name)
+        result = tuple(st.name for st in UML.model.get_stereotypes(self.factory, c1))
+        self.assertEqual(("st1", "st2"), result)
+
     def test_getting_stereotypes_unique(self):
         """Test if possible stereotypes are unique
         """
@@ -140,6 +148,7 @@ class StereotypesTestCase(TestCaseBase):
         self.assertEqual(2, len(result))
         self.assertTrue("s1" in result, result)
         self.assertFalse("s2" in result, result)
+        self.assertFalse(self.factory.has_index(UML.InstanceSpecification.classifier))
 
 
 class AssociationTestCase(TestCaseBase):
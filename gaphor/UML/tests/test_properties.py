@@ -61,6 +61,29 @@ class PropertiesTestCase(unittest.TestCase):
         assert b in a.one
         assert b.two is a
 
+    def test_association_empty_collection(self):
+        class A(Element):
+            pass
+
+        A.many = association("many", A)
+        a = A()
+        b = A()
+
+        # Empty collections are not kept on the element
+        self.assertFalse(a.many)
+        self.assertFalse(hasattr(a, "_many"))
+
+        a.many.append(b)
+        self.assertEqual([b], list(a.many))
+
+        del a.many[b]
+        self.assertFalse(hasattr(a, "_many"))
+
+        # The stub of the uni-directional association is released as well
+        a.many = b
+        a.many.remove(b)
+        self.assertEqual([], [n for n in vars(b) if n.startswith("_stub_")])
+
     def test_association_1_1(self):
         #
         # 1:1
@@ -467,6 +490,65 @@ class PropertiesTestCase(unittest.TestCase):
         assert c in a.u
         assert d in a.u
 
+    def test_derivedunion_add_while_iterating(self):
+        class A(Element):
+            pass
+
+        A.a = association("a", A)
+        A.b = association("b", A)
+        A.u = derivedunion("u", A, 0, "*", A.a, A.b)
+
+        a = A()
+        a.a = A()
+        a.b = A()
+        iterated = []
+        for x in a.u:
+            iterated.append(x)
+            a.a = A()
+            self.assertTrue(len(iterated) < 10)
+        self.assertEqual(2, len(iterated))
+        self.assertEqual(4, len(a.u))
+
+    def test_derivedunion_cache_per_element(self):
+        class A(Element):
+            pass
+
+        A.a = association("a", A)
+        A.b = association("b", A)
+        A.u = derivedunion("u", A, 0, "*", A.a, A.b)
+        A.v = derivedunion("v", A, 0, "*", A.u)
+
+        a1 = A()
+        a2 = A()
+        b = A()
+        c = A()
+        a1.a = b
+        a2.a = b
+        u1 = a1.u
+        self.assertEqual([b], list(a1.v))
+
+        # A change to another element leaves the union alone
+        a2.b = c
+        # Unions that are iterated do not change
+        self.assertEqual([b], list(u1))
+        self.assertEqual(set([b, c]), set(a2.u))
+
+        # The union is updated, not created again
+        a1.b = b
+        # Unions that are iterated do not change
+        self.assertEqual([b], list(u1))
+        a1.b = c
+        self.assertEqual(set([b, c]), set(a1.u))
+        self.assertEqual(set([b, c]), set(a1.v))
+        # Unions that are iterated do not change
+        self.assertEqual([b], list(u1))
+
+        del a1.a[b]
+        self.assertEqual(set([b, c]), set(a1.u))
+        del a1.b[b]
+        self.assertEqual([c], list(a1.u))
+        self.assertEqual([c], list(a1.v))
+
     def skiptest_deriveduntion_notify(self):
         class A(Element):
             pass
@@ -760,6 +842,46 @@ class PropertiesTestCase(unittest.TestCase):
         finally:
             Application.unregister_handler(handler)
 
+    def test_property_table(self):
+        from gaphor.UML.element import property_table
+
+        class A(Element):
+            pass
+
+        class B(A):
+            pass
+
+        A.name = attribute("name", str)
+        A.b = association("b", B, opposite="a")
+        B.a = association("a", A)
+        B.names = derivedunion("names", A, 0, "*", B.a)
+
+        table = property_table(B)
+        self.assertTrue(B.a in table.associations)
+        self.assertTrue(A.b in table.associations)
+        self.assertTrue(A.name in table.attributes)
+        self.assertFalse(A.name in table.associations)
+        self.assertTrue(B.names in table.derived)
+        self.assertTrue(A.name in table.saved)
+        self.assertFalse(B.names in table.saved)
+        self.assertTrue(B.names in table.postloaded)
+        self.assertFalse(A.name in table.postloaded)
+        self.assertEqual(table.all, tuple(B().umlproperties()))
+
+        # Tables are updated when properties are added to the class
+        # or to one of its superclasses
+        c = A.c = association("c", A, upper=1)
+        self.assertTrue(c in property_table(B).associations)
+        del A.c
+        self.assertFalse(c in property_table(B).associations)
+
+        # Association stubs are set on the class of the referred element
+        stubs = property_table(A).stubs
+        B().a = A()
+        self.assertEqual(len(stubs) + 1, len(property_table(A).stubs))
+        self.assertTrue(B.a.stub in property_table(B).stubs)
+        self.assertTrue(B.a.stub in property_table(B).unlinked)
+
 
 if __name__ == "__main__":
     unittest.main()
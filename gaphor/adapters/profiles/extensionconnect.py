@@ -48,23 +48,22 @@ class ExtensionConnect(RelationshipConnect):
             # TODO: make element at head end update!
             c1.request_update()
 
-            # Find all associations and determine if the properties on
+            # Find all extensions and determine if the properties on
             # the association ends have a type that points to the class.
-            for assoc in self.element_factory.select():
-                if isinstance(assoc, UML.Extension):
-                    end1 = assoc.memberEnd[0]
-                    end2 = assoc.memberEnd[1]
-                    if (end1.type is head_type and end2.type is tail_type) or (
-                        end2.type is head_type and end1.type is tail_type
-                    ):
-                        # check if this entry is not yet in the diagram
-                        # Return if the association is not (yet) on the canvas
-                        for item in assoc.presentation:
-                            if item.canvas is element.canvas:
-                                break
-                        else:
-                            line.subject = assoc
-                            return
+            for assoc in self.element_factory.select_type(UML.Extension):
+                end1 = assoc.memberEnd[0]
+                end2 = assoc.memberEnd[1]
+                if (end1.type is head_type and end2.type is tail_type) or (
+                    end2.type is head_type and end1.type is tail_type
+                ):
+                    # check if this entry is not yet in the diagram
+                    # Return if the association is not (yet) on the canvas
+                    for item in assoc.presentation:
+                        if item.canvas is element.canvas:
+                            break
+                    else:
+                        line.subject = assoc
+                        return
             else:
                 # Create a new Extension relationship
                 relation = UML.model.extend_with_stereotype(
@@ -11,8 +11,9 @@ import gi
 gi.require_version("PangoCairo", "1.0")
 
 from gi.repository import GObject
-import uuid
 
+from gaphor.UML.element import ElementMeta
+from gaphor.UML.idallocator import new_id
 from gaphor.diagram.style import Style
 
 # Map UML elements to their (default) representation.
@@ -20,7 +21,7 @@ _uml_to_item_map = {}
 
 
 def create(type):
-    return create_as(type, str(uuid.uuid1()))
+    return create_as(type, new_id())
 
 
 def create_as(type, id):
@@ -59,7 +60,7 @@ def uml(uml_class, stereotype=None):
     return f
 
 
-class DiagramItemMeta(type):
+class DiagramItemMeta(ElementMeta):
     """
     Initialize a new diagram item.
     1. Register UML.Elements by means of the __uml__ attribute (see
@@ -70,7 +71,7 @@ class DiagramItemMeta(type):
     """
 
     def __init__(self, name, bases, data):
-        type.__init__(self, name, bases, data)
+        ElementMeta.__init__(self, name, bases, data)
 
         self.map_uml_class(data)
         self.set_style(data)
@@ -1,70 +1,52 @@
-# from http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/107747
-from builtins import map
-from builtins import zip
+"""
+Ordered dictionary.
 
+Insertion, deletion and membership tests are constant time operations,
+iteration follows the insertion order of the keys.
+"""
 
-class odict(dict):
-    def __init__(self, dict=()):
-        self._keys = []
-        super(odict, self).__init__(dict)
+from collections import OrderedDict
 
-    def __delitem__(self, key):
-        dict.__delitem__(self, key)
-        self._keys.remove(key)
 
-    def __setitem__(self, key, item):
-        dict.__setitem__(self, key, item)
-        if key not in self._keys:
-            self._keys.append(key)
+class odict(OrderedDict):
+    """
+    An insertion ordered dictionary.
 
-    def clear(self):
-        dict.clear(self)
-        self._keys = []
+    >>> d = odict()
+    >>> d['a'] = 1
+    >>> d['c'] = 3
+    >>> d['b'] = 2
+    >>> d.keys()
+    ['a', 'c', 'b']
+    >>> d.swap('a', 'b')
+    >>> d.values()
+    [2, 3, 1]
 
-    def copy(self):
-        dict = dict.copy(self)
-        dict._keys = self._keys[:]
-        return dict
-
-    def items(self):
-        return list(zip(self._keys, list(self.values())))
+    keys(), values() and items() return a new list, so the dictionary may
+    be changed while those are iterated. Iterating the dictionary itself
+    does not copy the keys.
+    """
 
     def keys(self):
-        return self._keys
-
-    def popitem(self):
-        try:
-            key = self._keys[-1]
-        except IndexError:
-            raise KeyError("dictionary is empty")
-
-        val = self[key]
-        del self[key]
-
-        return (key, val)
-
-    def setdefault(self, key, failobj=None):
-        dict.setdefault(self, key, failobj)
-        if key not in self._keys:
-            self._keys.append(key)
-
-    def update(self, dict):
-        dict.update(self, dict)
-        for key in list(dict.keys()):
-            if key not in self._keys:
-                self._keys.append(key)
+        return list(OrderedDict.keys(self))
 
     def values(self):
-        return list(map(self.get, self._keys))
+        return list(OrderedDict.values(self))
+
+    def items(self):
+        return list(OrderedDict.items(self))
 
     def swap(self, k1, k2):
         """
         Swap two elements using their keys.
         """
-        i1 = self._keys.index(k1)
-        i2 = self._keys.index(k2)
-        self._keys[i1], self._keys[i2] = self._keys[i2], self._keys[i1]
+        keys = self.keys()
+        i1 = keys.index(k1)
+        i2 = keys.index(k2)
+        keys[i1], keys[i2] = keys[i2], keys[i1]
+        items = [(k, self[k]) for k in keys]
+        self.clear()
+        self.update(items)
+
 
-    def __iter__(self):
-        for k in self._keys:
-            yield k
+# vim: sw=4
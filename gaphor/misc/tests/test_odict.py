@@ -0,0 +1,48 @@
+import unittest
+
+from gaphor.misc.odict import odict
+
+
+class OdictTestCase(unittest.TestCase):
+    def test_insertion_order(self):
+        d = odict()
+        d["b"] = 2
+        d["a"] = 1
+        d["c"] = 3
+        self.assertEqual(["b", "a", "c"], d.keys())
+        self.assertEqual([2, 1, 3], d.values())
+        self.assertEqual([("b", 2), ("a", 1), ("c", 3)], d.items())
+        self.assertEqual(["b", "a", "c"], list(d))
+
+    def test_delete(self):
+        d = odict()
+        for i in range(10):
+            d[i] = i
+        del d[3]
+        del d[7]
+        self.assertEqual([0, 1, 2, 4, 5, 6, 8, 9], d.keys())
+        self.assertFalse(3 in d)
+
+    def test_overwrite_keeps_position(self):
+        d = odict()
+        d["a"] = 1
+        d["b"] = 2
+        d["a"] = 3
+        self.assertEqual([("a", 3), ("b", 2)], d.items())
+
+    def test_modify_while_iterating_values(self):
+        d = odict()
+        for i in range(5):
+            d[i] = i
+        for v in d.values():
+            del d[v]
+        self.assertEqual(0, len(d))
+
+    def test_swap(self):
+        d = odict()
+        d["a"] = 1
+        d["b"] = 2
+        d["c"] = 3
+        d.swap("a", "c")
+        self.assertEqual(["c", "b", "a"], d.keys())
+        self.assertEqual(1, d["a"])
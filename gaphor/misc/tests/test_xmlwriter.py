@@ -56,6 +56,23 @@ class XMLWriterTestCase(unittest.TestCase):
         )
         assert w.s == xml, w.s
 
+    def test_fragment(self):
+        w = Writer()
+        xml_w = XMLWriter(w)
+        xml_w.startDocument()
+        xml_w.startElement("foo", {})
+        xml_w.fragment("<bar>hello</bar>")
+        xml_w.startElement("baz", {})
+        xml_w.endElement("baz")
+        xml_w.fragment("<bar/>")
+        xml_w.endElement("foo")
+
+        xml = (
+            """<?xml version="1.0" encoding="%s"?>\n<foo>\n<bar>hello</bar>\n<baz/>\n<bar/>\n</foo>"""
+            % sys.getdefaultencoding()
+        )
+        assert w.s == xml, w.s
+
     def test_elements_ns_default(self):
         w = Writer()
         xml_w = XMLWriter(w)
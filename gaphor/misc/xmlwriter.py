@@ -16,12 +16,27 @@ except ImportError:
     _error_handling = "strict"
 
 
+# Output is collected in memory and written in blocks of this size.
+BUFFER_SIZE = 64 * 1024
+
+
 class XMLWriter(xml.sax.handler.ContentHandler):
-    def __init__(self, out=None, encoding=None):
+    """
+    Write SAX events as XML to a file object.
+
+    Output is buffered. The buffer is flushed when it is full, when a top
+    level element is closed and on endDocument().
+    """
+
+    def __init__(self, out=None, encoding=None, buffer_size=BUFFER_SIZE):
         if out is None:
             out = sys.stdout
         xml.sax.handler.ContentHandler.__init__(self)
         self._out = out
+        self._buffer = []
+        self._buffered = 0
+        self._buffer_size = buffer_size
+        self._depth = 0
         self._ns_contexts = [{}]  # contains uri -> prefix dicts
         self._current_context = self._ns_contexts[-1]
         self._undeclared_ns_maps = []
@@ -31,6 +46,24 @@ class XMLWriter(xml.sax.handler.ContentHandler):
         self._in_start_tag = False
         self._next_newline = False
 
+    def _append(self, text):
+        """
+        Add text to the output buffer, flush the buffer when it is full.
+        """
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered output to the file.
+        """
+        if self._buffer:
+            self._out.write(u"".join(self._buffer))
+            del self._buffer[:]
+            self._buffered = 0
+
     def _write(self, text, start_tag=False, end_tag=False):
         """
         Write data. Tags should not be escaped. They should be marked
@@ -42,33 +75,29 @@ class XMLWriter(xml.sax.handler.ContentHandler):
             text = text.decode(self._encoding, _error_handling)
 
         if self._next_newline:
-            self._out.write(u"\n")
+            prefix = u"\n"
             self._next_newline = False
+        else:
+            prefix = u""
 
         if start_tag and not self._in_start_tag:
             self._in_start_tag = True
-            self._out.write(u"<")
+            self._append(prefix + u"<" + text)
         elif start_tag and self._in_start_tag:
-            self._out.write(u">")
-            self._out.write(u"\n")
-            self._out.write(u"<")
+            self._append(prefix + u">\n<" + text)
         elif end_tag and self._in_start_tag:
-            self._out.write(u"/>")
+            self._append(prefix + u"/>")
             self._in_start_tag = False
             self._next_newline = True
-            return
         elif not start_tag and self._in_start_tag:
-            self._out.write(u">")
+            self._append(prefix + u">" + text)
             self._in_start_tag = False
         elif end_tag:
-            self._out.write(u"</")
-            self._out.write(text)
-            self._out.write(u">")
+            self._append(prefix + u"</" + text + u">")
             self._in_start_tag = False
             self._next_newline = True
-            return
-
-        self._out.write(text)
+        else:
+            self._append(prefix + text)
 
     def _qname(self, name):
         """Builds a qualified name from a (ns_url, localname) pair"""
@@ -86,6 +115,9 @@ class XMLWriter(xml.sax.handler.ContentHandler):
     def startDocument(self):
         self._write(u'<?xml version="1.0" encoding="%s"?>\n' % self._encoding)
 
+    def endDocument(self):
+        self.flush()
+
     def startPrefixMapping(self, prefix, uri):
         self._ns_contexts.append(self._current_context.copy())
         self._current_context[uri] = prefix
@@ -96,28 +128,51 @@ class XMLWriter(xml.sax.handler.ContentHandler):
         del self._ns_contexts[-1]
 
     def startElement(self, name, attrs):
+        self._depth += 1
         self._write(name, start_tag=True)
         for (name, value) in list(attrs.items()):
-            self._out.write(u" %s=%s" % (name, quoteattr(value)))
+            self._append(u" %s=%s" % (name, quoteattr(value)))
 
     def endElement(self, name):
         self._write(name, end_tag=True)
+        self._depth -= 1
+        if not self._depth:
+            self.flush()
 
     def startElementNS(self, name, qname, attrs):
+        self._depth += 1
         self._write(self._qname(name), start_tag=True)
 
         for prefix, uri in self._undeclared_ns_maps:
             if prefix:
-                self._out.write(u' xmlns:%s="%s"' % (prefix, uri))
+                self._append(u' xmlns:%s="%s"' % (prefix, uri))
             else:
-                self._out.write(u' xmlns="%s"' % uri)
+                self._append(u' xmlns="%s"' % uri)
         self._undeclared_ns_maps = []
 
         for (name, value) in list(attrs.items()):
-            self._out.write(u" %s=%s" % (self._qname(name), quoteattr(value)))
+            self._append(u" %s=%s" % (self._qname(name), quoteattr(value)))
 
     def endElementNS(self, name, qname):
         self._write(u"%s" % self._qname(name), end_tag=True)
+        self._depth -= 1
+        if not self._depth:
+            self.flush()
+
+    def fragment(self, xml):
+        """
+        Write a serialized XML element, e.g. the output of another XMLWriter,
+        as child of the current element. The fragment is written as-is.
+        """
+        if self._next_newline:
+            self._append(u"\n")
+        if self._in_start_tag:
+            self._append(u">\n")
+            self._in_start_tag = False
+        self._append(xml)
+        self._next_newline = True
+        if not self._depth:
+            self.flush()
 
     def characters(self, content):
         if self._in_cdata:
@@ -33,11 +33,15 @@ def get_superclasses(class_):
 
 
 def check_classes(element_factory):
-    classes = element_factory.select(lambda e: e.isKindOf(UML.Class))
-    names = [c.name for c in classes]
-    for c in classes:
-        if names.count(c.name) > 1:
-            report(c, "Class name %s used more than once" % c.name)
+    indexed = element_factory.add_index(UML.NamedElement.name)
+    try:
+        for c in element_factory.select_type(UML.Class):
+            named = element_factory.select_by(UML.NamedElement.name, c.name)
+            if sum(1 for e in named if isinstance(e, UML.Class)) > 1:
+                report(c, "Class name %s used more than once" % c.name)
+    finally:
+        if indexed:
+            element_factory.remove_index(UML.NamedElement.name)
 
 
 def check_association_end_subsets(element_factory, end):
@@ -46,9 +50,9 @@ def check_association_end_subsets(element_factory, end):
     opposite_subsets = get_subsets(
         end.opposite.taggedValue and end.opposite.taggedValue[0].value or ""
     )
-    subset_properties = element_factory.select(
-        lambda e: e.isKindOf(UML.Property) and e.name in subsets
-    )
+    subset_properties = [
+        p for p in element_factory.select_type(UML.Property) if p.name in subsets
+    ]
 
     # TODO: check if properties belong to a superclass of the end's class
 
@@ -87,7 +91,7 @@ def check_association_end(element_factory, end):
 
 
 def check_associations(element_factory):
-    for a in element_factory.select(lambda e: e.isKindOf(UML.Association)):
+    for a in element_factory.select_type(UML.Association):
         assert len(a.memberEnd) == 2
         head = a.memberEnd[0]
         tail = a.memberEnd[1]
@@ -96,9 +100,9 @@ def check_associations(element_factory):
 
 
 def check_attributes(element_factory):
-    for a in element_factory.select(
-        lambda e: e.isKindOf(UML.Property) and not e.association
-    ):
+    for a in element_factory.select_type(UML.Property):
+        if a.association:
+            continue
         if not a.typeValue or not a.typeValue.value:
             report(a, "Attribute has no type: %s" % a.name)
         elif a.typeValue.value.lower() not in (
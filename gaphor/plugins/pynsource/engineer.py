@@ -25,6 +25,15 @@ class Engineer(object):
     diagram_layout = inject("diagram_layout")
 
     def process(self, files=None):
+        # Classes are looked up by name
+        indexed = self.element_factory.add_index(UML.NamedElement.name)
+        try:
+            self._process(files)
+        finally:
+            if indexed:
+                self.element_factory.remove_index(UML.NamedElement.name)
+
+    def _process(self, files):
 
         # these are tuples between class names.
         # self.associations_generalisation = []
@@ -42,9 +51,11 @@ class Engineer(object):
         print(p)
 
         try:
-            self._root_package = self.element_factory.lselect(
-                lambda e: isinstance(e, UML.Package) and not e.namespace
-            )[0]
+            self._root_package = [
+                p
+                for p in self.element_factory.select_type(UML.Package)
+                if not p.namespace
+            ][0]
         except IndexError:
             pass  # running as test?
 
@@ -96,9 +107,13 @@ class Engineer(object):
                     ].gaphor_class_item
                 except KeyError as e:
                     print("No class found named", superclassname)
-                    others = self.element_factory.lselect(
-                        lambda e: isinstance(e, UML.Class) and e.name == superclassname
-                    )
+                    others = [
+                        c
+                        for c in self.element_factory.select_by(
+                            UML.NamedElement.name, superclassname
+                        )
+                        if isinstance(c, UML.Class)
+                    ]
                     if others:
                         superclass = others[0]
                         print("Found class in factory: %s" % superclass.name)
@@ -161,9 +176,13 @@ class Engineer(object):
             superclass_item = self.parser.classlist[classname].gaphor_class_item
         except KeyError as e:
             print("No class found named", classname)
-            others = self.element_factory.lselect(
-                lambda e: isinstance(e, UML.Class) and e.name == classname
-            )
+            others = [
+                c
+                for c in self.element_factory.select_by(
+                    UML.NamedElement.name, classname
+                )
+                if isinstance(c, UML.Class)
+            ]
             if others:
                 superclass = others[0]
                 print("Found class in factory: %s" % superclass.name)
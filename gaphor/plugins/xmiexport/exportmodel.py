@@ -1,5 +1,6 @@
 from builtins import object
 from builtins import str
+from gaphor import UML
 from gaphor.misc.xmlwriter import XMLWriter
 
 
@@ -246,24 +247,23 @@ class XMIExport(object):
 
         xmi.startElement("XMI", attrs=attributes)
 
-        for package in self.element_factory.select(self.select_package):
+        for package in self.select_type(UML.Package):
             self.handle(xmi, package)
 
-        for generalization in self.element_factory.select(self.select_generalization):
+        for generalization in self.select_type(UML.Generalization):
             self.handle(xmi, generalization)
 
-        for realization in self.element_factory.select(self.select_realization):
+        for realization in self.select_type(UML.Implementation):
             self.handle(xmi, realization)
 
         xmi.endElement("XMI")
 
         log.debug(self.handled_ids)
 
-    def select_package(self, element):
-        return element.__class__.__name__ == "Package"
-
-    def select_generalization(self, element):
-        return element.__class__.__name__ == "Generalization"
-
-    def select_realization(self, element):
-        return element.__class__.name__ == "Implementation"
+    def select_type(self, type):
+        """
+        Iterate the elements of class type, not of its subclasses.
+        """
+        for element in self.element_factory.select_type(type):
+            if element.__class__ is type:
+                yield element
@@ -6,12 +6,11 @@ Maybe we should split the ComponentRegistry in a Dispatcher (register_handler,
 unregister_handler, handle), a AdapterRegistry and a Subscription registry.
 """
 
-from builtins import map
 from builtins import object
 from zope import component
 
 from zope.interface import registry
-from zope.interface import implementer
+from zope.interface import implementer, providedBy
 
 from gaphor.interfaces import IService, IEventFilter
 
@@ -25,10 +24,17 @@ class ZopeComponentRegistry(object):
 
     This service should not be called directly, but through more specific
     service such as Dispatcher and AdapterRegistry.
+
+    Events are dispatched by handle(). The event filters and handlers that
+    apply to an event type are looked up once and kept until a component
+    is (un)registered, here or in the global registry.
     """
 
     def __init__(self):
-        pass
+        # Interface spec of an event: (filters, handlers)
+        self._dispatch = {}
+        # Generation of the adapter registry the dispatch table is valid for
+        self._generation = None
 
     def init(self, app):
         self._components = registry.Components(
@@ -146,23 +152,53 @@ class ZopeComponentRegistry(object):
         """
         self._components.unregisterHandler(factory, required)
 
-    def _filter(self, objects):
-        filtered = list(objects)
-        for o in objects:
-            for adapter in self._components.subscribers(objects, IEventFilter):
-                if adapter.filter():
-                    # event is blocked
-                    filtered.remove(o)
-                    break
-        return filtered
+    def _lookup(self, event):
+        """
+        Return the filter factories and the handlers for ``event``.
+        """
+        adapters = self._components.adapters
+        # The generation changes on every change to the registry and its
+        # bases (the global site manager)
+        if adapters._generation != self._generation:
+            self._dispatch.clear()
+            self._generation = adapters._generation
 
-    def handle(self, *events):
+        spec = providedBy(event)
+        try:
+            return self._dispatch[spec]
+        except KeyError:
+            entry = self._dispatch[spec] = (
+                tuple(adapters.subscriptions((spec,), IEventFilter)),
+                tuple(adapters.subscriptions((spec,), None)),
+            )
+            return entry
+
+    def has_handlers(self, event):
+        """
+        Return True if handlers are registered for ``event``.
         """
-        Send event notifications to registered handlers.
+        return bool(self._lookup(event)[1])
+
+    def handle(self, *events):
         """
-        objects = self._filter(events)
-        if objects:
-            list(map(self._components.handle, events))
+        Send event notifications to registered handlers. Events blocked by
+        an event filter (IEventFilter) are not sent.
+        """
+        lookup = self._lookup
+        for event in events:
+            filters, handlers = lookup(event)
+            if filters and self._filtered(event, filters):
+                continue
+            for handler in handlers:
+                handler(event)
+
+    def _filtered(self, event, filters):
+        for factory in filters:
+            adapter = factory(event)
+            if adapter is not None and adapter.filter():
+                # event is blocked
+                return True
+        return False
 
 
 # vim:sw=4:et:ai
@@ -0,0 +1,85 @@
+"""
+The event coalescer collects the element change events sent during a
+transaction, and sends them as one ElementChangeSet when the transaction
+ends.
+
+A single user action can send hundreds of change events. Handlers that only
+update a view, like the tree view, can handle the ElementChangeSet instead
+of the change events, and update once per transaction. Handlers that keep
+the model consistent, and the undo manager, should keep handling the
+change events themselves.
+
+Outside a transaction every change event is sent on as a change set on
+its own, if there are handlers for change sets.
+"""
+
+from builtins import object
+from zope import component
+
+from zope.interface import implementer
+
+from gaphor.core import inject
+from gaphor.event import TransactionBegin, TransactionCommit, TransactionRollback
+from gaphor.interfaces import IService
+from gaphor.UML.event import ElementChangeSet
+from gaphor.UML.interfaces import IElementChangeEvent
+
+
+@implementer(IService)
+class EventCoalescer(object):
+    """
+    Send the element changes of a transaction as one ElementChangeSet.
+    """
+
+    component_registry = inject("component_registry")
+
+    def __init__(self):
+        # The changes of the current transaction
+        self._changes = None
+
+    def init(self, app):
+        cr = self.component_registry
+        cr.register_handler(self._on_element_change)
+        cr.register_handler(self._on_transaction_begin)
+        cr.register_handler(self._on_transaction_commit)
+        cr.register_handler(self._on_transaction_rollback)
+
+    def shutdown(self):
+        cr = self.component_registry
+        cr.unregister_handler(self._on_element_change)
+        cr.unregister_handler(self._on_transaction_begin)
+        cr.unregister_handler(self._on_transaction_commit)
+        cr.unregister_handler(self._on_transaction_rollback)
+        self._changes = None
+
+    @component.adapter(IElementChangeEvent)
+    def _on_element_change(self, event):
+        if self._changes is not None:
+            self._changes.add(event)
+        else:
+            changes = ElementChangeSet()
+            # Do not send the change twice if nobody wants change sets
+            if self.component_registry.has_handlers(changes):
+                changes.add(event)
+                self.component_registry.handle(changes)
+
+    @component.adapter(TransactionBegin)
+    def _on_transaction_begin(self, event):
+        self._changes = ElementChangeSet()
+
+    @component.adapter(TransactionCommit)
+    def _on_transaction_commit(self, event):
+        self._flush()
+
+    @component.adapter(TransactionRollback)
+    def _on_transaction_rollback(self, event):
+        # The changes are undone, but views may have shown them already
+        self._flush()
+
+    def _flush(self):
+        changes, self._changes = self._changes, None
+        if changes:
+            self.component_registry.handle(changes)
+
+
+# vim:sw=4:et:ai
@@ -3,6 +3,7 @@ The file service is responsible for loading and saving the user data.
 """
 
 import logging
+import os
 from builtins import object
 from builtins import range
 from zope import component
@@ -13,15 +14,17 @@ from zope.interface import implementer
 from gaphor import UML
 from gaphor.core import _, inject, action, build_action_group
 from gaphor.interfaces import IService, IActionProvider, IServiceEvent
+from gaphor.misc import get_user_data_dir
 from gaphor.misc.errorhandler import error_handler
 from gaphor.misc.gidlethread import GIdleThread, Queue
 from gaphor.misc.xmlwriter import XMLWriter
-from gaphor.storage import storage, verify
+from gaphor.storage import compression, journal, snapshot, storage, verify
 from gaphor.ui.filedialog import FileDialog
 from gaphor.ui.questiondialog import QuestionDialog
 from gaphor.ui.statuswindow import StatusWindow
 
 DEFAULT_EXT = ".gaphor"
+MODEL_PATTERNS = ["*.gaphor", "*.gaphor.gz", "*.gaphor.xz", "*.gaphor.zst"]
 MAX_RECENT = 10
 
 log = logging.getLogger(__name__)
@@ -87,9 +90,12 @@ class FileManager(object):
     """
 
     def __init__(self):
-        """File manager constructor.  There is no current filename yet."""
+        """File manager constructor.  There is no current filename yet.
+        Serialized model elements are cached between saves."""
 
         self._filename = None
+        self._save_cache = storage.SaveCache()
+        self._change_recorder = journal.ChangeRecorder()
 
     def init(self, app):
         """File manager service initialization.  The app parameter
@@ -112,11 +118,19 @@ class FileManager(object):
 
         self.update_recent_files()
 
+        self._save_cache.register(self.component_registry)
+        self._change_recorder.register(self.component_registry)
+
     def shutdown(self):
         """Called when shutting down the file manager service."""
 
         log.info("Shutting down")
 
+        self._save_cache.unregister(self.component_registry)
+        self._save_cache.clear()
+        self._change_recorder.unregister(self.component_registry)
+        self._change_recorder.clear()
+
     def get_filename(self):
         """Return the current file name.  This method is used by the filename
         property."""
@@ -205,7 +219,15 @@ class FileManager(object):
         """Load the Gaphor model from the supplied file name.  A status window
         displays the loading progress.  The load generator updates the progress
         queue.  The loader is passed to a GIdleThread which executes the load
-        generator.  If loading is successful, the filename is set."""
+        generator.  If loading is successful, the filename is set.
+
+        With the "lazy-diagram-loading" property set, the items of a diagram
+        are only loaded once the diagram is opened.  The changes in the journal
+        of the model file, if any, are applied to the loaded model.
+
+        With the "snapshot-cache" property set, the parsed model is kept in
+        a snapshot in the user's data directory, so the model loads faster
+        the next time it is opened unchanged."""
 
         log.info("Loading file")
         log.debug("Path is %s" % filename)
@@ -223,9 +245,33 @@ class FileManager(object):
         except component.interfaces.ComponentLookupError:
             status_window = None
 
+        try:
+            lazy = self.properties.get("lazy-diagram-loading", False)
+        except component.interfaces.ComponentLookupError:
+            lazy = False
+
+        model_journal = journal.Journal(filename)
+        if not model_journal.exists():
+            model_journal = None
+
+        try:
+            use_snapshot = self.properties.get("snapshot-cache", False)
+        except component.interfaces.ComponentLookupError:
+            use_snapshot = False
+
+        model_snapshot = None
+        if use_snapshot:
+            model_snapshot = snapshot.Snapshot(
+                filename, os.path.join(get_user_data_dir(), "snapshots")
+            )
+
         try:
             loader = storage.load_generator(
-                filename.encode("utf-8"), self.element_factory
+                filename.encode("utf-8"),
+                self.element_factory,
+                lazy,
+                model_journal,
+                model_snapshot,
             )
             worker = GIdleThread(loader, queue)
 
@@ -236,6 +282,8 @@ class FileManager(object):
                 worker.reraise()
 
             self.filename = filename
+            if model_journal and self.journal_save:
+                self._change_recorder.reset(self.element_factory, filename)
         except:
             error_handler(
                 message=_("Error while loading model from file %s") % filename
@@ -270,19 +318,20 @@ class FileManager(object):
             dialog.destroy()
 
             if not answer:
-                for orphan in orphans:
-                    orphan.unlink()
+                self.element_factory.unlink_many(orphans)
 
     def verify_filename(self, filename):
         """Verify that the supplied filename is using the proper default
         extension.  If not, the extension is added to the filename
-        and returned."""
+        and returned.  A compression extension (e.g. ".gaphor.gz") is
+        kept at the end of the filename."""
 
         log.debug("Verifying file name")
         log.debug("File name is %s" % filename)
 
-        if not filename.endswith(DEFAULT_EXT):
-            filename = filename + DEFAULT_EXT
+        base, compressed = compression.split_extension(filename)
+        if not base.endswith(DEFAULT_EXT):
+            filename = base + DEFAULT_EXT + filename[len(base) :]
 
         return filename
 
@@ -302,6 +351,10 @@ class FileManager(object):
         self.verify_orphans()
         filename = self.verify_filename(filename)
 
+        if self.save_journal(filename):
+            self.filename = filename
+            return
+
         main_window = self.main_window
         queue = Queue()
         status_window = StatusWindow(
@@ -311,8 +364,10 @@ class FileManager(object):
             queue=queue,
         )
         try:
-            with open(filename.encode("utf-8"), "w") as out:
-                saver = storage.save_generator(XMLWriter(out), self.element_factory)
+            with compression.open_for_writing(filename) as out:
+                saver = storage.save_generator(
+                    XMLWriter(out), self.element_factory, self._save_cache
+                )
                 worker = GIdleThread(saver, queue)
                 worker.start()
                 worker.wait()
@@ -320,6 +375,12 @@ class FileManager(object):
             if worker.error:
                 worker.reraise()
 
+            journal.Journal(filename).remove()
+            if self.journal_save:
+                self._change_recorder.reset(self.element_factory, filename)
+            else:
+                self._change_recorder.clear()
+
             self.filename = filename
         except:
             error_handler(message=_("Error while saving model to file %s") % filename)
@@ -327,6 +388,37 @@ class FileManager(object):
         finally:
             status_window.destroy()
 
+    def get_journal_save(self):
+        """Returns True if changes should be appended to the journal of the
+        model file, instead of saving the full model (the "journal-save"
+        property)."""
+
+        try:
+            return self.properties.get("journal-save", False)
+        except component.interfaces.ComponentLookupError:
+            return False
+
+    journal_save = property(get_journal_save)
+
+    def save_journal(self, filename):
+        """Append the changes made since the model was last saved to the
+        journal of the model file.  Returns False if the full model should
+        be saved: when journal saving is disabled, the model was not saved
+        to this file before or the journal grew too large."""
+
+        if not self.journal_save or self._change_recorder.filename != filename:
+            return False
+
+        model_journal = journal.Journal(filename)
+        if model_journal.needs_compaction():
+            log.info("Compacting journal %s" % model_journal.filename)
+            return False
+
+        log.info("Saving changes to journal")
+        model_journal.append(self._change_recorder.records())
+        self._change_recorder.mark_saved()
+        return True
+
     def _open_dialog(self, title):
         """Open a file chooser dialog to select a model
         file to open."""
@@ -345,7 +437,8 @@ class FileManager(object):
 
         filter = Gtk.FileFilter()
         filter.set_name("Gaphor models")
-        filter.add_pattern("*.gaphor")
+        for pattern in MODEL_PATTERNS:
+            filter.add_pattern(pattern)
         filesel.add_filter(filter)
 
         filter = Gtk.FileFilter()
@@ -407,7 +500,7 @@ class FileManager(object):
         """This menu action opens the new model from template dialog."""
 
         filters = [
-            {"name": _("Gaphor Models"), "pattern": "*.gaphor"},
+            {"name": _("Gaphor Models"), "pattern": MODEL_PATTERNS},
             {"name": _("All Files"), "pattern": "*"},
         ]
 
@@ -429,7 +522,7 @@ class FileManager(object):
         """This menu action opens the standard model open dialog."""
 
         filters = [
-            {"name": _("Gaphor Models"), "pattern": "*.gaphor"},
+            {"name": _("Gaphor Models"), "pattern": MODEL_PATTERNS},
             {"name": _("All Files"), "pattern": "*"},
         ]
 
@@ -0,0 +1,84 @@
+"""
+Test the EventCoalescer.
+"""
+
+import unittest
+
+from zope import component
+
+from gaphor import UML
+from gaphor.application import Application
+from gaphor.transaction import Transaction
+from gaphor.UML.interfaces import IElementChangeSetEvent
+
+
+class EventCoalescerTestCase(unittest.TestCase):
+    def setUp(self):
+        Application.init(["element_factory", "event_coalescer"])
+        self.element_factory = Application.get_service("element_factory")
+        self.component_registry = Application.get_service("component_registry")
+        self.change_sets = []
+        self.component_registry.register_handler(self._on_changes)
+
+    def tearDown(self):
+        self.component_registry.unregister_handler(self._on_changes)
+        Application.shutdown()
+
+    @component.adapter(IElementChangeSetEvent)
+    def _on_changes(self, event):
+        self.change_sets.append(list(event))
+
+    def test_changes_in_transaction(self):
+        factory = self.element_factory
+        c = factory.create(UML.Class)
+        p1 = factory.create(UML.Package)
+        p2 = factory.create(UML.Package)
+
+        with Transaction():
+            c.name = "a"
+            c.name = "b"
+            c.package = p1
+            c.package = p2
+            self.assertEqual([], self.change_sets)
+
+        self.assertEqual(1, len(self.change_sets))
+        changes = dict(((ch.element, ch.property), ch) for ch in self.change_sets[0])
+
+        name = changes[c, UML.NamedElement.name]
+        self.assertEqual((None, "b"), (name.old_value, name.new_value))
+        package = changes[c, UML.Type.package]
+        self.assertEqual((None, p2), (package.old_value, package.new_value))
+        # The opposite ends are recorded as well
+        self.assertTrue((p1, UML.Package.ownedClassifier) in changes)
+        self.assertTrue((p2, UML.Package.ownedClassifier) in changes)
+
+    def test_changes_outside_transaction(self):
+        c = self.element_factory.create(UML.Class)
+        c.name = "a"
+        c.name = "b"
+        self.assertEqual(2, len(self.change_sets))
+        self.assertEqual("b", self.change_sets[1][0].new_value)
+
+    def test_no_change_sets_without_handlers(self):
+        from gaphor.UML.event import ElementChangeSet
+
+        cr = self.component_registry
+        cr.unregister_handler(self._on_changes)
+        handled = []
+        handle = cr.handle
+
+        def record(*events):
+            handled.extend(events)
+            handle(*events)
+
+        cr.handle = record
+        try:
+            self.element_factory.create(UML.Class).name = "a"
+        finally:
+            del cr.handle
+            cr.register_handler(self._on_changes)
+        self.assertTrue(handled)
+        self.assertFalse([e for e in handled if isinstance(e, ElementChangeSet)])
+
+
+# vim:sw=4:et:ai
@@ -0,0 +1,142 @@
+"""
+Test writing undo transactions to the undo journal.
+"""
+
+from gaphor import UML
+from gaphor.application import Application
+from gaphor.services.undojournal import SpilledActionStack
+from gaphor.services.undomanager import UndoManager
+from gaphor.tests.testcase import TestCase
+from gaphor.transaction import Transaction
+
+
+class UndoJournalTestCase(TestCase):
+    def setUp(self):
+        super(UndoJournalTestCase, self).setUp()
+        self.element_factory.flush()
+        self.undo_manager = UndoManager()
+        self.undo_manager.init(Application)
+        # Keep only the latest transaction in memory
+        self.undo_manager._stack_budget = 0
+
+    def tearDown(self):
+        self.undo_manager.shutdown()
+        super(UndoJournalTestCase, self).tearDown()
+
+    def test_spill_and_undo(self):
+        factory = self.element_factory
+        undo_manager = self.undo_manager
+
+        with Transaction():
+            package = factory.create(UML.Package)
+            package.name = "p"
+            classes = factory.create_many(UML.Class, [None, None])
+            for c in classes:
+                c.package = package
+        with Transaction():
+            classes[0].name = "c"
+            classes[0].isAbstract = True
+        with Transaction():
+            factory.unlink_many([package])
+        with Transaction():
+            factory.create(UML.Package).name = "other"
+
+        stack = undo_manager._undo_stack
+        self.assertEqual(4, len(stack))
+        self.assertTrue(all(isinstance(tx, SpilledActionStack) for tx in stack[:3]))
+        self.assertFalse(isinstance(stack[3], SpilledActionStack))
+
+        undo_manager.undo_transaction()
+        self.assertEqual(0, len(factory.lselect()))
+
+        # The deleted elements are created anew
+        undo_manager.undo_transaction()
+        self.assertEqual(3, len(factory.lselect()))
+        package = factory.lookup(package.id)
+        self.assertEqual("p", package.name)
+        classes = [factory.lookup(c.id) for c in classes]
+        self.assertEqual(set(classes), set(package.ownedClassifier))
+        self.assertEqual("c", classes[0].name)
+        self.assertTrue(classes[0].isAbstract)
+
+        undo_manager.undo_transaction()
+        self.assertEqual(None, classes[0].name)
+        self.assertFalse(classes[0].isAbstract)
+
+        undo_manager.undo_transaction()
+        self.assertEqual(0, len(factory.lselect()))
+        self.assertFalse(undo_manager.can_undo())
+
+        undo_manager.redo_transaction()
+        undo_manager.redo_transaction()
+        self.assertEqual("c", classes[0].name)
+        self.assertEqual(package, classes[1].package)
+
+    def test_drop_unwritable_transactions(self):
+        from gaphor.UML.properties import attribute
+
+        class A(UML.Element):
+            attr = attribute("attr", str)
+
+        a = A()
+        with Transaction():
+            self.element_factory.create(UML.Class)
+        with Transaction():
+            self.element_factory.create(UML.Class)
+        with Transaction():
+            a.attr = "a"
+        with Transaction():
+            self.element_factory.create(UML.Class)
+        with Transaction():
+            self.element_factory.create(UML.Class)
+
+        # A is not a UML class: that transaction is dropped, together with
+        # the older transactions
+        stack = self.undo_manager._undo_stack
+        self.assertEqual(2, len(stack))
+        self.assertTrue(isinstance(stack[0], SpilledActionStack))
+
+        self.undo_manager.undo_transaction()
+        self.undo_manager.undo_transaction()
+        self.assertFalse(self.undo_manager.can_undo())
+        self.assertEqual("a", a.attr)
+        self.assertEqual(2, len(self.element_factory.lselect()))
+
+    def test_spill_oldest_transactions_only(self):
+        from gaphor.UML.properties import association
+
+        class A(UML.Element):
+            subject = association("subject", UML.Class, upper=1)
+
+        a = A()
+        factory = self.element_factory
+        self.undo_manager._stack_budget = 10 ** 6
+        with Transaction():
+            c = factory.create(UML.Class)
+        with Transaction():
+            a.subject = c
+        with Transaction():
+            del a.subject
+        self.undo_manager._stack_budget = 0
+        with Transaction():
+            c.unlink()
+
+        # The transactions that refer to c are not kept in memory when
+        # older transactions are written to the journal
+        stack = self.undo_manager._undo_stack
+        self.assertEqual(1, len(stack))
+
+        with Transaction():
+            factory.create(UML.Package)
+        self.assertEqual(
+            [True, False], [isinstance(tx, SpilledActionStack) for tx in stack]
+        )
+
+        self.undo_manager.undo_transaction()
+        self.undo_manager.undo_transaction()
+        self.assertFalse(self.undo_manager.can_undo())
+        self.assertEqual(None, a.subject)
+        self.assertTrue(factory.lookup(c.id) is not None)
+
+
+# vim:sw=4:et:ai
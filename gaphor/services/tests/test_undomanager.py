@@ -286,6 +286,202 @@ class TestUndoManager(TestCase):
 
         undo_manager.shutdown()
 
+    def test_element_factory_undo_many(self):
+        from gaphor import UML
+
+        ef = self.element_factory
+        ef.flush()
+
+        undo_manager = UndoManager()
+        undo_manager.init(Application)
+        undo_manager.begin_transaction()
+        classes = ef.create_many(UML.Class, [None, None, "c3"])
+        undo_manager.commit_transaction()
+        assert ef.size() == 3
+        assert ef.lookup("c3") is classes[2]
+
+        undo_manager.undo_transaction()
+        assert ef.size() == 0
+
+        undo_manager.redo_transaction()
+        assert ef.lselect() == classes
+
+        package = ef.create(UML.Package)
+        for c in classes:
+            c.package = package
+
+        undo_manager.begin_transaction()
+        deleted = ef.unlink_many([package])
+        undo_manager.commit_transaction()
+        assert ef.size() == 0
+        assert len(deleted) == 4
+
+        undo_manager.undo_transaction()
+        assert ef.size() == 4
+        assert set(package.ownedClassifier) == set(classes)
+
+        undo_manager.shutdown()
+
+    def test_compact_transaction(self):
+        from gaphor import UML
+
+        ef = self.element_factory
+        ef.flush()
+        package = ef.create(UML.Package)
+        c = ef.create(UML.Class)
+        c.name = "c"
+
+        undo_manager = UndoManager()
+        undo_manager.init(Application)
+        undo_manager.begin_transaction()
+        for n in range(10):
+            c.name = "c%d" % n
+            c.package = package
+            c.package = None
+        temp = ef.create(UML.Class)
+        temp.name = "temp"
+        temp.package = package
+        temp.unlink()
+        undo_manager.commit_transaction()
+
+        # The package is set and unset, the ownedClassifier changes cancel out
+        tx = undo_manager._undo_stack[0]
+        assert len(tx._actions) == 2, tx._actions
+
+        undo_manager.undo_transaction()
+        assert c.name == "c"
+        assert c.package is None
+        assert list(package.ownedClassifier) == []
+        assert temp not in ef.lselect()
+
+        undo_manager.redo_transaction()
+        assert c.name == "c9"
+        assert c.package is None
+
+        undo_manager.shutdown()
+
+    def test_compact_drag(self):
+        from gaphas.connector import Handle
+
+        undo_manager = UndoManager()
+        undo_manager.init(Application)
+        h = Handle((0, 0))
+        undo_manager.begin_transaction()
+        for n in range(10):
+            h.pos.x = n
+            h.pos.y = 2 * n
+        undo_manager.commit_transaction()
+
+        # Only the first revert of the x and y position is kept
+        tx = undo_manager._undo_stack[0]
+        assert len(tx._actions) == 2, tx._actions
+
+        undo_manager.undo_transaction()
+        assert tuple(h.pos) == (0, 0)
+
+        undo_manager.redo_transaction()
+        assert tuple(h.pos) == (9, 18)
+
+        undo_manager.shutdown()
+
+    def test_stack_budget(self):
+        from gaphor import UML
+        from gaphor.services.undojournal import SpilledActionStack
+
+        def in_memory():
+            return [
+                tx
+                for tx in undo_manager._undo_stack
+                if not isinstance(tx, SpilledActionStack)
+            ]
+
+        undo_manager = UndoManager()
+        undo_manager.init(Application)
+
+        for n in range(5):
+            with Transaction():
+                self.element_factory.create(UML.Class)
+        size = undo_manager._undo_stack[0].size()
+        assert len(in_memory()) == 5
+
+        # The oldest transactions are written to the undo journal, they
+        # take little memory
+        spilled_size = SpilledActionStack(None, 0, 0).size()
+        undo_manager._stack_budget = 2 * size + 4 * spilled_size
+        with Transaction():
+            self.element_factory.create(UML.Class)
+        assert len(undo_manager._undo_stack) == 6
+        assert len(in_memory()) == 2
+
+        # The latest transaction is always kept in memory
+        undo_manager._stack_budget = 0
+        with Transaction():
+            self.element_factory.create(UML.Class)
+        assert len(undo_manager._undo_stack) == 7
+        assert len(in_memory()) == 1
+
+        undo_manager.shutdown()
+
+    def test_stack_budget_unwritable(self):
+        undo_manager = UndoManager()
+        undo_manager.init(Application)
+        undo_manager._stack_budget = 1000
+
+        for n in range(500):
+            with Transaction():
+                undo_manager.add_undo_action(lambda: None)
+
+        # Transactions that can not be written to the undo journal are
+        # dropped once the stack is over budget
+        stack = undo_manager._undo_stack
+        assert sum(tx.size() for tx in stack[:-1]) <= 1000
+        assert len(stack) < 500
+
+        undo_manager.shutdown()
+
+    def test_state_changed_once_per_transaction(self):
+        from zope import component
+        from gaphor import UML
+        from gaphor.services.undomanager import UndoManagerStateChanged
+
+        events = []
+
+        @component.adapter(UndoManagerStateChanged)
+        def handler(event):
+            events.append(event)
+
+        compreg = Application.get_service("component_registry")
+        undo_manager = UndoManager()
+        undo_manager.init(Application)
+        compreg.register_handler(handler)
+        try:
+            undo_manager.begin_transaction()
+            for n in range(10):
+                undo_manager.add_undo_action(lambda: None)
+            assert not events
+            undo_manager.commit_transaction()
+            assert len(events) == 1, events
+
+            # Nothing changes for an empty transaction
+            undo_manager.begin_transaction()
+            undo_manager.commit_transaction()
+            assert len(events) == 1, events
+
+            # Undo and redo record changes in a transaction of their own
+            c = self.element_factory.create(UML.Class)
+            with Transaction():
+                c.name = "c"
+            del events[:]
+            undo_manager.undo_transaction()
+            assert c.name is None
+            assert len(events) == 1, events
+            undo_manager.redo_transaction()
+            assert c.name == "c"
+            assert len(events) == 2, events
+        finally:
+            compreg.unregister_handler(handler)
+            undo_manager.shutdown()
+
     def test_uml_associations(self):
 
         from zope import component
@@ -0,0 +1,223 @@
+"""
+The undo journal keeps older undo transactions in a temporary file.
+
+Undo transactions are kept in memory as actions. Once the undo history
+grows beyond its memory budget, the undo manager writes the oldest
+transactions to the undo journal. A transaction written to the journal is
+read back when it is undone.
+
+Only transactions that consist of model changes can be written to the
+journal. Other transactions, e.g. with canvas changes, are dropped from the
+undo history once it is over budget, together with all older transactions.
+The changes are written with element ids and property names instead of the
+elements and properties themselves. Each transaction is one line, a JSON
+list of changes:
+
+    ["create", [id]]
+    ["create_many", [id, ...]]
+    ["delete", [[type, id, {name: value, ...}]]]
+    ["delete_many", [[type, id, {name: value, ...}], ...]]
+    ["attribute", id, name, value]
+    ["set", id, name, refid]
+    ["add", id, name, refid]
+    ["remove", id, name, refid]
+
+The deleted elements are written with their attribute values, so they can
+be created anew when the transaction is undone. Their references are
+restored by the other changes in the transaction.
+
+The space of transactions read back from the file is not reclaimed: the
+file is removed when the undo history is reset.
+"""
+
+import json
+import logging
+import sys
+import tempfile
+from builtins import object
+
+from gaphor import UML
+from gaphor.UML.element import property_table
+from gaphor.UML.properties import redefine
+from gaphor.transaction import transactional
+
+log = logging.getLogger(__name__)
+
+
+class UndoJournal(object):
+    """
+    The temporary file undo transactions are written to.
+
+    ``undo_record`` is called with a record to undo the change it
+    describes (see UndoManager._undo_record()).
+    """
+
+    def __init__(self, element_factory, undo_record):
+        self.element_factory = element_factory
+        self.undo_record = undo_record
+        self._file = None
+
+    def spill(self, transaction):
+        """
+        Write ``transaction`` (an ActionStack) to the journal. Returns the
+        SpilledActionStack that replaces the transaction, or None if the
+        transaction can not be written.
+        """
+        records = transaction.records()
+        if not records:
+            return None
+        try:
+            changes = [self._encode(record) for record in records]
+            data = (json.dumps(changes) + "\n").encode("utf-8")
+        except (TypeError, ValueError) as e:
+            log.debug("Undo transaction is kept in memory: %s" % e)
+            return None
+
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        f = self._file
+        f.seek(0, 2)
+        offset = f.tell()
+        f.write(data)
+        return SpilledActionStack(self, offset, len(data))
+
+    def read(self, offset, length):
+        """
+        Read the transaction at ``offset`` and return its records.
+        """
+        f = self._file
+        f.seek(offset)
+        changes = json.loads(f.read(length).decode("utf-8"))
+        return self._decode(changes)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _encode(self, record):
+        kind, element, prop, value = record
+        if kind in ("create", "create_many", "delete", "delete_many"):
+            if element is not self.element_factory:
+                raise ValueError("Elements are not created by the element factory")
+            if kind in ("create", "delete"):
+                value = (value,)
+            if kind.startswith("create"):
+                return [kind, [_ref(e) for e in value]]
+            return [kind, [_describe(e) for e in value]]
+        if _property(type(element), prop.name) is not prop:
+            raise ValueError("Property %s can not be found by name" % prop.name)
+        if kind == "attribute":
+            if not isinstance(value, (type(None), bool, int, float, str, type(u""))):
+                raise ValueError("Attribute value %r can not be written" % (value,))
+            return [kind, _ref(element), prop.name, value]
+        return [kind, _ref(element), prop.name, _ref(value)]
+
+    def _decode(self, changes):
+        factory = self.element_factory
+
+        # Create the deleted elements first, other changes may refer to them
+        deleted = {}
+        for change in changes:
+            if change[0] in ("delete", "delete_many"):
+                for type_name, id, values in change[1]:
+                    element = factory.lookup(id)
+                    if element is None:
+                        element = getattr(UML, type_name)(id, factory)
+                        for name, value in values.items():
+                            element.load(name, value)
+                    deleted[id] = element
+
+        def lookup(id):
+            if id is None:
+                return None
+            element = deleted.get(id) or factory.lookup(id)
+            if element is None:
+                raise KeyError(id)
+            return element
+
+        records = []
+        for change in changes:
+            kind = change[0]
+            try:
+                if kind in ("create", "create_many", "delete", "delete_many"):
+                    ids = [c if kind.startswith("create") else c[1] for c in change[1]]
+                    elements = tuple(lookup(id) for id in ids)
+                    if kind in ("create", "delete"):
+                        elements = elements[0]
+                    records.append((kind, factory, None, elements))
+                else:
+                    id, name, value = change[1:]
+                    element = lookup(id)
+                    prop = _property(type(element), name)
+                    if kind != "attribute":
+                        value = lookup(value)
+                    records.append((kind, element, prop, value))
+            except KeyError as e:
+                log.warning("Element %s of undo change %s not found" % (e, kind))
+        return records
+
+
+class SpilledActionStack(object):
+    """
+    A transaction written to the undo journal. It can be executed like an
+    ActionStack.
+    """
+
+    def __init__(self, journal, offset, length):
+        self._journal = journal
+        self._offset = offset
+        self._length = length
+
+    def can_execute(self):
+        return True
+
+    def size(self):
+        return sys.getsizeof(self)
+
+    @transactional
+    def execute(self):
+        undo_record = self._journal.undo_record
+        for record in reversed(self._journal.read(self._offset, self._length)):
+            try:
+                undo_record(record)
+            except Exception as e:
+                log.error("Error while undoing change %s" % (record,), exc_info=True)
+
+
+def _ref(element):
+    """
+    The id of ``element``. Only the elements from the UML module can be
+    found back by id.
+    """
+    if element is None:
+        return None
+    if getattr(UML, type(element).__name__, None) is not type(element):
+        raise ValueError("Element type %s is not from the UML module" % type(element))
+    return element.id
+
+
+def _describe(element):
+    """
+    What is needed to create ``element`` anew: its type, id and attributes.
+    """
+    values = {}
+    for prop in property_table(type(element)).attributes:
+        value = getattr(element, prop._name, None)
+        if value is not None:
+            values[prop.name] = value
+    return [type(element).__name__, _ref(element), values]
+
+
+def _property(cls, name):
+    """
+    The UML property ``name`` of ``cls``. Redefined properties are
+    resolved to the property they redefine.
+    """
+    prop = getattr(cls, name, None)
+    while isinstance(prop, redefine):
+        prop = prop.original
+    return prop
+
+
+# vim:sw=4:et:ai
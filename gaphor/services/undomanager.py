@@ -9,10 +9,14 @@ An undo action should be a callable object (called with no arguments).
 An undo action should return a callable object that acts as redo function.
 If None is returned the undo action is considered to be the redo action as well.
 
-NOTE: it would be nice to use actions in conjunction with functools.partial.
+Changes to the model are recorded as records (see UndoManager._add_record()).
+Older transactions are written to the undo journal when the undo history
+grows beyond its memory budget.
 """
 
+import sys
 from builtins import object
+from functools import partial
 from logging import getLogger
 from zope import component
 
@@ -22,12 +26,15 @@ from zope.interface import implementer
 from gaphor.UML.event import (
     ElementCreateEvent,
     ElementDeleteEvent,
+    ElementsCreateEvent,
+    ElementsDeleteEvent,
     AssociationSetEvent,
     AssociationAddEvent,
     AssociationDeleteEvent,
 )
 from gaphor.UML.interfaces import (
     IElementDeleteEvent,
+    IElementsDeleteEvent,
     IAttributeChangeEvent,
     IModelFactoryEvent,
 )
@@ -36,6 +43,7 @@ from gaphor.core import inject
 from gaphor.event import ActionExecuted
 from gaphor.event import TransactionBegin, TransactionCommit, TransactionRollback
 from gaphor.interfaces import IService, IServiceEvent, IActionProvider
+from gaphor.services.undojournal import UndoJournal, SpilledActionStack
 from gaphor.transaction import Transaction, transactional
 
 
@@ -46,27 +54,146 @@ class ActionStack(object):
     be played back when a transaction is executed. This executing a
     transaction has the effect of performing the actions recorded, which will
     typically undo actions performed by the user.
+
+    Actions can be recorded with a ``key``, identifying the state they
+    restore, e.g. ``(element, property)``. Only the first action recorded
+    for a key is needed to restore the state from before the transaction.
+    Actions that toggle the state of their key, like adding and removing a
+    value, cancel each other out if recorded an even number of times.
+    The ``elements`` an action refers to are recorded too: actions on
+    elements that are created and deleted within the transaction have no
+    effect, and can be dropped. This is done by compact().
+
+    Actions that undo a model change can be recorded with the ``record``
+    describing the change (see UndoManager._add_record()). A transaction
+    that consists of records only can be written to the undo journal.
     """
 
     def __init__(self):
         self._actions = []
-
-    def add(self, action):
+        self._records = []
+        self._keys = []
+        self._elements = []
+        self._toggles = {}
+        self._created = set()
+        self._transient = set()
+        self._size = None
+
+    def add(
+        self,
+        action,
+        key=None,
+        elements=(),
+        toggle=False,
+        created=False,
+        deleted=False,
+        record=None,
+    ):
+        """
+        Add an action. ``toggle`` tells the action toggles the state of
+        ``key``. ``created`` and ``deleted`` tell the action undoes the
+        creation or deletion of ``elements``.
+        """
         self._actions.append(action)
+        self._records.append(record)
+        self._keys.append(key)
+        self._elements.append(elements)
+        if toggle:
+            self._toggles[key] = self._toggles.get(key, 0) + 1
+        if created:
+            self._created.update(elements)
+        elif deleted and self._created:
+            self._transient.update(e for e in elements if e in self._created)
 
     def can_execute(self):
         return self._actions and True or False
 
+    def compact(self):
+        """
+        Drop the actions that are not needed to undo the transaction:
+        repeated actions for the same key, toggles that cancel out and
+        actions on elements that were both created and deleted in this
+        transaction.
+        """
+        transient = self._transient
+        seen = set(key for key, count in self._toggles.items() if not count % 2)
+        actions = []
+        records = []
+        for action, record, key, elements in zip(
+            self._actions, self._records, self._keys, self._elements
+        ):
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            if transient and any(e in transient for e in elements):
+                continue
+            actions.append(action)
+            records.append(record)
+        self._actions = actions
+        self._records = records
+        # No more need for the bookkeeping
+        self._keys = [None] * len(actions)
+        self._elements = [()] * len(actions)
+        self._toggles = {}
+        self._created = set()
+        self._transient = set()
+        self._size = None
+
+    def size(self):
+        """
+        Estimate the memory used by the actions, in bytes: the actions and
+        the values kept alive by them.
+        """
+        if self._size is None:
+            size = sys.getsizeof(self._actions) + sys.getsizeof(self._records)
+            for action, record in zip(self._actions, self._records):
+                size += sys.getsizeof(action)
+                if record:
+                    size += sys.getsizeof(record) + sys.getsizeof(record[3])
+                for cell in getattr(action, "__closure__", None) or ():
+                    size += sys.getsizeof(cell) + sys.getsizeof(cell.cell_contents)
+            self._size = size
+        return self._size
+
+    def records(self):
+        """
+        The records of the actions, in the order they were added, or None
+        if not all actions have a record.
+        """
+        if None in self._records:
+            return None
+        return list(self._records)
+
     @transactional
     def execute(self):
-        self._actions.reverse()
-        for action in self._actions:
+        for action in reversed(self._actions):
             try:
                 action()
             except Exception as e:
                 log.error("Error while undoing action %s" % action, exc_info=True)
 
 
+def _gaphas_setter_key(event):
+    """
+    The key of a gaphas revert ``event`` that sets a reversible property
+    (see gaphas.state.reversible_property), e.g. the position of a handle:
+    ``(setter, object)``. Only the first revert for a key is needed to undo
+    a transaction. Other reverts, e.g. matrix translations, add up and have
+    no key.
+    """
+    func, kwargs = event
+    reverse, spec, bind = state._reverse.get(func, (None, None, {}))
+    if reverse is not func or len(spec[0]) != 2:
+        return None
+    argself, argvalue = spec[0]
+    # A property setter reverts to the value of the getter
+    getter = bind.get(argvalue)
+    if getter is None or state.getargspec(getter)[0] != [argself]:
+        return None
+    return (func, kwargs.get(argself))
+
+
 @implementer(IServiceEvent)
 class UndoManagerStateChanged(object):
     """
@@ -111,14 +238,23 @@ class UndoManager(object):
     """
 
     component_registry = inject("component_registry")
+    element_factory = inject("element_factory")
 
     logger = getLogger("UndoManager")
 
     def __init__(self):
         self._undo_stack = []
         self._redo_stack = []
-        self._stack_depth = 20
+        # Memory budget (in bytes) for the undo and redo stacks each,
+        # older transactions are written to the undo journal
+        self._stack_budget = 16 * 1024 * 1024
+        self._journal = None
         self._current_transaction = None
+        # Actions were recorded since the state was last published
+        self._dirty = False
+        # Undo, redo or rollback is executing a transaction: the state is
+        # published once it is done
+        self._executing = False
         self.action_group = build_action_group(self)
 
     def init(self, app):
@@ -143,10 +279,12 @@ class UndoManager(object):
         self.component_registry.unregister_handler(self.rollback_transaction)
         self.component_registry.unregister_handler(self._action_executed)
         self._unregister_undo_handlers()
+        self._close_journal()
 
     def clear_undo_stack(self):
         self._undo_stack = []
         self._current_transaction = None
+        self._dirty = False
 
     def clear_redo_stack(self):
         del self._redo_stack[:]
@@ -155,6 +293,7 @@ class UndoManager(object):
     def reset(self, event=None):
         self.clear_redo_stack()
         self.clear_undo_stack()
+        self._close_journal()
         self._action_executed()
 
     @component.adapter(TransactionBegin)
@@ -165,32 +304,34 @@ class UndoManager(object):
         assert not self._current_transaction
         self._current_transaction = ActionStack()
 
-    def add_undo_action(self, action):
+    def add_undo_action(self, action, **kwargs):
         """
-        Add an action to undo. An action
+        Add an action to undo. See ActionStack.add() for the keyword
+        arguments.
+
+        The new state is published when the transaction ends, not for
+        every action.
         """
         if self._current_transaction:
-            self._current_transaction.add(action)
-            self.component_registry.handle(UndoManagerStateChanged(self))
-
-            # TODO: should this be placed here?
-            self._action_executed()
+            self._current_transaction.add(action, **kwargs)
+            self._dirty = True
 
     @component.adapter(TransactionCommit)
     def commit_transaction(self, event=None):
         assert self._current_transaction
 
+        self._current_transaction.compact()
         if self._current_transaction.can_execute():
             # Here:
             self.clear_redo_stack()
             self._undo_stack.append(self._current_transaction)
-            while len(self._undo_stack) > self._stack_depth:
-                del self._undo_stack[0]
+            self._trim(self._undo_stack)
 
         self._current_transaction = None
 
-        self.component_registry.handle(UndoManagerStateChanged(self))
-        self._action_executed()
+        # Nothing changed if no actions were recorded
+        if self._dirty and not self._executing:
+            self._state_changed()
 
     @component.adapter(TransactionRollback)
     def rollback_transaction(self, event=None):
@@ -204,6 +345,7 @@ class UndoManager(object):
 
         errorous_tx = self._current_transaction
         self._current_transaction = None
+        self._executing = True
         try:
             with Transaction():
                 try:
@@ -214,16 +356,15 @@ class UndoManager(object):
         finally:
             # Discard all data collected in the rollback "transaction"
             self._undo_stack = undo_stack
+            self._executing = False
 
-        self.component_registry.handle(UndoManagerStateChanged(self))
-        self._action_executed()
+        self._state_changed()
 
     def discard_transaction(self):
 
         self._current_transaction = None
 
-        self.component_registry.handle(UndoManagerStateChanged(self))
-        self._action_executed()
+        self._state_changed()
 
     @action(name="edit-undo", stock_id="gtk-undo", accel="<Control>z")
     def undo_transaction(self):
@@ -240,21 +381,21 @@ class UndoManager(object):
         redo_stack = list(self._redo_stack)
         self._undo_stack = []
 
+        self._executing = True
         try:
             with Transaction():
                 transaction.execute()
         finally:
+            self._executing = False
             # Restore stacks and put latest tx on the redo stack
             self._redo_stack = redo_stack
             if self._undo_stack:
                 self._redo_stack.extend(self._undo_stack)
             self._undo_stack = undo_stack
 
-        while len(self._redo_stack) > self._stack_depth:
-            del self._redo_stack[0]
+        self._trim(self._redo_stack)
 
-        self.component_registry.handle(UndoManagerStateChanged(self))
-        self._action_executed()
+        self._state_changed()
 
     @action(name="edit-redo", stock_id="gtk-redo", accel="<Control>y")
     def redo_transaction(self):
@@ -264,15 +405,57 @@ class UndoManager(object):
         transaction = self._redo_stack.pop()
 
         redo_stack = list(self._redo_stack)
+        self._executing = True
         try:
             with Transaction():
                 transaction.execute()
         finally:
+            self._executing = False
             self._redo_stack = redo_stack
 
+        self._state_changed()
+
+    def _state_changed(self):
+        """
+        Publish the state of the undo manager.
+        """
+        self._dirty = False
         self.component_registry.handle(UndoManagerStateChanged(self))
         self._action_executed()
 
+    def _trim(self, stack):
+        """
+        Write the oldest transactions on the stack to the undo journal until
+        the stack fits in the memory budget. A transaction is only written
+        once all older transactions are, since undoing a written deletion
+        creates the elements anew. A transaction that can not be written
+        (e.g. with canvas changes) is dropped, together with all older
+        transactions. The latest transaction is always kept in memory.
+        """
+        size = sum(tx.size() for tx in stack)
+        n = 0
+        while size > self._stack_budget and n < len(stack) - 1:
+            tx = stack[n]
+            if isinstance(tx, SpilledActionStack):
+                n += 1
+                continue
+            if self._journal is None:
+                self._journal = UndoJournal(self.element_factory, self._undo_record)
+            spilled = self._journal.spill(tx)
+            if spilled:
+                stack[n] = spilled
+                size += spilled.size() - tx.size()
+                n += 1
+            else:
+                size -= sum(t.size() for t in stack[: n + 1])
+                del stack[: n + 1]
+                n = 0
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
     def in_transaction(self):
         return self._current_transaction is not None
 
@@ -292,7 +475,9 @@ class UndoManager(object):
     ##
 
     def _gaphas_undo_handler(self, event):
-        self.add_undo_action(lambda: state.saveapply(*event))
+        self.add_undo_action(
+            lambda: state.saveapply(*event), key=_gaphas_setter_key(event)
+        )
 
     def _register_undo_handlers(self):
 
@@ -300,6 +485,8 @@ class UndoManager(object):
 
         self.component_registry.register_handler(self.undo_create_event)
         self.component_registry.register_handler(self.undo_delete_event)
+        self.component_registry.register_handler(self.undo_create_many_event)
+        self.component_registry.register_handler(self.undo_delete_many_event)
         self.component_registry.register_handler(self.undo_attribute_change_event)
         self.component_registry.register_handler(self.undo_association_set_event)
         self.component_registry.register_handler(self.undo_association_add_event)
@@ -317,6 +504,8 @@ class UndoManager(object):
 
         self.component_registry.unregister_handler(self.undo_create_event)
         self.component_registry.unregister_handler(self.undo_delete_event)
+        self.component_registry.unregister_handler(self.undo_create_many_event)
+        self.component_registry.unregister_handler(self.undo_delete_many_event)
         self.component_registry.unregister_handler(self.undo_attribute_change_event)
         self.component_registry.unregister_handler(self.undo_association_set_event)
         self.component_registry.unregister_handler(self.undo_association_add_event)
@@ -326,6 +515,46 @@ class UndoManager(object):
 
         state.subscribers.discard(self._gaphas_undo_handler)
 
+    def _add_record(self, record, **kwargs):
+        """
+        Add an undo action for ``record``, a tuple (kind, element, property,
+        value) describing a change. The record is kept with the action, so
+        the transaction can be written to the undo journal.
+        """
+        action = partial(self._undo_record, record)
+        self.add_undo_action(action, record=record, **kwargs)
+
+    def _undo_record(self, record):
+        """
+        Undo the change described by ``record``. Changes to the factory
+        have the factory as element and the elements as value.
+        """
+        kind, element, prop, value = record
+        if kind == "create":
+            # The element was probably already removed in an unlink call
+            element._remove_element(value)
+            self.component_registry.handle(ElementDeleteEvent(element, value))
+        elif kind == "delete":
+            element._add_element(value)
+            self.component_registry.handle(ElementCreateEvent(element, value))
+        elif kind == "create_many":
+            for e in value:
+                element._remove_element(e)
+            self.component_registry.handle(ElementsDeleteEvent(element, value))
+        elif kind == "delete_many":
+            for e in value:
+                element._add_element(e)
+            self.component_registry.handle(ElementsCreateEvent(element, value))
+        elif kind == "attribute":
+            prop._set(element, value)
+        elif kind == "add":
+            # Tell the association it should not need to let the opposite
+            # side connect (it has it's own signal)
+            prop._del(element, value, from_opposite=True)
+        else:
+            # "set" and "remove"
+            prop._set(element, value, from_opposite=True)
+
     @component.adapter(ElementCreateEvent)
     def undo_create_event(self, event):
         factory = event.service
@@ -333,15 +562,9 @@ class UndoManager(object):
         if not factory:
             return
         element = event.element
-
-        def _undo_create_event():
-            try:
-                del factory._elements[element.id]
-            except KeyError:
-                pass  # Key was probably already removed in an unlink call
-            self.component_registry.handle(ElementDeleteEvent(factory, element))
-
-        self.add_undo_action(_undo_create_event)
+        self._add_record(
+            ("create", factory, None, element), elements=(element,), created=True
+        )
 
     @component.adapter(IElementDeleteEvent)
     def undo_delete_event(self, event):
@@ -350,66 +573,72 @@ class UndoManager(object):
         if not factory:
             return
         element = event.element
-        assert factory, "No factory defined for %s (%s)" % (element, factory)
-
-        def _undo_delete_event():
-            factory._elements[element.id] = element
-            self.component_registry.handle(ElementCreateEvent(factory, element))
-
-        self.add_undo_action(_undo_delete_event)
+        self._add_record(
+            ("delete", factory, None, element), elements=(element,), deleted=True
+        )
+
+    @component.adapter(ElementsCreateEvent)
+    def undo_create_many_event(self, event):
+        elements = event.elements
+        self._add_record(
+            ("create_many", event.service, None, elements),
+            elements=elements,
+            created=True,
+        )
+
+    @component.adapter(IElementsDeleteEvent)
+    def undo_delete_many_event(self, event):
+        elements = event.elements
+        self._add_record(
+            ("delete_many", event.service, None, elements),
+            elements=elements,
+            deleted=True,
+        )
 
     @component.adapter(IAttributeChangeEvent)
     def undo_attribute_change_event(self, event):
         attribute = event.property
         element = event.element
-        value = event.old_value
-
-        def _undo_attribute_change_event():
-            attribute._set(element, value)
-
-        self.add_undo_action(_undo_attribute_change_event)
+        self._add_record(
+            ("attribute", element, attribute, event.old_value),
+            key=(element, attribute),
+            elements=(element,),
+        )
 
     @component.adapter(AssociationSetEvent)
     def undo_association_set_event(self, event):
         association = event.property
         element = event.element
         value = event.old_value
-        # print 'got new set event', association, element, value
-        def _undo_association_set_event():
-            # print 'undoing action', element, value
-            # Tell the assoctaion it should not need to let the opposite
-            # side connect (it has it's own signal)
-            association._set(element, value, from_opposite=True)
-
-        self.add_undo_action(_undo_association_set_event)
+        self._add_record(
+            ("set", element, association, value),
+            key=(element, association),
+            elements=(element, value),
+        )
 
     @component.adapter(AssociationAddEvent)
     def undo_association_add_event(self, event):
         association = event.property
         element = event.element
         value = event.new_value
-
-        def _undo_association_add_event():
-            # print 'undoing action', element, value
-            # Tell the assoctaion it should not need to let the opposite
-            # side connect (it has it's own signal)
-            association._del(element, value, from_opposite=True)
-
-        self.add_undo_action(_undo_association_add_event)
+        self._add_record(
+            ("add", element, association, value),
+            key=(element, association, value),
+            elements=(element, value),
+            toggle=True,
+        )
 
     @component.adapter(AssociationDeleteEvent)
     def undo_association_delete_event(self, event):
         association = event.property
         element = event.element
         value = event.old_value
-
-        def _undo_association_delete_event():
-            # print 'undoing action', element, value
-            # Tell the assoctaion it should not need to let the opposite
-            # side connect (it has it's own signal)
-            association._set(element, value, from_opposite=True)
-
-        self.add_undo_action(_undo_association_delete_event)
+        self._add_record(
+            ("remove", element, association, value),
+            key=(element, association, value),
+            elements=(element, value),
+            toggle=True,
+        )
 
 
 # vim:sw=4:et:ai
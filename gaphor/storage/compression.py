@@ -0,0 +1,147 @@
+"""
+Compressed model files.
+
+Model files can be compressed with gzip or xz, or zstd if the zstandard
+module is installed. When reading, the compression is detected from the
+first bytes of the file. When writing, the compression follows from the
+file extension (``.gaphor.gz``, ``.gaphor.xz`` or ``.gaphor.zst``).
+
+Data is compressed and decompressed while it is streamed, the model is
+never held in memory as a whole.
+"""
+
+import gzip
+import io
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ["detect", "open_for_reading", "open_for_writing", "split_extension"]
+
+GZIP = "gzip"
+XZ = "xz"
+ZSTD = "zstd"
+
+MAGIC = ((GZIP, b"\x1f\x8b"), (XZ, b"\xfd7zXZ\x00"), (ZSTD, b"\x28\xb5\x2f\xfd"))
+MAGIC_SIZE = max(len(m) for c, m in MAGIC)
+
+EXTENSIONS = ((".gz", GZIP), (".xz", XZ), (".zst", ZSTD))
+
+ENCODING = "utf-8"
+
+
+def available(compression):
+    """
+    Return True if the compression can be used.
+    """
+    if compression == XZ:
+        return lzma is not None
+    elif compression == ZSTD:
+        return zstandard is not None
+    return compression == GZIP
+
+
+def detect(header):
+    """
+    Return the compression of a file starting with the bytes in @header,
+    or None for an uncompressed file.
+    """
+    for compression, magic in MAGIC:
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def split_extension(filename):
+    """
+    Split the compression extension from @filename. Returns a tuple
+    (filename, compression); compression is None if the filename has
+    no compression extension.
+    """
+    for ext, compression in EXTENSIONS:
+        if filename.endswith(ext):
+            return filename[: -len(ext)], compression
+    return filename, None
+
+
+def _check(compression):
+    if not available(compression):
+        raise IOError("No support for %s compressed files" % compression)
+
+
+def open_for_reading(filename):
+    """
+    Open a model file for reading. Returns a tuple (file, raw): file is a
+    binary file object that yields the uncompressed data, raw is the file
+    that is read from disk. For uncompressed files both are the same.
+    Both should be closed after use.
+    """
+    raw = io.open(filename, "rb")
+    try:
+        compression = detect(raw.read(MAGIC_SIZE))
+        raw.seek(0)
+        if compression is None:
+            return raw, raw
+        _check(compression)
+        if compression == GZIP:
+            return gzip.GzipFile(fileobj=raw, mode="rb"), raw
+        elif compression == XZ:
+            return lzma.LZMAFile(raw, "rb"), raw
+        else:
+            return zstandard.ZstdDecompressor().stream_reader(raw), raw
+    except:
+        raw.close()
+        raise
+
+
+class CompressedWriter(io.TextIOWrapper):
+    """
+    Text file that writes compressed data. Closing it closes the
+    underlying file too.
+    """
+
+    def __init__(self, compressed, raw):
+        super(CompressedWriter, self).__init__(compressed, encoding=ENCODING)
+        self._raw = raw
+
+    def close(self):
+        try:
+            super(CompressedWriter, self).close()
+        finally:
+            self._raw.close()
+
+
+def open_for_writing(filename):
+    """
+    Open a model file for writing text. The data is compressed if the
+    filename has a compression extension.
+    """
+    compression = split_extension(filename)[1]
+    if compression is None:
+        return io.open(filename, "w", encoding=ENCODING)
+
+    _check(compression)
+    raw = io.open(filename, "wb")
+    try:
+        if compression == GZIP:
+            compressed = gzip.GzipFile(
+                fileobj=raw, mode="wb", compresslevel=6, filename=""
+            )
+        elif compression == XZ:
+            compressed = lzma.LZMAFile(raw, "wb")
+        else:
+            compressed = zstandard.ZstdCompressor().stream_writer(raw)
+    except:
+        raw.close()
+        raise
+    return CompressedWriter(compressed, raw)
+
+
+# vim:sw=4:et:ai
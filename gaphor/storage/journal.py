@@ -0,0 +1,429 @@
+"""
+Append-only change journal for Gaphor models.
+
+Instead of rewriting the full model on each save, the changes made since
+the previous save can be appended to a journal file next to the model
+file (``model.gaphor`` gets a ``model.gaphor.journal``). When the model is
+loaded, the journal is replayed on the parsed model before the elements
+are created.
+
+The ChangeRecorder collects the changes from the same element events the
+undo manager uses. Canvas items are not tracked item by item: the canvas
+of a diagram that changed is written as a whole.
+
+Each line in the journal is a JSON list. The first line is a header that
+identifies the model file the journal applies to, the other lines are
+changes:
+
+    ["create", id, type]
+    ["delete", id]
+    ["value", id, name, value]    value is null to unset the attribute
+    ["ref", id, name, refid]      refid is null to unset the reference
+    ["add", id, name, refid]
+    ["remove", id, name, refid]
+    ["refs", id, name, [refid, ...]]
+    ["canvas", id, xml]
+"""
+
+import io
+import json
+import logging
+import os
+from builtins import object
+from builtins import str
+
+import gaphas
+from zope import component
+
+from gaphor import UML
+from gaphor.misc.xmlwriter import XMLWriter
+from gaphor.UML.collection import collection
+from gaphor.UML.event import (
+    AssociationAddEvent,
+    AssociationDeleteEvent,
+    AssociationSetEvent,
+)
+from gaphor.UML.interfaces import (
+    IAssociationChangeEvent,
+    IAttributeChangeEvent,
+    IElementCreateEvent,
+    IElementDeleteEvent,
+    IElementsCreateEvent,
+    IElementsDeleteEvent,
+    IFlushFactoryEvent,
+    IModelFactoryEvent,
+)
+from gaphor.UML.properties import association, attribute, enumeration
+from gaphor.storage import parser, storage
+
+__all__ = ["Journal", "ChangeRecorder"]
+
+JOURNAL_EXT = ".journal"
+JOURNAL_VERSION = 1
+
+# Compact the journal into a new model file once it grows larger than
+# COMPACT_RATIO times the model file, with a minimum of MIN_COMPACT_SIZE bytes.
+COMPACT_RATIO = 0.25
+MIN_COMPACT_SIZE = 256 * 1024
+
+log = logging.getLogger(__name__)
+
+
+def serialize(value):
+    """
+    Convert an attribute value to the string that is saved in the
+    model file.
+    """
+    if value is None:
+        return None
+    elif isinstance(value, bool):
+        return str(int(value))
+    return str(value)
+
+
+class Journal(object):
+    """
+    The journal file of a model file.
+    """
+
+    def __init__(self, filename):
+        self.model_filename = filename
+        self.filename = filename + JOURNAL_EXT
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def size(self):
+        try:
+            return os.path.getsize(self.filename)
+        except OSError:
+            return 0
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.filename)
+
+    def needs_compaction(self):
+        """
+        Returns True if the journal has grown too big compared to the model
+        file, so the model should be saved in full.
+        """
+        try:
+            model_size = os.path.getsize(self.model_filename)
+        except OSError:
+            return True
+        return self.size() > max(MIN_COMPACT_SIZE, model_size * COMPACT_RATIO)
+
+    def _header(self):
+        stat = os.stat(self.model_filename)
+        return {
+            "journal": JOURNAL_VERSION,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+        }
+
+    def append(self, records):
+        """
+        Append change records to the journal. A new journal starts with
+        a header identifying the model file.
+        """
+        lines = [json.dumps(r) for r in records]
+        if not self.exists():
+            lines.insert(0, json.dumps(self._header()))
+        with io.open(self.filename, "a", encoding="utf-8") as out:
+            for line in lines:
+                out.write(u"%s\n" % line)
+            out.flush()
+            os.fsync(out.fileno())
+
+    def read(self):
+        """
+        Return the change records in the journal. An empty list is
+        returned if the journal does not belong to the model file.
+        """
+        if not self.exists():
+            return []
+        with io.open(self.filename, encoding="utf-8") as ifile:
+            lines = ifile.read().splitlines()
+        if not lines or json.loads(lines[0]) != self._header():
+            log.warning(
+                "Journal %s does not match model file %s, ignored"
+                % (self.filename, self.model_filename)
+            )
+            return []
+        records = []
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A partially written record, from an interrupted save
+                log.warning("Journal %s ends with an invalid record" % self.filename)
+                break
+        return records
+
+    def replay(self, elements):
+        """
+        Apply the changes in the journal to the parsed elements, as
+        returned by gaphor.storage.parser.
+        """
+        for record in self.read():
+            apply_record(elements, record)
+
+
+def parsed_canvasitems(canvasitems):
+    for item in canvasitems:
+        yield item
+        for child in parsed_canvasitems(item.canvasitems):
+            yield child
+
+
+def apply_record(elements, record):
+    """
+    Apply one change record on the parsed elements.
+    """
+    op, id = record[0], record[1]
+    if op == "create":
+        elements[id] = parser.element(id, record[2])
+        return
+
+    elem = elements.get(id)
+    if elem is None:
+        log.warning("Journal refers to unknown element %s" % id)
+        return
+
+    if op == "delete":
+        if elem.canvas:
+            for item in parsed_canvasitems(elem.canvas.canvasitems):
+                elements.pop(item.id, None)
+        del elements[id]
+    elif op == "value":
+        _set(elem.values, record[2], record[3])
+    elif op == "ref":
+        _set(elem.references, record[2], record[3])
+    elif op == "refs":
+        _set(elem.references, record[2], record[3] or None)
+    elif op == "add":
+        refids = elem.references.setdefault(record[2], [])
+        if record[3] not in refids:
+            refids.append(record[3])
+    elif op == "remove":
+        refids = elem.references.get(record[2])
+        if refids and record[3] in refids:
+            refids.remove(record[3])
+            if not refids:
+                del elem.references[record[2]]
+    elif op == "canvas":
+        _replace_canvas(elements, elem, record[2])
+    else:
+        raise ValueError("Invalid journal record %s" % op)
+
+
+def _set(d, name, value):
+    if value is None:
+        d.pop(name, None)
+    else:
+        d[name] = value
+
+
+def _replace_canvas(elements, elem, xml):
+    data = (
+        u'<?xml version="1.0" encoding="utf-8"?>\n'
+        u'<gaphor xmlns="%s" version="%s" gaphor-version="%s">\n'
+        u'<%s id="%s">\n%s\n</%s>\n</gaphor>\n'
+        % (
+            storage.NAMESPACE_MODEL,
+            storage.FILE_FORMAT_VERSION,
+            storage.FILE_FORMAT_VERSION,
+            elem.type,
+            elem.id,
+            xml,
+            elem.type,
+        )
+    )
+    loader = parser.ExpatLoader()
+    for x in parser.parse_generator(io.StringIO(data), loader):
+        pass
+
+    if elem.canvas:
+        for item in parsed_canvasitems(elem.canvas.canvasitems):
+            elements.pop(item.id, None)
+    elem.canvas = loader.elements[elem.id].canvas
+    for item in parsed_canvasitems(elem.canvas.canvasitems):
+        elements[item.id] = item
+
+
+class ChangeRecorder(object):
+    """
+    Record the changes made to the model since it was loaded or saved, as
+    journal records.
+
+    The recorder only holds changes for the model file set with reset().
+    Once a new model is loaded or the element factory is flushed, the
+    recorder is cleared: the next save should be a full save.
+    """
+
+    def __init__(self):
+        self.filename = None
+        self._records = []
+        self._diagrams = {}
+
+    def register(self, component_registry):
+        for handler in self._handlers():
+            component_registry.register_handler(handler)
+
+    def unregister(self, component_registry):
+        for handler in self._handlers():
+            component_registry.unregister_handler(handler)
+
+    def _handlers(self):
+        return (
+            self._on_element_create,
+            self._on_element_delete,
+            self._on_elements_create,
+            self._on_elements_delete,
+            self._on_attribute_change,
+            self._on_association_change,
+            self._on_model_factory,
+            self._on_flush_factory,
+        )
+
+    def reset(self, factory, filename):
+        """
+        Start recording changes on the model in @factory, as it is saved
+        in @filename.
+        """
+        self.filename = filename
+        del self._records[:]
+        self._diagrams = dict(
+            (d.id, (d, self._canvas_revision(d)))
+            for d in factory.select_type(UML.Diagram)
+        )
+
+    def clear(self):
+        self.filename = None
+        del self._records[:]
+        self._diagrams.clear()
+
+    def _canvas_revision(self, diagram):
+        return diagram.canvas_loader or diagram.canvas.revision
+
+    def records(self):
+        """
+        Return the change records, including the canvases of all diagrams
+        that changed.
+        """
+        records = list(self._records)
+        for id, (diagram, revision) in list(self._diagrams.items()):
+            current = self._canvas_revision(diagram)
+            if current != revision:
+                out = io.StringIO()
+                storage.element_saver(XMLWriter(out))("canvas", diagram.canvas)
+                records.append(["canvas", id, out.getvalue()])
+        return records
+
+    def mark_saved(self):
+        """
+        The records have been written to the journal.
+        """
+        del self._records[:]
+        for id, (diagram, revision) in list(self._diagrams.items()):
+            self._diagrams[id] = (diagram, self._canvas_revision(diagram))
+
+    def _is_model_element(self, element):
+        return (
+            self.filename is not None
+            and isinstance(element, UML.Element)
+            and not isinstance(element, gaphas.Item)
+        )
+
+    def _save_func(self, element):
+        records = self._records
+
+        def save_func(name, value):
+            if isinstance(value, UML.Element):
+                records.append(["ref", element.id, name, value.id])
+            elif isinstance(value, collection):
+                records.append(["refs", element.id, name, [v.id for v in value]])
+            elif not isinstance(value, gaphas.Canvas):
+                records.append(["value", element.id, name, serialize(value)])
+
+        return save_func
+
+    @component.adapter(IElementCreateEvent)
+    def _on_element_create(self, event):
+        self._element_created(event.element)
+
+    @component.adapter(IElementsCreateEvent)
+    def _on_elements_create(self, event):
+        for element in event.elements:
+            self._element_created(element)
+
+    def _element_created(self, element):
+        if not self._is_model_element(element):
+            return
+        self._records.append(["create", element.id, type(element).__name__])
+        # Elements restored by undo already have a state
+        element.save(self._save_func(element))
+        if isinstance(element, UML.Diagram):
+            self._diagrams[element.id] = (element, None)
+
+    @component.adapter(IElementDeleteEvent)
+    def _on_element_delete(self, event):
+        self._element_deleted(event.element)
+
+    @component.adapter(IElementsDeleteEvent)
+    def _on_elements_delete(self, event):
+        for element in event.elements:
+            self._element_deleted(element)
+
+    def _element_deleted(self, element):
+        if not self._is_model_element(element):
+            return
+        self._records.append(["delete", element.id])
+        self._diagrams.pop(element.id, None)
+
+    @component.adapter(IAttributeChangeEvent)
+    def _on_attribute_change(self, event):
+        element = event.element
+        prop = event.property
+        if not self._is_model_element(element) or not isinstance(
+            prop, (attribute, enumeration)
+        ):
+            return
+        value = event.new_value
+        if value == prop.default:
+            value = None
+        self._records.append(["value", element.id, prop.name, serialize(value)])
+
+    @component.adapter(IAssociationChangeEvent)
+    def _on_association_change(self, event):
+        element = event.element
+        prop = event.property
+        if not self._is_model_element(element) or not isinstance(prop, association):
+            return
+        if isinstance(event, AssociationSetEvent):
+            value = event.new_value
+            self._records.append(
+                ["ref", element.id, prop.name, value and value.id or None]
+            )
+        elif isinstance(event, AssociationAddEvent):
+            self._records.append(["add", element.id, prop.name, event.new_value.id])
+        elif isinstance(event, AssociationDeleteEvent):
+            self._records.append(["remove", element.id, prop.name, event.old_value.id])
+        else:
+            # The order of the collection changed
+            values = prop._get(element)
+            self._records.append(
+                ["refs", element.id, prop.name, [v.id for v in values or ()]]
+            )
+
+    @component.adapter(IModelFactoryEvent)
+    def _on_model_factory(self, event):
+        self.clear()
+
+    @component.adapter(IFlushFactoryEvent)
+    def _on_flush_factory(self, event):
+        self.clear()
+
+
+# vim:sw=4:et:ai
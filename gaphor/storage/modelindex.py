@@ -0,0 +1,388 @@
+"""
+Random access to the elements in a model file.
+
+Scripts often need just a few facts from a model, like the names of the
+classes in a package, or the diagrams an element is shown on. Parsing the
+whole model, or even loading it, is a waste for those.
+
+A ModelIndex records for each element and canvas item in a model file its
+id, type, name, owning package (or owning diagram, for canvas items) and
+the position of its XML in the file. The index answers simple questions
+directly. Elements are parsed on request: only their part of the file is
+read and parsed.
+
+    index = ModelIndex.open("model.gaphor")
+    for entry in index.select(type="Class", package=package_id):
+        print(entry.name)
+    cls = index.element(entry.id)   # a gaphor.storage.parser.element
+
+ModelIndex.open() keeps the index in a file next to the model file
+(``model.gaphor.index``), and builds it again when the model file changed.
+
+Positions are offsets in the uncompressed data. Compressed model files can
+be indexed, but reading an element means decompressing the file up to
+that element.
+"""
+
+import io
+import logging
+import marshal
+import os
+from builtins import object
+from xml.parsers import expat
+
+from gaphor.misc.odict import odict
+from gaphor.storage import compression, parser
+
+__all__ = ["ModelIndex", "IndexEntry"]
+
+INDEX_EXT = ".index"
+INDEX_VERSION = 1
+
+log = logging.getLogger(__name__)
+
+
+class IndexEntry(object):
+    """
+    An element or canvas item in the model file.
+
+    ``package`` is the id of the owning package of an element, ``owner`` is
+    the id of the diagram a canvas item is on. The XML of the element starts
+    at ``offset``; its end tag starts at ``end``.
+    """
+
+    def __init__(self, id, type, offset, name=None, package=None, owner=None):
+        self.id = id
+        self.type = type
+        self.offset = offset
+        self.end = None
+        self.name = name
+        self.package = package
+        self.owner = owner
+
+    def __repr__(self):
+        return "<IndexEntry %s %s>" % (self.type, self.id)
+
+    def is_canvasitem(self):
+        return self.owner is not None
+
+    def dump(self):
+        return (
+            self.id,
+            self.type,
+            self.offset,
+            self.end,
+            self.name,
+            self.package,
+            self.owner,
+        )
+
+    @classmethod
+    def undump(cls, data):
+        id, type, offset, end, name, package, owner = data
+        entry = cls(id, type, offset, name, package, owner)
+        entry.end = end
+        return entry
+
+
+class IndexBuilder(object):
+    """
+    Build the index entries of a model file, driven by pyexpat callbacks.
+    Only the tags that are needed for the index are looked at.
+    """
+
+    def __init__(self):
+        self.entries = odict()
+        self.gaphor_version = None
+        # Offset of the first element, everything before is the header
+        self.header_end = None
+        # Offset of the closing tag of the root element
+        self.footer = None
+        self._tags = []
+        self._open = []
+        self._text = None
+        self._parser = None
+
+    def make_parser(self):
+        p = expat.ParserCreate(namespace_separator=" ", intern={})
+        p.buffer_text = True
+        p.StartElementHandler = self._start_element
+        p.EndElementHandler = self._end_element
+        p.CharacterDataHandler = self._characters
+        self._parser = p
+        return parser.ExpatParser(p, self)
+
+    def endDocument(self):
+        if self._tags:
+            raise parser.ParserException("Invalid XML document.")
+
+    def _start_element(self, name, attrs):
+        name = name.rpartition(" ")[2]
+        tags = self._tags
+        depth = len(tags)
+        tags.append(name)
+        if depth == 0:
+            self.gaphor_version = attrs.get("gaphor-version") or attrs.get(
+                "gaphor_version"
+            )
+        elif depth == 1:
+            offset = self._parser.CurrentByteIndex
+            if self.header_end is None:
+                self.header_end = offset
+            self._add(IndexEntry(attrs["id"], name, offset))
+        elif name == "item" and tags[2] == "canvas":
+            self._add(
+                IndexEntry(
+                    attrs["id"],
+                    attrs["type"],
+                    self._parser.CurrentByteIndex,
+                    owner=self._open[0].id,
+                )
+            )
+        elif depth == 3 and len(self._open) == 1:
+            if tags[2] == "name" and name == "val":
+                self._text = []
+            elif tags[2] == "package" and name == "ref":
+                self._open[0].package = attrs["refid"]
+
+    def _add(self, entry):
+        self.entries[entry.id] = entry
+        self._open.append(entry)
+
+    def _end_element(self, name):
+        tags = self._tags
+        name = tags.pop()
+        depth = len(tags)
+        if depth == 0:
+            self.footer = self._parser.CurrentByteIndex
+        elif depth == 1 or (name == "item" and depth > 2 and tags[2] == "canvas"):
+            self._open.pop().end = self._parser.CurrentByteIndex
+        elif self._text is not None:
+            self._open[0].name = "".join(self._text)
+            self._text = None
+
+    def _characters(self, content):
+        if self._text is not None:
+            self._text.append(content)
+
+
+class ModelIndex(object):
+    """
+    Index of the elements in a model file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.gaphor_version = None
+        self._entries = odict()
+        self._header_end = None
+        self._footer = None
+
+    @classmethod
+    def build(cls, filename):
+        """
+        Build the index of model file @filename.
+        """
+        builder = IndexBuilder()
+        for x in parser.parse_file(filename, builder.make_parser()):
+            pass
+        index = cls(filename)
+        index.gaphor_version = builder.gaphor_version
+        index._entries = builder.entries
+        index._header_end = builder.header_end
+        index._footer = builder.footer
+        return index
+
+    @classmethod
+    def open(cls, filename, index_filename=None):
+        """
+        Return the index of model file @filename. The index is read from
+        @index_filename (by default the model file name with ``.index``
+        appended). If that index does not exist or is out of date, the index
+        is built and saved.
+        """
+        if index_filename is None:
+            index_filename = filename + INDEX_EXT
+        index = cls(filename)
+        if not index._read(index_filename):
+            index = cls.build(filename)
+            index.save(index_filename)
+        return index
+
+    def _key(self):
+        stat = os.stat(self.filename)
+        return (INDEX_VERSION, stat.st_size, stat.st_mtime)
+
+    def _read(self, index_filename):
+        try:
+            with io.open(index_filename, "rb") as f:
+                data = marshal.loads(f.read())
+            if data[0] != self._key():
+                return False
+            key, self.gaphor_version, self._header_end, self._footer, entries = data
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return False
+        undump = IndexEntry.undump
+        self._entries = odict((e[0], undump(e)) for e in entries)
+        return True
+
+    def save(self, index_filename):
+        """
+        Save the index. Failing to save the index is not an error.
+        """
+        data = (
+            self._key(),
+            self.gaphor_version,
+            self._header_end,
+            self._footer,
+            [e.dump() for e in self._entries.values()],
+        )
+        try:
+            with io.open(index_filename, "wb") as out:
+                out.write(marshal.dumps(data))
+        except (IOError, OSError):
+            log.warning("Index %s can not be written" % index_filename, exc_info=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, id):
+        return id in self._entries
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def entry(self, id):
+        """
+        Return the IndexEntry for element or canvas item @id.
+        Raises KeyError if there is no such element.
+        """
+        return self._entries[id]
+
+    def select(self, type=None, name=None, package=None, owner=None):
+        """
+        Return the entries that match all given criteria.
+        """
+        return [
+            e
+            for e in self._entries.values()
+            if (type is None or e.type == type)
+            and (name is None or e.name == name)
+            and (package is None or e.package == package)
+            and (owner is None or e.owner == owner)
+        ]
+
+    def element(self, id):
+        """
+        Parse and return element or canvas item @id.
+        """
+        return self.parse([id])[id]
+
+    def parse(self, ids):
+        """
+        Parse the elements and canvas items in @ids. Returns a dictionary
+        id: parsed element. Only the parts of the model file that hold the
+        elements are read. Canvas items are parsed with their child items,
+        without the diagram they are on.
+        """
+        entries = sorted((self._entries[id] for id in set(ids)), key=lambda e: e.offset)
+        if not entries:
+            return odict()
+
+        # Diagrams hold their items and items their child items: leave out
+        # the entries that are part of an entry read already
+        fragment_entries = []
+        end = -1
+        for entry in entries:
+            if entry.offset > end:
+                fragment_entries.append(entry)
+                end = entry.end
+
+        with self._open_file() as f:
+            fragments = [self._fragment(f, e) for e in fragment_entries]
+            f.seek(0)
+            header = f.read(self._header_end)
+            f.seek(self._footer)
+            footer = f.read()
+
+        data = [header]
+        owner = None
+        for entry, fragment in zip(fragment_entries, fragments):
+            if owner and entry.owner != owner.id:
+                data.append(b"</canvas></%s>" % owner.type.encode("utf-8"))
+                owner = None
+            if entry.is_canvasitem() and not owner:
+                # Wrap the items in their diagram, without the other items
+                owner = self._entries[entry.owner]
+                tag = owner.type.encode("utf-8")
+                data.append(b'<%s id="%s"><canvas>' % (tag, owner.id.encode("utf-8")))
+            data.append(fragment)
+        if owner:
+            data.append(b"</canvas></%s>" % owner.type.encode("utf-8"))
+        data.append(footer)
+
+        loader = parser.ExpatLoader()
+        p = loader.make_parser()
+        p.feed(b"".join(data))
+        p.close()
+
+        elements = loader.elements
+        return odict((e.id, elements[e.id]) for e in entries)
+
+    def _open_file(self):
+        f, raw = compression.open_for_reading(self.filename)
+        if raw is not f:
+            return _CompressedFile(f, raw)
+        return f
+
+    def _fragment(self, f, entry):
+        """
+        Read the XML of an entry, from its start tag up to and including
+        its end tag.
+        """
+        f.seek(entry.offset)
+        data = f.read(entry.end - entry.offset)
+        tail = b""
+        while b">" not in tail:
+            chunk = f.read(64)
+            if not chunk:
+                raise parser.ParserException("Index does not match model file")
+            tail += chunk
+        return data + tail[: tail.index(b">") + 1]
+
+    def diagrams(self, id):
+        """
+        Return the ids of the diagrams element @id is shown on.
+        """
+        presentation = self.element(id).references.get("presentation") or ()
+        diagrams = []
+        for item_id in presentation:
+            entry = self._entries.get(item_id)
+            if entry and entry.owner not in diagrams:
+                diagrams.append(entry.owner)
+        return diagrams
+
+
+class _CompressedFile(object):
+    """
+    Close both the decompressing file and the raw file.
+    """
+
+    def __init__(self, f, raw):
+        self._f = f
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self._f
+
+    def __exit__(self, *args):
+        try:
+            self._f.close()
+        finally:
+            self._raw.close()
+
+
+# vim:sw=4:et:ai
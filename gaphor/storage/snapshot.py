@@ -0,0 +1,245 @@
+"""
+Binary snapshots of parsed model files.
+
+Parsing the XML is the slowest part of loading a model. A snapshot holds
+the parsed elements of a model file (as returned by gaphor.storage.parser)
+in marshal format, so a model file that did not change since it was last
+opened can be loaded without parsing it again.
+
+A snapshot is stored next to the model file (``model.gaphor.snapshot``),
+or in a cache directory. It is only used if the size and the SHA-1 hash of
+the model file match those recorded in the snapshot, otherwise the model
+file is parsed and the snapshot is written anew.
+
+The snapshot is a header, followed by the marshalled elements:
+
+    MAGIC, header length (4 bytes), marshalled header, marshalled body
+
+The header is a tuple (format version, Python version, file size, hash,
+gaphor version). The body is a list of element tuples:
+
+    (id, type, values, references, canvas)
+
+where canvas is None, or a tuple (values, references, names, items). Canvas
+items are nested tuples:
+
+    (id, type, values, references, names, items)
+
+Identical strings, like element ids, are shared in the snapshot, so each id
+is stored only once.
+
+Snapshots are a cache: they are not portable between Python versions and
+should never be distributed.
+"""
+
+import hashlib
+import io
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+from builtins import object
+
+from gaphor.misc.odict import odict
+from gaphor.storage import parser
+
+__all__ = ["Snapshot"]
+
+SNAPSHOT_EXT = ".snapshot"
+SNAPSHOT_VERSION = 1
+MAGIC = b"GAPHORSNAP"
+HEADER_SIZE = struct.Struct("<I")
+
+log = logging.getLogger(__name__)
+
+
+def file_hash(filename, block_size=parser.BLOCK_SIZE):
+    """
+    Return the SHA-1 hex digest of the contents of @filename.
+    """
+    sha1 = hashlib.sha1()
+    with io.open(filename, "rb") as f:
+        data = f.read(block_size)
+        while data:
+            sha1.update(data)
+            data = f.read(block_size)
+    return sha1.hexdigest()
+
+
+def encode(elements):
+    """
+    Convert parsed elements to plain tuples, lists and dicts that can be
+    marshalled.
+    """
+    strings = {}
+
+    def intern(s):
+        return strings.setdefault(s, s)
+
+    def refs(references):
+        return dict(
+            (
+                intern(name),
+                [intern(r) for r in ref] if isinstance(ref, list) else intern(ref),
+            )
+            for name, ref in references.items()
+        )
+
+    def item(ci):
+        return (
+            intern(ci.id),
+            intern(ci.type),
+            ci.values,
+            refs(ci.references),
+            ci.names,
+            [item(child) for child in ci.canvasitems],
+        )
+
+    body = []
+    for elem in elements.values():
+        if not isinstance(elem, parser.element):
+            continue
+        canvas = elem.canvas
+        if canvas is not None:
+            canvas = (
+                canvas.values,
+                refs(canvas.references),
+                canvas.names,
+                [item(ci) for ci in canvas.canvasitems],
+            )
+        body.append(
+            (
+                intern(elem.id),
+                intern(elem.type),
+                elem.values,
+                refs(elem.references),
+                canvas,
+            )
+        )
+    return body
+
+
+def decode(body):
+    """
+    Create the parsed elements from an encoded snapshot body.
+    The elements are returned in the order they appear in the model file.
+    """
+    elements = odict()
+    element = parser.element
+    canvas = parser.canvas
+    canvasitem = parser.canvasitem
+
+    def items(encoded):
+        result = []
+        for id, type, values, references, names, children in encoded:
+            ci = canvasitem(id, type)
+            ci.values = values
+            ci.references = references
+            ci.names = names
+            elements[id] = ci
+            ci.canvasitems = items(children)
+            result.append(ci)
+        return result
+
+    for id, type, values, references, encoded_canvas in body:
+        e = element(id, type)
+        e.values = values
+        e.references = references
+        elements[id] = e
+        if encoded_canvas is not None:
+            c = e.canvas = canvas()
+            c.values, c.references, c.names, encoded_items = encoded_canvas
+            c.canvasitems = items(encoded_items)
+    return elements
+
+
+class Snapshot(object):
+    """
+    The snapshot of a model file.
+
+    If @cache_dir is given, the snapshot is stored in that directory,
+    otherwise it is stored next to the model file.
+    """
+
+    def __init__(self, filename, cache_dir=None):
+        self.model_filename = filename
+        if cache_dir:
+            name = hashlib.sha1(os.path.abspath(filename).encode("utf-8"))
+            self.filename = os.path.join(cache_dir, name.hexdigest() + SNAPSHOT_EXT)
+        else:
+            self.filename = filename + SNAPSHOT_EXT
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.filename)
+
+    def _key(self):
+        return (
+            SNAPSHOT_VERSION,
+            tuple(sys.version_info[:2]),
+            os.path.getsize(self.model_filename),
+        )
+
+    def read(self):
+        """
+        Return a tuple (elements, gaphor_version) from the snapshot, or
+        None if there is no valid snapshot for the model file.
+        """
+        if not self.exists():
+            return None
+        try:
+            with io.open(self.filename, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                start = len(MAGIC) + HEADER_SIZE.size
+                if data[: len(MAGIC)] != MAGIC:
+                    return None
+                size = HEADER_SIZE.unpack(data[len(MAGIC) : start])[0]
+                header = marshal.loads(data[start : start + size])
+                key, sha1, gaphor_version = header[:3], header[3], header[4]
+                if key != self._key() or sha1 != file_hash(self.model_filename):
+                    log.info("Snapshot %s is out of date" % self.filename)
+                    return None
+                body = marshal.loads(data[start + size :])
+            finally:
+                data.close()
+        except Exception:
+            log.warning("Snapshot %s can not be read" % self.filename, exc_info=True)
+            return None
+        return decode(body), gaphor_version
+
+    def write(self, elements, gaphor_version):
+        """
+        Write a snapshot of the parsed @elements of the model file.
+        Failing to write the snapshot is not an error: the model file can
+        still be loaded.
+        """
+        try:
+            header = marshal.dumps(
+                self._key() + (file_hash(self.model_filename), gaphor_version)
+            )
+            body = marshal.dumps(encode(elements))
+            dirname = os.path.dirname(self.filename)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname)
+            # Write to a temporary file first, so a snapshot is never
+            # read partially written
+            tmpname = self.filename + ".tmp"
+            with io.open(tmpname, "wb") as out:
+                out.write(MAGIC)
+                out.write(HEADER_SIZE.pack(len(header)))
+                out.write(header)
+                out.write(body)
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            os.rename(tmpname, self.filename)
+        except Exception:
+            log.warning("Snapshot %s can not be written" % self.filename, exc_info=True)
+
+
+# vim:sw=4:et:ai
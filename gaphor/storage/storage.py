@@ -19,6 +19,8 @@ import os.path
 import io
 
 import gaphas
+from gaphas import state
+from zope import component
 from builtins import map
 from builtins import str
 from future import standard_library
@@ -27,10 +29,20 @@ from past.utils import old_div
 from gaphor import UML
 from gaphor import diagram
 from gaphor.UML.collection import collection
+from gaphor.UML.properties import association, redefine, deferredreference
 from gaphor.UML.elementfactory import ElementChangedEventBlocker
+from gaphor.UML.interfaces import (
+    IElementChangeEvent,
+    IElementDeleteEvent,
+    IElementsDeleteEvent,
+    IFlushFactoryEvent,
+    IModelFactoryEvent,
+)
 from gaphor.application import Application, NotInitializedError
 from gaphor.diagram import items
 from gaphor.i18n import _
+from gaphor.misc.odict import odict
+from gaphor.misc.xmlwriter import XMLWriter
 from gaphor.storage import parser
 
 # import gaphor.adapters.connectors package, so diagram items can find
@@ -48,16 +60,16 @@ NAMESPACE_MODEL = "http://gaphor.sourceforge.net/model"
 log = logging.getLogger(__name__)
 
 
-def save(writer=None, factory=None, status_queue=None):
-    for status in save_generator(writer, factory):
+def save(writer=None, factory=None, status_queue=None, cache=None):
+    for status in save_generator(writer, factory, cache):
         if status_queue:
             status_queue(status)
 
 
-def save_generator(writer, factory):
+def element_saver(writer):
     """
-    Save the current model using @writer, which is a
-    gaphor.misc.xmlwriter.XMLWriter instance.
+    Return the save function passed to Element.save(), that writes the
+    element's attributes and references to @writer.
     """
 
     # Maintain a set of id's, one for elements, one for references.
@@ -115,7 +127,7 @@ def save_generator(writer, factory):
         gaphas.Canvas (which contains canvas items).
         """
         # log.debug('saving element: %s|%s %s' % (name, value, type(value)))
-        if isinstance(value, (UML.Element, gaphas.Item)):
+        if isinstance(value, (UML.Element, gaphas.Item, deferredreference)):
             save_reference(name, value)
         elif isinstance(value, collection):
             save_collection(name, value)
@@ -123,9 +135,46 @@ def save_generator(writer, factory):
             writer.startElement("canvas", {})
             value.save(save_canvasitem)
             writer.endElement("canvas")
+        elif isinstance(value, LazyCanvas):
+            writer.startElement("canvas", {})
+            save_parsed(value.canvas)
+            writer.endElement("canvas")
         else:
             save_value(name, value)
 
+    def save_parsed(parsed):
+        """
+        Save a parsed canvas or canvas item, of which the canvas items have
+        not been loaded (see LazyCanvas). Attributes are written in the
+        order they were read.
+        """
+        values = parsed.values
+        references = parsed.references
+        names = list(parsed.names)
+        names.extend(n for n in values if n not in names)
+        names.extend(n for n in references if n not in names)
+        for name in names:
+            if name in values:
+                save_value(name, values[name])
+            elif name in references:
+                refids = references[name]
+                writer.startElement(name, {})
+                if isinstance(refids, list):
+                    writer.startElement("reflist", {})
+                    for refid in refids:
+                        writer.startElement("ref", {"refid": refid})
+                        writer.endElement("ref")
+                    writer.endElement("reflist")
+                else:
+                    writer.startElement("ref", {"refid": refids})
+                    writer.endElement("ref")
+                writer.endElement(name)
+
+        for item in parsed.canvasitems:
+            writer.startElement("item", {"id": item.id, "type": item.type})
+            save_parsed(item)
+            writer.endElement("item")
+
     def save_canvasitem(name, value, reference=False):
         """
         Save attributes and references in a gaphor.diagram.* object.
@@ -155,6 +204,33 @@ def save_generator(writer, factory):
         else:
             save_value(name, value)
 
+    return save_element
+
+
+def save_generator(writer, factory, cache=None):
+    """
+    Save the current model using @writer, which is a
+    gaphor.misc.xmlwriter.XMLWriter instance.
+
+    If a SaveCache is provided, only elements that changed since the
+    previous save are serialized, other elements are copied from the cache.
+    """
+
+    def save_model_element(writer, e, save_element):
+        clazz = e.__class__.__name__
+        assert e.id
+        writer.startElement(clazz, {"id": str(e.id)})
+        e.save(save_element)
+        writer.endElement(clazz)
+
+    def render(e):
+        out = io.StringIO()
+        fragment_writer = XMLWriter(out)
+        save_model_element(fragment_writer, e, element_saver(fragment_writer))
+        return out.getvalue()
+
+    save_element = element_saver(writer)
+
     writer.startDocument()
     writer.startPrefixMapping("", NAMESPACE_MODEL)
     writer.startElementNS(
@@ -169,11 +245,10 @@ def save_generator(writer, factory):
     size = factory.size()
     n = 0
     for e in list(factory.values()):
-        clazz = e.__class__.__name__
-        assert e.id
-        writer.startElement(clazz, {"id": str(e.id)})
-        e.save(save_element)
-        writer.endElement(clazz)
+        if cache is None:
+            save_model_element(writer, e, save_element)
+        else:
+            writer.fragment(cache.fragment(e, render))
 
         n += 1
         if n % 25 == 0:
@@ -185,16 +260,259 @@ def save_generator(writer, factory):
     writer.endDocument()
 
 
+class SaveCache(object):
+    """
+    Cache of the serialized XML of model elements, used by save() to
+    render only the elements that changed since the previous save.
+
+    Entries are dropped when an element changes or is deleted, and the
+    cache is cleared when a new model is loaded. Changes to canvas items
+    are not always sent as element change events, so cached diagrams are
+    checked against the revision of their canvas.
+    """
+
+    def __init__(self):
+        self._fragments = {}
+
+    def __len__(self):
+        return len(self._fragments)
+
+    def register(self, component_registry):
+        for handler in self._handlers():
+            component_registry.register_handler(handler)
+
+    def unregister(self, component_registry):
+        for handler in self._handlers():
+            component_registry.unregister_handler(handler)
+
+    def _handlers(self):
+        return (
+            self._on_element_change,
+            self._on_element_delete,
+            self._on_elements_delete,
+            self._on_model_factory,
+            self._on_flush_factory,
+        )
+
+    def _revision(self, element):
+        if isinstance(element, UML.Diagram):
+            return element.canvas_loader or element.canvas.revision
+        return None
+
+    def fragment(self, element, render):
+        """
+        Return the XML fragment of @element. If no valid fragment is cached,
+        it is created by ``render(element)``.
+        """
+        revision = self._revision(element)
+        try:
+            cached, cached_revision, fragment = self._fragments[element.id]
+        except KeyError:
+            pass
+        else:
+            if cached is element and cached_revision == revision:
+                return fragment
+        fragment = render(element)
+        self._fragments[element.id] = (element, revision, fragment)
+        return fragment
+
+    def invalidate(self, element):
+        """
+        Drop the cached fragment of @element. For canvas items the
+        fragment of the diagram is dropped.
+        """
+        if isinstance(element, gaphas.Item):
+            element = getattr(element.canvas, "diagram", None)
+        if element is not None:
+            self._fragments.pop(element.id, None)
+
+    def clear(self):
+        self._fragments.clear()
+
+    @component.adapter(IElementChangeEvent)
+    def _on_element_change(self, event):
+        self.invalidate(event.element)
+
+    @component.adapter(IElementDeleteEvent)
+    def _on_element_delete(self, event):
+        self.invalidate(event.element)
+
+    @component.adapter(IElementsDeleteEvent)
+    def _on_elements_delete(self, event):
+        for element in event.elements:
+            self.invalidate(element)
+
+    @component.adapter(IModelFactoryEvent)
+    def _on_model_factory(self, event):
+        self.clear()
+
+    @component.adapter(IFlushFactoryEvent)
+    def _on_flush_factory(self, event):
+        self.clear()
+
+
 def load_elements(elements, factory, status_queue=None):
     for status in load_elements_generator(elements, factory):
         if status_queue:
             status_queue(status)
 
 
-def load_elements_generator(elements, factory, gaphor_version=None):
+def create_canvasitems(canvas, canvasitems, parent=None):
+    """
+    Canvas is a read gaphas.Canvas, items is a list of parser.canvasitem's
+    """
+    for item in canvasitems:
+        cls = getattr(items, item.type)
+        item.element = diagram.create_as(cls, item.id)
+        canvas.add(item.element, parent=parent)
+        assert canvas.get_parent(item.element) is parent
+        create_canvasitems(canvas, item.canvasitems, parent=item.element)
+
+
+class LazyCanvas(object):
+    """
+    The parsed canvas of a diagram of which the canvas items have not been
+    created yet.
+
+    The canvas items are created, loaded and postloaded the first time
+    the diagram's canvas is requested. References from model elements
+    to those items (e.g. ``Element.presentation``) are deferred until then.
+    As long as the canvas is not loaded, the parsed canvas is saved as-is.
+    """
+
+    def __init__(self, diagram, canvas):
+        self.diagram = diagram
+        self.canvas = canvas
+        self._deferred = []
+
+    def canvasitems(self, canvasitems=None):
+        """
+        Iterate all parsed canvas items, including nested items.
+        """
+        for item in self.canvas.canvasitems if canvasitems is None else canvasitems:
+            yield item
+            for child in self.canvasitems(item.canvasitems):
+                yield child
+
+    def defer(self, element, name, refid):
+        """
+        Defer loading reference ``refid`` of ``element.<name>`` until this
+        canvas is loaded. Returns False if the reference can not be deferred.
+        """
+        prop = getattr(type(element), name)
+        while isinstance(prop, redefine):
+            prop = prop.original
+        if not isinstance(prop, association) or prop.upper == 1:
+            return False
+        prop.defer(element, refid, self)
+        self._deferred.append((prop, element))
+        return True
+
+    def discard(self):
+        """
+        Discard all deferred references.
+        """
+        for prop, element in self._deferred:
+            prop.undefer(element, self)
+        self._deferred = []
+
+    def load(self, block_events=True):
+        """
+        Create the canvas items and load their attributes and references.
+
+        Element change events (and gaphas state changes) are blocked, so
+        the undo manager does not record the loading.
+        """
+        diagram = self.diagram
+        if diagram.canvas_loader is not self:
+            return
+        diagram.canvas_loader = None
+        self.discard()
+
+        factory = diagram.factory
+        component_registry = None
+        if block_events:
+            try:
+                component_registry = Application.get_service("component_registry")
+            except NotInitializedError:
+                pass
+        acquired = state.mutex.acquire(False)
+        if component_registry:
+            component_registry.register_subscription_adapter(ElementChangedEventBlocker)
+        try:
+            canvas = diagram.canvas
+            canvas.block_updates = True
+            create_canvasitems(canvas, self.canvas.canvasitems)
+
+            canvasitems = list(self.canvasitems())
+            loaded = dict((item.id, item.element) for item in canvasitems)
+
+            def lookup(refid):
+                ref = loaded.get(refid) or factory and factory.lookup(refid)
+                if not ref:
+                    log.warning(
+                        "Reference %s from diagram %s no longer exists"
+                        % (refid, diagram.id)
+                    )
+                return ref
+
+            for item in canvasitems:
+                for name, value in list(item.values.items()):
+                    item.element.load(name, value)
+                for name, refids in list(item.references.items()):
+                    if not isinstance(refids, list):
+                        refids = [refids]
+                    for refid in refids:
+                        ref = lookup(refid)
+                        if ref:
+                            item.element.load(name, ref)
+
+            canvas.block_updates = False
+
+            for item in canvasitems:
+                item.element.postload()
+            canvas.postload()
+
+            if factory:
+                for item in canvasitems:
+                    factory.reindex(item.element)
+        finally:
+            if component_registry:
+                component_registry.unregister_subscription_adapter(
+                    ElementChangedEventBlocker
+                )
+            if acquired:
+                state.mutex.release()
+
+    def item_ids(self):
+        """
+        Return the ids of all canvas items in this canvas.
+        """
+        return [item.id for item in self.canvasitems()]
+
+    def references(self):
+        """
+        Return the ids of all elements referenced by the canvas items, that
+        are not part of this canvas.
+        """
+        ids = set(self.item_ids())
+        refs = set()
+        for item in self.canvasitems():
+            for refids in item.references.values():
+                if isinstance(refids, list):
+                    refs.update(refids)
+                else:
+                    refs.add(refids)
+        return refs - ids
+
+
+def load_elements_generator(elements, factory, gaphor_version=None, lazy=False):
     """
     Load a file and create a model if possible.
     Exceptions: IOError, ValueError.
+
+    If ``lazy`` is set, canvas items are only created once the canvas of
+    their diagram is requested (see LazyCanvas).
     """
     # TODO: restructure loading code, first load model, then add canvas items
     log.debug(_("Loading %d elements...") % len(elements))
@@ -209,30 +527,23 @@ def load_elements_generator(elements, factory, gaphor_version=None):
 
     # log.info('0%')
 
-    # Fix version inconsistencies
-    version_0_6_2(elements, factory, gaphor_version)
-    version_0_7_2(elements, factory, gaphor_version)
-    version_0_9_0(elements, factory, gaphor_version)
-    version_0_14_0(elements, factory, gaphor_version)
-    version_0_15_0_pre(elements, factory, gaphor_version)
-    version_0_17_0(elements, factory, gaphor_version)
+    # Fix version inconsistencies. Models saved by a recent version
+    # need no upgrade steps at all.
+    migrations = applicable_migrations(gaphor_version)
+    index = apply_migrations(migrations, elements, factory)
 
     # log.debug("Still have %d elements" % len(elements))
 
+    # Older models are fixed up after the canvas items are loaded.
+    lazy = lazy and not version_lower_than(gaphor_version, (0, 14, 99))
+
+    # canvas item id: LazyCanvas, for all canvas items not created yet
+    lazy_items = {}
+    diagrams = []
+
     # First create elements and canvas items in the factory
     # The elements are stored as attribute 'element' on the parser objects:
 
-    def create_canvasitems(canvas, canvasitems, parent=None):
-        """
-        Canvas is a read gaphas.Canvas, items is a list of parser.canvasitem's
-        """
-        for item in canvasitems:
-            cls = getattr(items, item.type)
-            item.element = diagram.create_as(cls, item.id)
-            canvas.add(item.element, parent=parent)
-            assert canvas.get_parent(item.element) is parent
-            create_canvasitems(canvas, item.canvasitems, parent=item.element)
-
     for id, elem in list(elements.items()):
         st = update_status_queue()
         if st:
@@ -242,8 +553,15 @@ def load_elements_generator(elements, factory, gaphor_version=None):
             # log.debug('Creating UML element for %s (%s)' % (elem, elem.id))
             elem.element = factory.create_as(cls, id)
             if elem.canvas is not None:
-                elem.element.canvas.block_updates = True
-                create_canvasitems(elem.element.canvas, elem.canvas.canvasitems)
+                if lazy:
+                    loader = LazyCanvas(elem.element, elem.canvas)
+                    elem.element.canvas_loader = loader
+                    for item_id in loader.item_ids():
+                        lazy_items[item_id] = loader
+                else:
+                    elem.element.canvas.block_updates = True
+                    create_canvasitems(elem.element.canvas, elem.canvas.canvasitems)
+                    diagrams.append(elem.element)
         elif not isinstance(elem, parser.canvasitem):
             raise ValueError(
                 'Item with id "%s" and type %s can not be instantiated'
@@ -255,6 +573,8 @@ def load_elements_generator(elements, factory, gaphor_version=None):
         st = update_status_queue()
         if st:
             yield st
+        if id in lazy_items:
+            continue
         # Ensure that all elements have their element instance ready...
         assert hasattr(elem, "element")
 
@@ -272,6 +592,11 @@ def load_elements_generator(elements, factory, gaphor_version=None):
         for name, refids in list(elem.references.items()):
             if isinstance(refids, list):
                 for refid in refids:
+                    loader = lazy_items.get(refid)
+                    if loader and loader.defer(elem.element, name, refid):
+                        continue
+                    elif loader:
+                        loader.load(block_events=False)
                     try:
                         ref = elements[refid]
                     except:
@@ -289,6 +614,9 @@ def load_elements_generator(elements, factory, gaphor_version=None):
                             )
                             raise
             else:
+                loader = lazy_items.get(refids)
+                if loader:
+                    loader.load(block_events=False)
                 try:
                     ref = elements[refids]
                 except:
@@ -304,9 +632,7 @@ def load_elements_generator(elements, factory, gaphor_version=None):
                         raise
 
     # Fix version inconsistencies
-    version_0_5_2(elements, factory, gaphor_version)
-    version_0_7_1(elements, factory, gaphor_version)
-    version_0_15_0_post(elements, factory, gaphor_version)
+    apply_migrations(migrations, index or elements, factory, post=True)
 
     # Before version 0.7.2 there was only decision node (no merge nodes).
     # This node could have many incoming and outgoing flows (edges).
@@ -320,7 +646,7 @@ def load_elements_generator(elements, factory, gaphor_version=None):
     # Data model, loaded from file, is updated automatically, so there is
     # no need for special function.
 
-    for d in factory.select(lambda e: isinstance(e, UML.Diagram)):
+    for d in diagrams:
         # update_now() is implicitly called when lock is released
         d.canvas.block_updates = False
 
@@ -329,43 +655,62 @@ def load_elements_generator(elements, factory, gaphor_version=None):
         st = update_status_queue()
         if st:
             yield st
+        if id in lazy_items:
+            continue
         elem.element.postload()
 
     factory.notify_model()
 
 
-def load(filename, factory, status_queue=None):
+def load(filename, factory, status_queue=None, lazy=False, journal=None, snapshot=None):
     """
     Load a file and create a model if possible.
     Optionally, a status queue function can be given, to which the
     progress is written (as status_queue(progress)).
+    If ``lazy`` is set, the canvas items of a diagram are created when
+    the diagram's canvas is first requested.
     """
-    for status in load_generator(filename, factory):
+    for status in load_generator(filename, factory, lazy, journal, snapshot):
         if status_queue:
             status_queue(status)
 
 
-def load_generator(filename, factory):
+def load_generator(filename, factory, lazy=False, journal=None, snapshot=None):
     """
     Load a file and create a model if possible.
     This function is a generator. It will yield values from 0 to 100 (%)
     to indicate its progression.
+    The changes in @journal (a gaphor.storage.journal.Journal) are applied
+    to the model before it is loaded.
+    If a @snapshot (a gaphor.storage.snapshot.Snapshot) is given, the
+    parsed model is read from the snapshot if the file did not change.
+    Otherwise the file is parsed and a new snapshot is written.
     """
     if isinstance(filename, io.IOBase):
         log.info("Loading file from file descriptor")
     else:
         log.info("Loading file %s" % os.path.basename(filename))
     try:
-        # Use the incremental parser and yield the percentage of the file.
-        loader = parser.GaphorLoader()
-        for percentage in parser.parse_generator(filename, loader):
-            pass
-            if percentage:
-                yield old_div(percentage, 2)
-            else:
-                yield percentage
-        elements = loader.elements
-        gaphor_version = loader.gaphor_version
+        snapshot_data = snapshot.read() if snapshot is not None else None
+        if snapshot_data:
+            log.info("Reading parsed model from snapshot")
+            elements, gaphor_version = snapshot_data
+            yield 50
+        else:
+            # Use the incremental parser and yield the percentage of the file.
+            loader = parser.ExpatLoader()
+            for percentage in parser.parse_generator(filename, loader):
+                pass
+                if percentage:
+                    yield old_div(percentage, 2)
+                else:
+                    yield percentage
+            elements = loader.elements
+            gaphor_version = loader.gaphor_version
+            if snapshot is not None:
+                snapshot.write(elements, gaphor_version)
+        if journal is not None:
+            journal.replay(elements)
         # elements = parser.parse(filename)
         # yield 100
     except Exception as e:
@@ -385,7 +730,7 @@ def load_generator(filename, factory):
             component_registry.register_subscription_adapter(ElementChangedEventBlocker)
         try:
             for percentage in load_elements_generator(
-                elements, factory, gaphor_version
+                elements, factory, gaphor_version, lazy
             ):
                 if percentage:
                     yield old_div(percentage, 2) + 50
@@ -420,222 +765,338 @@ def version_lower_than(gaphor_version, version):
         return tuple(map(int, parts)) <= version
 
 
-def version_0_15_0_pre(elements, factory, gaphor_version):
+class Migration(object):
+    """
+    An upgrade step for models saved by a Gaphor version lower than
+    ``version``.
+
+    ``types`` are the element types the step works on; the step is called
+    with those parsed elements only. If ``types`` is None, the step gets
+    all parsed elements. Steps with ``post`` set are applied once the
+    model elements are created, the other steps before that.
+    """
+
+    def __init__(self, func, version, types=None, post=False):
+        self.func = func
+        self.version = version
+        self.types = types
+        self.post = post
+
+    def __repr__(self):
+        return "<Migration %s before %s>" % (
+            self.func.__name__,
+            ".".join(map(str, self.version)),
+        )
+
+    def __call__(self, index, factory):
+        self.func(index.select(self.types), index, factory)
+
+
+MIGRATIONS = []
+
+
+def migration(version, types=None, post=False):
+    """
+    Register a function as upgrade step, see Migration.
+    """
+
+    def register(func):
+        MIGRATIONS.append(Migration(func, version, types, post))
+        return func
+
+    return register
+
+
+def applicable_migrations(gaphor_version):
+    """
+    Return the upgrade steps for a model saved by ``gaphor_version``,
+    in the order they should be applied. Steps for the same version are
+    applied in the order they are registered.
+    """
+    if not gaphor_version:
+        return []
+    return sorted(
+        (m for m in MIGRATIONS if version_lower_than(gaphor_version, m.version)),
+        key=lambda m: m.version,
+    )
+
+
+def apply_migrations(migrations, elements, factory, post=False):
+    """
+    Apply the (pre or post) upgrade steps in ``migrations`` to the parsed
+    elements. Returns the ElementIndex used, so it can be passed in again
+    for the post steps.
+    """
+    index = elements if isinstance(elements, ElementIndex) else None
+    for m in migrations:
+        if m.post == post:
+            if index is None:
+                index = ElementIndex(elements)
+            log.info("Upgrade model: %s" % m.func.__name__)
+            m(index, factory)
+    return index
+
+
+class ElementIndex(object):
+    """
+    Index of parsed elements by type.
+
+    Upgrade steps that add or remove parsed elements, or change their type,
+    should do so via the index, so the index stays up to date.
+    """
+
+    def __init__(self, elements):
+        self.elements = elements
+        self._types = {}
+        for elem in elements.values():
+            self._types.setdefault(elem.type, odict())[elem.id] = elem
+
+    def select(self, types=None):
+        """
+        Return the parsed elements of the types in ``types``, or all parsed
+        elements if ``types`` is None.
+        """
+        if types is None:
+            return list(self.elements.values())
+        return [e for t in types for e in self._types.get(t, {}).values()]
+
+    def add(self, elem):
+        self.elements[elem.id] = elem
+        self._types.setdefault(elem.type, odict())[elem.id] = elem
+
+    def remove(self, id):
+        elem = self.elements.pop(id)
+        del self._types[elem.type][id]
+
+    def retype(self, elem, type):
+        del self._types[elem.type][elem.id]
+        elem.type = type
+        self._types.setdefault(type, odict())[elem.id] = elem
+
+
+@migration((0, 14, 99), types=("Property",))
+def version_0_15_0_pre(elements, index, factory):
     """
     Fix association navigability UML metamodel to comply with UML 2.2
     using Association.navigableOwnedEnd among others (see model factory
     for details).
 
+    This function is called before the actual elements are constructed.
+    """
+    ATTRS = set(["class_", "interface_", "actor", "useCase", "owningAssociation"])
+    # update associations
+    values = (
+        v
+        for v in elements
+        if isinstance(v, parser.element) and "association" in v.references
+    )
+    for et in values:
+        # get association
+        assoc = index.elements[et.references["association"]]
+
+        attrs = set(set(ATTRS) & set(et.references))
+        if attrs:
+            assert len(attrs) == 1
+
+            attr = attrs.pop()
+
+            if attr == "owningAssociation":
+                assoc.references["ownedEnd"].remove(et.id)
+                if not assoc.references["ownedEnd"]:
+                    del assoc.references["ownedEnd"]
+            elif attr in ("actor", "useCase"):
+                if "navigableOwnedEnd" not in assoc.references:
+                    assoc.references["navigableOwnedEnd"] = []
+                assoc.references["navigableOwnedEnd"].append(et.id)
+
+                el = index.elements[et.references[attr]]
+                el.references["ownedAttribute"].remove(et.id)
+                if not el.references["ownedAttribute"]:
+                    del el.references["ownedAttribute"]
+
+            del et.references[attr]
+        else:
+            if "ownedEnd" not in assoc.references:
+                assoc.references["ownedEnd"] = []
+            assoc.references["ownedEnd"].append(et.id)
+
+
+@migration((0, 14, 99))
+def version_0_15_0_tagged_values(elements, index, factory):
+    """
     Convert tagged values into comment items as tagged values are no longer
     supported by UML specification (stereotypes attributes shall be used
     instead). Comment item contains information about used tagged values.
     It means, that full conversion of tagged values into stereotype
     attributes is not supported at the moment.
 
-    This function is called before the actual elements are constructed.
+    The tagged values are kept on the parsed element as ``taggedvalue``,
+    they are converted by version_0_15_0_post().
     """
-    ATTRS = set(["class_", "interface_", "actor", "useCase", "owningAssociation"])
-    if version_lower_than(gaphor_version, (0, 14, 99)):
-        # update associations
-        values = (
-            v
-            for v in list(elements.values())
-            if isinstance(v, parser.element)
-            and v.type == "Property"
-            and "association" in v.references
-        )
-        for et in values:
-            # get association
-            assoc = elements[et.references["association"]]
-
-            attrs = set(set(ATTRS) & set(et.references))
-            if attrs:
-                assert len(attrs) == 1
-
-                attr = attrs.pop()
-
-                if attr == "owningAssociation":
-                    assoc.references["ownedEnd"].remove(et.id)
-                    if not assoc.references["ownedEnd"]:
-                        del assoc.references["ownedEnd"]
-                elif attr in ("actor", "useCase"):
-                    if "navigableOwnedEnd" not in assoc.references:
-                        assoc.references["navigableOwnedEnd"] = []
-                    assoc.references["navigableOwnedEnd"].append(et.id)
-
-                    el = elements[et.references[attr]]
-                    el.references["ownedAttribute"].remove(et.id)
-                    if not el.references["ownedAttribute"]:
-                        del el.references["ownedAttribute"]
-
-                del et.references[attr]
-            else:
-                if "ownedEnd" not in assoc.references:
-                    assoc.references["ownedEnd"] = []
-                assoc.references["ownedEnd"].append(et.id)
-
-        # - get rid of tagged values
-        for e in list(elements.values()):
-            if "taggedValue" in e.references:
-                taggedvalue = [
-                    elements[i].values["value"]
-                    for i in e.references["taggedValue"]
-                    if elements[i].values.get("value")
-                ]
-                # convert_tagged_value(e, elements, factory)
-                if taggedvalue:
-                    e.taggedvalue = taggedvalue
-
-                # Remove obsolete elements
-                for t in e.references["taggedValue"]:
-                    del elements[t]
-                del e.references["taggedValue"]
-
-        # - rename EventOccurrence to MessageOccurrenceSpecification
-        values = (
-            v
-            for v in list(elements.values())
-            if isinstance(v, parser.element) and v.type == "EventOccurrence"
-        )
-        for et in values:
-            et.type = "MessageOccurrenceSpecification"
+    # - get rid of tagged values
+    for e in elements:
+        if "taggedValue" in e.references:
+            taggedvalue = [
+                index.elements[i].values["value"]
+                for i in e.references["taggedValue"]
+                if index.elements[i].values.get("value")
+            ]
+            # convert_tagged_value(e, index, factory)
+            if taggedvalue:
+                e.taggedvalue = taggedvalue
+
+            # Remove obsolete elements
+            for t in e.references["taggedValue"]:
+                index.remove(t)
+            del e.references["taggedValue"]
+
+
+@migration((0, 14, 99), types=("EventOccurrence",))
+def version_0_15_0_event_occurrence(elements, index, factory):
+    """
+    Rename EventOccurrence to MessageOccurrenceSpecification.
+    """
+    for et in elements:
+        if isinstance(et, parser.element):
+            index.retype(et, "MessageOccurrenceSpecification")
 
 
-def version_0_15_0_post(elements, factory, gaphor_version):
+@migration((0, 14, 99), post=True)
+def version_0_15_0_post(elements, index, factory):
     """
     Part two: create stereotypes and what more for the elements that have a
     taggedvalue property.
     """
 
     def update_elements(element):
-        e = elements[element.id] = parser.element(
-            element.id, element.__class__.__name__
-        )
+        e = parser.element(element.id, element.__class__.__name__)
         e.element = element
-
-    if version_lower_than(gaphor_version, (0, 14, 99)):
-        stereotypes = {}
-        profile = None
-        for e in list(elements.values()):
-            if hasattr(e, "taggedvalue"):
-                if not profile:
-                    profile = factory.create(UML.Profile)
-                    profile.name = "version 0.15 conversion"
-                    update_elements(profile)
-                st = stereotypes.get(e.type)
-                if not st:
-                    st = stereotypes[e.type] = factory.create(UML.Stereotype)
-                    st.name = "Tagged"
-                    st.package = profile
-                    update_elements(st)
-                    cl = factory.create(UML.Class)
-                    cl.name = str(e.type)
-                    cl.package = profile
-                    update_elements(cl)
-                    ext = UML.model.extend_with_stereotype(factory, cl, st)
-                    update_elements(ext)
-                    for me in ext.memberEnd:
-                        update_elements(me)
-                # Create instance specification for the stereotype:
-                instspec = UML.model.apply_stereotype(factory, e.element, st)
-                update_elements(instspec)
-
-                def create_slot(key, val):
-                    for attr in st.ownedAttribute:
-                        if attr.name == key:
-                            break
-                    else:
-                        attr = st.ownedAttribute = factory.create(UML.Property)
-                        attr.name = str(key)
-                        update_elements(attr)
-                    slot = UML.model.add_slot(factory, instspec, attr)
-                    slot.value = str(val)
-                    update_elements(slot)
-
-                tviter = iter(e.taggedvalue or [])
-                for tv in tviter:
+        index.add(e)
+
+    stereotypes = {}
+    profile = None
+    for e in elements:
+        if hasattr(e, "taggedvalue"):
+            if not profile:
+                profile = factory.create(UML.Profile)
+                profile.name = "version 0.15 conversion"
+                update_elements(profile)
+            st = stereotypes.get(e.type)
+            if not st:
+                st = stereotypes[e.type] = factory.create(UML.Stereotype)
+                st.name = "Tagged"
+                st.package = profile
+                update_elements(st)
+                cl = factory.create(UML.Class)
+                cl.name = str(e.type)
+                cl.package = profile
+                update_elements(cl)
+                ext = UML.model.extend_with_stereotype(factory, cl, st)
+                update_elements(ext)
+                for me in ext.memberEnd:
+                    update_elements(me)
+            # Create instance specification for the stereotype:
+            instspec = UML.model.apply_stereotype(factory, e.element, st)
+            update_elements(instspec)
+
+            def create_slot(key, val):
+                for attr in st.ownedAttribute:
+                    if attr.name == key:
+                        break
+                else:
+                    attr = st.ownedAttribute = factory.create(UML.Property)
+                    attr.name = str(key)
+                    update_elements(attr)
+                slot = UML.model.add_slot(factory, instspec, attr)
+                slot.value = str(val)
+                update_elements(slot)
+
+            tviter = iter(e.taggedvalue or [])
+            for tv in tviter:
+                try:
                     try:
+                        key, val = tv.split("=", 1)
+                        key = key.strip()
+                    except ValueError:
+                        log.info(
+                            'Tagged value "%s" has no key=value format, trying key_value '
+                            % tv
+                        )
                         try:
-                            key, val = tv.split("=", 1)
+                            key, val = tv.split(" ", 1)
                             key = key.strip()
                         except ValueError:
-                            log.info(
-                                'Tagged value "%s" has no key=value format, trying key_value '
-                                % tv
-                            )
-                            try:
-                                key, val = tv.split(" ", 1)
-                                key = key.strip()
-                            except ValueError:
-                                # Fallback, deal with it as if it were a boolean
-                                key = tv.strip()
-                                val = "true"
-
-                            # This syntax is used with the UML meta model:
-                            if key in ("subsets", "redefines"):
-                                rest = ", ".join(tviter)
-                                val = ", ".join([val, rest]) if rest else val
-                                val = val.replace("\n", " ")
-                                log.info(
-                                    'Special case: UML metamodel "%s %s"' % (key, val)
-                                )
-                        create_slot(key, val)
-                    except Exception as e:
-                        log.warning(
-                            'Unable to process tagged value "%s" as key=value pair'
-                            % tv,
-                            exc_info=True,
-                        )
+                            # Fallback, deal with it as if it were a boolean
+                            key = tv.strip()
+                            val = "true"
+
+                        # This syntax is used with the UML meta model:
+                        if key in ("subsets", "redefines"):
+                            rest = ", ".join(tviter)
+                            val = ", ".join([val, rest]) if rest else val
+                            val = val.replace("\n", " ")
+                            log.info('Special case: UML metamodel "%s %s"' % (key, val))
+                    create_slot(key, val)
+                except Exception as e:
+                    log.warning(
+                        'Unable to process tagged value "%s" as key=value pair' % tv,
+                        exc_info=True,
+                    )
+
+
+@migration((0, 14, 99), types=("MessageItem",), post=True)
+def version_0_15_0_messages(elements, index, factory):
+    """
+    Create message occurrence specifications for the messages on
+    sequence diagrams.
+    """
 
-        def find(messages, attr):
-            occurrences = set(
-                getattr(m, attr)
-                for m in messages
-                if hasattr(m, attr) and getattr(m, attr)
-            )
-            assert len(occurrences) <= 1
-            if occurrences:
-                return occurrences.pop()
-            else:
-                return None
-
-        def update_msg(msg, sl, rl):
-            if sl:
-                s = factory.create(UML.MessageOccurrenceSpecification)
-                s.covered = sl
-                m.sendEvent = s
-            if rl:
-                r = factory.create(UML.MessageOccurrenceSpecification)
-                r.covered = rl
-                m.receiveEvent = r
-
-        for e in list(elements.values()):
-            if e.type == "MessageItem":
-                msg = e.element
-                send = msg.subject.sendEvent
-                receive = msg.subject.receiveEvent
-
-                if not send:
-                    send = find(list(msg._messages.keys()), "sendEvent")
-                if not receive:
-                    receive = find(list(msg._messages.keys()), "receiveEvent")
-                if not send:
-                    send = find(list(msg._inverted_messages.keys()), "reveiveEvent")
-                if not receive:
-                    receive = find(list(msg._inverted_messages.keys()), "sendEvent")
-
-                sl = send.covered if send else None
-                rl = receive.covered if receive else None
-
-                for m in msg._messages:
-                    update_msg(m, sl, rl)
-                for m in msg._inverted_messages:
-                    update_msg(m, rl, sl)
-                msg.subject.sendEvent = send
-                msg.subject.receiveEvent = receive
-
-
-def convert_tagged_value(element, elements, factory):
+    def find(messages, attr):
+        occurrences = set(
+            getattr(m, attr) for m in messages if hasattr(m, attr) and getattr(m, attr)
+        )
+        assert len(occurrences) <= 1
+        if occurrences:
+            return occurrences.pop()
+        else:
+            return None
+
+    def update_msg(msg, sl, rl):
+        if sl:
+            s = factory.create(UML.MessageOccurrenceSpecification)
+            s.covered = sl
+            m.sendEvent = s
+        if rl:
+            r = factory.create(UML.MessageOccurrenceSpecification)
+            r.covered = rl
+            m.receiveEvent = r
+
+    for e in elements:
+        msg = e.element
+        send = msg.subject.sendEvent
+        receive = msg.subject.receiveEvent
+
+        if not send:
+            send = find(list(msg._messages.keys()), "sendEvent")
+        if not receive:
+            receive = find(list(msg._messages.keys()), "receiveEvent")
+        if not send:
+            send = find(list(msg._inverted_messages.keys()), "reveiveEvent")
+        if not receive:
+            receive = find(list(msg._inverted_messages.keys()), "sendEvent")
+
+        sl = send.covered if send else None
+        rl = receive.covered if receive else None
+
+        for m in msg._messages:
+            update_msg(m, sl, rl)
+        for m in msg._inverted_messages:
+            update_msg(m, rl, sl)
+        msg.subject.sendEvent = send
+        msg.subject.receiveEvent = receive
+
+
+def convert_tagged_value(element, index, factory, owners=None):
     """
     Convert ``element.taggedValue`` to something supported by the
     UML 2.2 model (since Gaphor version 0.15).
@@ -648,15 +1109,24 @@ def convert_tagged_value(element, elements, factory):
     Each tagged value will be replaced by a Slot:
 
       item -> InstanceSpecification -> Slot -> Attribute -> Stereotype
+
+    ``owners`` maps canvas item ids to the parsed canvas containing them.
+    It is created from the index if not provided. Pass the same dictionary
+    when converting more elements, so the diagrams are only scanned once.
     """
     import uuid
 
-    diagrams = [e for e in list(elements.values()) if e.type == "Diagram"]
+    if owners is None:
+        owners = dict(
+            (ci.id, d.canvas)
+            for d in index.select(("Diagram",))
+            for ci in d.canvas.canvasitems
+        )
 
     presentation = element.get("presentation") or []
-    tv = [elements[i] for i in element.references["taggedValue"]]
+    tv = [index.elements[i] for i in element.references["taggedValue"]]
     for et in presentation:
-        et = elements[et]
+        et = index.elements[et]
         m = eval(et.values["matrix"])
         w = eval(et.values["width"])
 
@@ -674,59 +1144,61 @@ def convert_tagged_value(element, elements, factory):
         comment.references["presentation"] = [item.id]
         comment.values["body"] = tagged
 
-        elements[item.id] = item
-        elements[comment.id] = comment
+        index.add(item)
+        index.add(comment)
 
-        # Where to place the comment? How to find the Diagram?
-        for d in diagrams:
-            for ci in d.canvas.canvasitems:
-                if ci.id == et.id:
-                    d.canvas.canvasitems.append(item)
-                    break
+        # Where to place the comment? In the diagram of the presentation item
+        canvas = owners.get(et.id)
+        if canvas is not None:
+            canvas.canvasitems.append(item)
+            owners[item.id] = canvas
 
 
-def version_0_17_0(elements, factory, gaphor_version):
+VALUE_SPECIFICATION_TYPES = (
+    "ValueSpecification",
+    "OpaqueExpression",
+    "Expression",
+    "InstanceValue",
+    "LiteralSpecification",
+    "LiteralUnlimitedNatural",
+    "LiteralInteger",
+    "LiteralString",
+    "LiteralBoolean",
+    "LiteralNull",
+)
+
+
+@migration((0, 17, 0))
+def version_0_17_0(elements, index, factory):
     """
     As of version 0.17.0, ValueSpecification and subclasses is dealt
     with as if it were attributes.
 
     This function is called before the actual elements are constructed.
     """
-    valspec_types = [
-        "ValueSpecification",
-        "OpaqueExpression",
-        "Expression",
-        "InstanceValue",
-        "LiteralSpecification",
-        "LiteralUnlimitedNatural",
-        "LiteralInteger",
-        "LiteralString",
-        "LiteralBoolean",
-        "LiteralNull",
-    ]
-
-    print("version", gaphor_version)
-    if version_lower_than(gaphor_version, (0, 17, 0)):
-        valspecs = dict(
-            (v.id, v) for v in list(elements.values()) if v.type in valspec_types
-        )
-
-        for id in list(valspecs.keys()):
-            del elements[id]
-
-        for e in list(elements.values()):
-            for name, ref in list(e.references.items()):
-                # ValueSpecifications are always defined in 1:1 relationships
-                if not isinstance(ref, list) and ref in valspecs:
-                    del e.references[name]
-                    assert not name in e.values
-                    try:
-                        e.values[name] = valspecs[ref].values["value"]
-                    except KeyError:
-                        pass  # Empty LiteralSpecification
+    valspecs = dict((v.id, v) for v in index.select(VALUE_SPECIFICATION_TYPES))
+    if not valspecs:
+        return
+
+    for id in valspecs:
+        index.remove(id)
+
+    for e in elements:
+        if e.id in valspecs:
+            continue
+        for name, ref in list(e.references.items()):
+            # ValueSpecifications are always defined in 1:1 relationships
+            if not isinstance(ref, list) and ref in valspecs:
+                del e.references[name]
+                assert not name in e.values
+                try:
+                    e.values[name] = valspecs[ref].values["value"]
+                except KeyError:
+                    pass  # Empty LiteralSpecification
 
 
-def version_0_14_0(elements, factory, gaphor_version):
+@migration((0, 14, 0))
+def version_0_14_0(elements, index, factory):
     """
     Fix applied stereotypes UML metamodel. Before Gaphor 0.14.0 applied
     stereotypes was a collection of stereotypes classes, but now the list
@@ -736,32 +1208,32 @@ def version_0_14_0(elements, factory, gaphor_version):
     """
     import uuid
 
-    if version_lower_than(gaphor_version, (0, 14, 0)):
-        values = (v for v in list(elements.values()) if isinstance(v, parser.element))
-        for et in values:
-            try:
-                if "appliedStereotype" in et.references:
-                    data = tuple(et.references["appliedStereotype"])
-                    applied = []
-                    # collect stereotypes instances in `applied` list
-                    for refid in data:
-                        st = elements[refid]
-                        obj = parser.element(str(uuid.uuid1()), "InstanceSpecification")
-                        obj.references["classifier"] = [st.id]
-                        elements[obj.id] = obj
-                        applied.append(obj.id)
-
-                        assert obj.id in applied and obj.id in elements
-
-                    # replace stereotypes with their instances
-                    assert len(applied) == len(data)
-                    et.references["appliedStereotype"] = applied
+    values = (v for v in elements if isinstance(v, parser.element))
+    for et in values:
+        try:
+            if "appliedStereotype" in et.references:
+                data = tuple(et.references["appliedStereotype"])
+                applied = []
+                # collect stereotypes instances in `applied` list
+                for refid in data:
+                    st = index.elements[refid]
+                    obj = parser.element(str(uuid.uuid1()), "InstanceSpecification")
+                    obj.references["classifier"] = [st.id]
+                    index.add(obj)
+                    applied.append(obj.id)
+
+                    assert obj.id in applied and obj.id in index.elements
+
+                # replace stereotypes with their instances
+                assert len(applied) == len(data)
+                et.references["appliedStereotype"] = applied
 
-            except Exception as e:
-                log.error("Error while updating stereotypes", exc_info=True)
+        except Exception as e:
+            log.error("Error while updating stereotypes", exc_info=True)
 
 
-def version_0_9_0(elements, factory, gaphor_version):
+@migration((0, 9, 0))
+def version_0_9_0(elements, index, factory):
     """
     Before 0.9.0, we used DiaCanvas2 as diagram widget in the GUI. As of 0.9.0
     Gaphas was introduced. Some properties of <item /> elements have changed,
@@ -769,23 +1241,23 @@ def version_0_9_0(elements, factory, gaphor_version):
 
     This function is called before the actual elements are constructed.
     """
-    if version_lower_than(gaphor_version, (0, 9, 0)):
-        for elem in list(elements.values()):
-            try:
-                if isinstance(elem, parser.canvasitem):
-                    # Rename affine to matrix
-                    if elem.values.get("affine"):
-                        elem.values["matrix"] = elem.values["affine"]
-                        del elem.values["affine"]
-                    # No more 'color' attribute:
-                    if elem.values.get("color"):
-                        del elem.values["color"]
+    for elem in elements:
+        try:
+            if isinstance(elem, parser.canvasitem):
+                # Rename affine to matrix
+                if elem.values.get("affine"):
+                    elem.values["matrix"] = elem.values["affine"]
+                    del elem.values["affine"]
+                # No more 'color' attribute:
+                if elem.values.get("color"):
+                    del elem.values["color"]
 
-            except Exception as e:
-                log.error("Error while updating from DiaCanvas2", exc_info=True)
+        except Exception as e:
+            log.error("Error while updating from DiaCanvas2", exc_info=True)
 
 
-def version_0_7_2(elements, factory, gaphor_version):
+@migration((0, 7, 2), types=("Property", "Parameter"))
+def version_0_7_2(elements, index, factory):
     """
     Before 0.7.2, only Property and Parameter elements had taggedValues.
     Since 0.7.2 all NamedElements are able to have taggedValues. However,
@@ -794,31 +1266,27 @@ def version_0_7_2(elements, factory, gaphor_version):
     """
     import uuid
 
-    if version_lower_than(gaphor_version, (0, 7, 2)):
-        for elem in list(elements.values()):
-            try:
-                if (
-                    isinstance(elem, parser.element)
-                    and elem.type in ("Property", "Parameter")
-                    and elem.taggedValue
-                ):
-                    tvlist = []
-                    tv = elements[elem.taggedValue]
-                    if tv.value:
-                        for t in map(str.strip, str(tv.value).split(",")):
-                            # log.debug("Tagged value: %s" % t)
-                            newtv = parser.element(
-                                str(uuid.uuid1()), "LiteralSpecification"
-                            )
-                            newtv.values["value"] = t
-                            elements[newtv.id] = newtv
-                            tvlist.append(newtv.id)
-                        elem.references["taggedValue"] = tvlist
-            except Exception as e:
-                log.error("Error while updating taggedValues", exc_info=True)
+    for elem in elements:
+        try:
+            if isinstance(elem, parser.element) and elem.get("taggedValue"):
+                tvlist = []
+                tv = index.elements[elem.taggedValue]
+                if tv.get("value"):
+                    for t in map(str.strip, str(tv.value).split(",")):
+                        # log.debug("Tagged value: %s" % t)
+                        newtv = parser.element(
+                            str(uuid.uuid1()), "LiteralSpecification"
+                        )
+                        newtv.values["value"] = t
+                        index.add(newtv)
+                        tvlist.append(newtv.id)
+                    elem.references["taggedValue"] = tvlist
+        except Exception as e:
+            log.error("Error while updating taggedValues", exc_info=True)
 
 
-def version_0_7_1(elements, factory, gaphor_version):
+@migration((0, 7, 1), types=("Association",), post=True)
+def version_0_7_1(elements, index, factory):
     """
     Before version 0.7.1, there were two states for association
     navigability (in terms of UML 2.0): unknown and navigable.
@@ -840,58 +1308,53 @@ def version_0_7_1(elements, factory, gaphor_version):
         if not (type and end1 in type.ownedAttribute):
             del end1.owningAssociation
 
-    if version_lower_than(gaphor_version, (0, 7, 1)):
-        log.info("Fix navigability of Associations (file version: %s)" % gaphor_version)
-        for elem in list(elements.values()):
-            try:
-                if elem.type == "Association":
-                    asc = elem.element
-                    end1 = asc.memberEnd[0]
-                    end2 = asc.memberEnd[1]
-                    if end1 and end2:
-                        fix(end1, end2)
-                        fix(end2, end1)
-            except Exception as e:
-                log.error("Error while updating Association", exc_info=True)
+    for elem in elements:
+        try:
+            asc = elem.element
+            end1 = asc.memberEnd[0]
+            end2 = asc.memberEnd[1]
+            if end1 and end2:
+                fix(end1, end2)
+                fix(end2, end1)
+        except Exception as e:
+            log.error("Error while updating Association", exc_info=True)
 
 
-def version_0_6_2(elements, factory, gaphor_version):
+@migration((0, 6, 2), types=("Interface",))
+def version_0_6_2(elements, index, factory):
     """
     Before 0.6.2 an Interface could be represented by a ClassItem and
     a InterfaceItem. Now only InterfaceItems are used.
     """
-    if version_lower_than(gaphor_version, (0, 6, 2)):
-        for elem in list(elements.values()):
-            try:
-                if isinstance(elem, parser.element) and elem.type == "Interface":
-                    for p_id in elem.presentation:
-                        p = elements[p_id]
-                        if p.type == "ClassItem":
-                            p.type = "InterfaceItem"
-                            p.values["drawing-style"] = "0"
-                        elif p.type == "InterfaceItem":
-                            p.values["drawing-style"] = "2"
-            except Exception as e:
-                log.error("Error while updating InterfaceItems", exc_info=True)
+    for elem in elements:
+        try:
+            if isinstance(elem, parser.element):
+                for p_id in elem.get("presentation") or ():
+                    p = index.elements[p_id]
+                    if p.type == "ClassItem":
+                        index.retype(p, "InterfaceItem")
+                        p.values["drawing-style"] = "0"
+                    elif p.type == "InterfaceItem":
+                        p.values["drawing-style"] = "2"
+        except Exception as e:
+            log.error("Error while updating InterfaceItems", exc_info=True)
 
 
-def version_0_5_2(elements, factory, gaphor_version):
+@migration((0, 5, 2), types=("Association",), post=True)
+def version_0_5_2(elements, index, factory):
     """
     Before version 0.5.2, the wrong memberEnd of the association was
     holding the aggregation information.
     """
-    if version_lower_than(gaphor_version, (0, 5, 2)):
-        log.info("Fix composition on Associations (file version: %s)" % gaphor_version)
-        for elem in list(elements.values()):
-            try:
-                if elem.type == "Association":
-                    a = elem.element
-                    agg1 = a.memberEnd[0].aggregation
-                    agg2 = a.memberEnd[1].aggregation
-                    a.memberEnd[0].aggregation = agg2
-                    a.memberEnd[1].aggregation = agg1
-            except Exception as e:
-                log.error("Error while updating Association", exc_info=True)
+    for elem in elements:
+        try:
+            a = elem.element
+            agg1 = a.memberEnd[0].aggregation
+            agg2 = a.memberEnd[1].aggregation
+            a.memberEnd[0].aggregation = agg2
+            a.memberEnd[1].aggregation = agg1
+        except Exception as e:
+            log.error("Error while updating Association", exc_info=True)
 
 
 # vim: sw=4:et:ai
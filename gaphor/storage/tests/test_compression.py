@@ -0,0 +1,88 @@
+"""
+Unittest loading and saving compressed model files.
+"""
+
+import io
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import pkg_resources
+
+from gaphor.storage import compression, parser
+from gaphor.storage.tests.test_parser import MODEL, dump
+
+
+class CompressionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data=MODEL):
+        filename = os.path.join(self.dir, name)
+        with compression.open_for_writing(filename) as out:
+            out.write(data)
+        return filename
+
+    def test_split_extension(self):
+        self.assertEqual(
+            ("model.gaphor", compression.GZIP),
+            compression.split_extension("model.gaphor.gz"),
+        )
+        self.assertEqual(
+            ("model.gaphor", compression.XZ),
+            compression.split_extension("model.gaphor.xz"),
+        )
+        self.assertEqual(
+            ("model.gaphor", None), compression.split_extension("model.gaphor")
+        )
+
+    def test_detect(self):
+        for name, expected in (
+            ("model.gaphor", None),
+            ("model.gaphor.gz", compression.GZIP),
+            ("model.gaphor.xz", compression.XZ),
+        ):
+            with io.open(self.write(name), "rb") as f:
+                header = f.read(compression.MAGIC_SIZE)
+            self.assertEqual(expected, compression.detect(header))
+
+    def test_parse_compressed(self):
+        expected = dump(parser.parse(self.write("model.gaphor")))
+        self.assertEqual(expected, dump(parser.parse(self.write("model.gaphor.gz"))))
+        self.assertEqual(expected, dump(parser.parse(self.write("model.gaphor.xz"))))
+
+    def test_detect_by_content(self):
+        """The extension is not used to detect compressed files"""
+        filename = self.write("model.gaphor.gz")
+        os.rename(filename, os.path.join(self.dir, "model.gaphor"))
+        elements = parser.parse(os.path.join(self.dir, "model.gaphor"))
+        self.assertEqual(["p1", "d1", "i1", "i2"], list(elements.keys()))
+
+    def test_progress_on_compressed_data(self):
+        dist = pkg_resources.get_distribution("gaphor")
+        path = os.path.join(dist.location, "gaphor/UML/uml2.gaphor")
+        with io.open(path, encoding="utf-8") as f:
+            filename = self.write("uml2.gaphor.gz", f.read())
+
+        loader = parser.ExpatLoader()
+        parser_ = loader.make_parser()
+        file_obj, raw = compression.open_for_reading(filename)
+        try:
+            progress = list(
+                parser.ProgressGenerator(
+                    file_obj, parser_, block_size=4096, raw=raw, interval=0
+                )
+            )
+        finally:
+            file_obj.close()
+            raw.close()
+        self.assertTrue(len(progress) > 1)
+        self.assertEqual(sorted(progress), progress)
+        self.assertEqual(100, progress[-1])
+
+
+# vim:sw=4:et:ai
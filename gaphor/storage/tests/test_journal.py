@@ -0,0 +1,144 @@
+"""
+Unittest the change journal.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+
+from gaphor import UML
+from gaphor.diagram import items
+from gaphor.misc.xmlwriter import XMLWriter
+from gaphor.storage import journal, parser, storage
+from gaphor.tests.testcase import TestCase
+
+
+def parse(filename):
+    loader = parser.ExpatLoader()
+    for x in parser.parse_generator(filename, loader):
+        pass
+    return loader.elements
+
+
+class JournalTestCase(TestCase):
+    def setUp(self):
+        super(JournalTestCase, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "model.gaphor")
+        self.journal = journal.Journal(self.filename)
+        self.recorder = journal.ChangeRecorder()
+        self.recorder.register(self.get_service("component_registry"))
+
+    def tearDown(self):
+        self.recorder.unregister(self.get_service("component_registry"))
+        shutil.rmtree(self.dir)
+        super(JournalTestCase, self).tearDown()
+
+    def save_data(self):
+        out = io.StringIO()
+        storage.save(XMLWriter(out), factory=self.element_factory)
+        return out.getvalue()
+
+    def save_snapshot(self):
+        with io.open(self.filename, "w") as out:
+            storage.save(XMLWriter(out), factory=self.element_factory)
+        self.recorder.reset(self.element_factory, self.filename)
+
+    def save_journal(self):
+        self.journal.append(self.recorder.records())
+        self.recorder.mark_saved()
+
+    def reload(self):
+        """Load snapshot and journal, return the model as saved before"""
+        expected = self.save_data()
+        self.element_factory.flush()
+        with io.open(self.filename) as ifile:
+            storage.load(ifile, self.element_factory, journal=self.journal)
+        return expected
+
+    def test_replay_changes(self):
+        package = self.element_factory.create(UML.Package)
+        package.name = "package"
+        cls = self.element_factory.create(UML.Class)
+        cls.package = package
+        self.save_snapshot()
+
+        package.name = "renamed"
+        cls.isAbstract = True
+        other = self.element_factory.create(UML.Class)
+        other.name = "other"
+        other.package = package
+        cls.unlink()
+        self.save_journal()
+
+        expected = self.reload()
+        self.assertEqual(expected, self.save_data())
+
+        package = self.element_factory.lselect(lambda e: e.isKindOf(UML.Package))[0]
+        self.assertEqual("renamed", package.name)
+        self.assertEqual(["other"], [c.name for c in package.ownedClassifier])
+
+    def test_replay_canvas(self):
+        self.save_snapshot()
+
+        item = self.create(items.CommentItem, UML.Comment)
+        item.subject.body = "Shown"
+        self.save_journal()
+
+        expected = parse(io.StringIO(self.save_data()))
+        elements = parse(self.filename)
+        self.journal.replay(elements)
+
+        self.assertEqual(sorted(expected.keys()), sorted(elements.keys()))
+        self.assertEqual("CommentItem", elements[item.id].type)
+        self.assertEqual(item.subject.id, elements[item.id].references["subject"])
+        self.assertEqual("Shown", elements[item.subject.id].values["body"])
+        self.assertEqual(
+            [item.id], elements[item.subject.id].references["presentation"]
+        )
+        self.assertEqual(
+            [elements[item.id]], elements[self.diagram.id].canvas.canvasitems
+        )
+
+    def test_append_only(self):
+        self.save_snapshot()
+
+        self.element_factory.create(UML.Package).name = "one"
+        self.save_journal()
+        size = self.journal.size()
+        self.element_factory.create(UML.Package).name = "two"
+        self.save_journal()
+
+        with io.open(self.journal.filename) as ifile:
+            data = ifile.read()
+        self.assertTrue(len(data) > size)
+        self.assertEqual(5, len(data.splitlines()))
+
+    def test_ignore_other_model(self):
+        self.save_snapshot()
+        self.element_factory.create(UML.Package)
+        self.save_journal()
+        self.assertEqual(1, len(self.journal.read()))
+
+        # A full save replaces the model file
+        with io.open(self.filename, "a") as out:
+            out.write(u"\n")
+        self.assertEqual([], self.journal.read())
+
+    def test_needs_compaction(self):
+        self.save_snapshot()
+        self.assertFalse(self.journal.needs_compaction())
+
+        with io.open(self.journal.filename, "w") as out:
+            out.write(u"x" * (journal.MIN_COMPACT_SIZE + 1))
+        self.assertTrue(self.journal.needs_compaction())
+
+    def test_flush_stops_recording(self):
+        self.save_snapshot()
+        self.element_factory.flush()
+        self.assertEqual(None, self.recorder.filename)
+        self.assertEqual([], self.recorder.records())
+
+
+# vim:sw=4:et:ai
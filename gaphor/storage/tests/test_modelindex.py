@@ -0,0 +1,135 @@
+"""
+Unittest the model index.
+"""
+
+import io
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import pkg_resources
+
+from gaphor.storage import parser
+from gaphor.storage.modelindex import ModelIndex
+from gaphor.storage.tests.test_parser import MODEL, dump
+
+
+class ModelIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = self.write("model.gaphor", MODEL)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        filename = os.path.join(self.dir, name)
+        with io.open(filename, "w", encoding="utf-8") as out:
+            out.write(data)
+        return filename
+
+    def test_entries(self):
+        index = ModelIndex.build(self.filename)
+
+        self.assertEqual("1.0.0", index.gaphor_version)
+        self.assertEqual(["p1", "d1", "i1", "i2"], [e.id for e in index])
+
+        package = index.entry("p1")
+        self.assertEqual("Package", package.type)
+        self.assertEqual("pack & age", package.name)
+        self.assertEqual(None, package.package)
+
+        diagram = index.entry("d1")
+        self.assertEqual("p1", diagram.package)
+        self.assertFalse(diagram.is_canvasitem())
+
+        item = index.entry("i2")
+        self.assertEqual("CommentItem", item.type)
+        self.assertEqual("d1", item.owner)
+        self.assertTrue(item.is_canvasitem())
+
+    def test_select(self):
+        index = ModelIndex.build(self.filename)
+        self.assertEqual(["d1"], [e.id for e in index.select(package="p1")])
+        self.assertEqual(["i1", "i2"], [e.id for e in index.select(owner="d1")])
+        self.assertEqual(["p1"], [e.id for e in index.select(type="Package")])
+        self.assertEqual([], index.select(type="Package", name="other"))
+
+    def test_parse_elements(self):
+        index = ModelIndex.build(self.filename)
+        elements = parser.parse(self.filename)
+
+        for id in ("p1", "d1", "i1", "i2"):
+            self.assertEqual(dump({id: elements[id]}), dump({id: index.element(id)}))
+        self.assertEqual(["p1", "i2"], list(index.parse(["i2", "p1"]).keys()))
+
+    def test_parse_nested_items(self):
+        index = ModelIndex.build(self.filename)
+        elements = parser.parse(self.filename)
+
+        for ids in (["i1", "i2"], ["d1", "i2"], ["d1", "i1", "i2", "p1"]):
+            parsed = index.parse(ids)
+            self.assertEqual(sorted(ids), sorted(parsed.keys()))
+            for id in ids:
+                self.assertEqual(dump({id: elements[id]}), dump({id: parsed[id]}))
+
+    def test_parse_sibling_items(self):
+        dist = pkg_resources.get_distribution("gaphor")
+        for name in ("association.gaphor", "interactions.gaphor"):
+            path = os.path.join(dist.location, "test-diagrams", name)
+            index = ModelIndex.build(path)
+            elements = parser.parse(path)
+
+            for diagram in index.select(type="Diagram"):
+                ids = [e.id for e in index.select(owner=diagram.id)]
+                self.assertTrue(len(ids) > 1, ids)
+                for request in (ids, ids[1:] + [diagram.id]):
+                    parsed = index.parse(request)
+                    for id in request:
+                        self.assertEqual(
+                            dump({id: elements[id]}), dump({id: parsed[id]})
+                        )
+
+    def test_parse_large_model(self):
+        dist = pkg_resources.get_distribution("gaphor")
+        path = os.path.join(dist.location, "gaphor/UML/uml2.gaphor")
+        index = ModelIndex.build(path)
+        elements = parser.parse(path)
+
+        self.assertEqual(list(elements.keys()), [e.id for e in index])
+        ids = [e.id for e in index][::50]
+        parsed = index.parse(ids)
+        for id in ids:
+            self.assertEqual(dump({id: elements[id]}), dump({id: parsed[id]}))
+
+    def test_open_saves_index(self):
+        index_filename = self.filename + ".index"
+        index = ModelIndex.open(self.filename)
+        self.assertTrue(os.path.exists(index_filename))
+
+        index = ModelIndex.open(self.filename)
+        self.assertEqual(["p1", "d1", "i1", "i2"], [e.id for e in index])
+        self.assertEqual("pack & age", index.element("p1").values["name"])
+
+    def test_changed_model_rebuilds_index(self):
+        ModelIndex.open(self.filename)
+        self.write("model.gaphor", MODEL.replace("pack &amp; age", "package"))
+        os.utime(self.filename, (0, 0))
+
+        index = ModelIndex.open(self.filename)
+        self.assertEqual("package", index.entry("p1").name)
+        self.assertEqual("package", index.element("p1").values["name"])
+
+    def test_compressed_model(self):
+        from gaphor.storage import compression
+
+        filename = os.path.join(self.dir, "model.gaphor.gz")
+        with compression.open_for_writing(filename) as out:
+            out.write(MODEL)
+
+        index = ModelIndex.build(filename)
+        self.assertEqual("CommentItem", index.element("i2").type)
+
+
+# vim:sw=4:et:ai
@@ -0,0 +1,112 @@
+"""
+Unittest the parser module and its loaders.
+"""
+
+import os.path
+import unittest
+from io import StringIO
+
+import pkg_resources
+
+from gaphor.storage import parser
+
+MODEL = u"""<?xml version="1.0" encoding="utf-8"?>
+<gaphor xmlns="http://gaphor.sourceforge.net/model" version="3.0" gaphor-version="1.0.0">
+<Package id="p1">
+<name>
+<val>pack &amp; age</val>
+</name>
+<ownedDiagram>
+<reflist>
+<ref refid="d1"/>
+</reflist>
+</ownedDiagram>
+</Package>
+<Diagram id="d1">
+<package>
+<ref refid="p1"/>
+</package>
+<canvas>
+<item id="i1" type="ClassItem">
+<matrix>
+<val>(1.0, 0.0, 0.0, 1.0, 10.0, 20.0)</val>
+</matrix>
+<item id="i2" type="CommentItem">
+</item>
+</item>
+</canvas>
+</Diagram>
+</gaphor>
+"""
+
+
+def load(data, loader):
+    for x in parser.parse_generator(StringIO(data), loader):
+        pass
+    return loader.elements
+
+
+def dump(elements):
+    """Turn parsed elements into comparable structures."""
+
+    def dump_items(canvasitems):
+        return [
+            (i.id, i.type, i.values, i.references, dump_items(i.canvasitems))
+            for i in canvasitems
+        ]
+
+    result = []
+    for id, e in elements.items():
+        d = [id, type(e).__name__, e.type, e.values, e.references]
+        if isinstance(e, parser.element) and e.canvas:
+            d.append((e.canvas.values, dump_items(e.canvas.canvasitems)))
+        result.append(d)
+    return result
+
+
+class ExpatLoaderTestCase(unittest.TestCase):
+    def test_load_model(self):
+        loader = parser.ExpatLoader()
+        elements = load(MODEL, loader)
+
+        self.assertEqual("3.0", loader.version)
+        self.assertEqual("1.0.0", loader.gaphor_version)
+        self.assertEqual(["p1", "d1", "i1", "i2"], list(elements.keys()))
+
+        p = elements["p1"]
+        self.assertEqual("Package", p.type)
+        self.assertEqual("pack & age", p.values["name"])
+        self.assertEqual(["d1"], p.references["ownedDiagram"])
+
+        d = elements["d1"]
+        self.assertEqual("p1", d.references["package"])
+        self.assertEqual([elements["i1"]], d.canvas.canvasitems)
+        self.assertEqual([elements["i2"]], elements["i1"].canvasitems)
+        self.assertEqual(
+            "(1.0, 0.0, 0.0, 1.0, 10.0, 20.0)", elements["i1"].values["matrix"]
+        )
+
+    def test_invalid_tag(self):
+        data = MODEL.replace("<val>pack", "<foo/><val>pack")
+        self.assertRaises(parser.ParserException, load, data, parser.ExpatLoader())
+
+    def test_same_as_sax_loader(self):
+        self.assertEqual(
+            dump(load(MODEL, parser.GaphorLoader())),
+            dump(load(MODEL, parser.ExpatLoader())),
+        )
+
+    def test_same_as_sax_loader_on_metamodel(self):
+        dist = pkg_resources.get_distribution("gaphor")
+        path = os.path.join(dist.location, "gaphor/UML/uml2.gaphor")
+
+        sax = parser.GaphorLoader()
+        for x in parser.parse_generator(path, sax):
+            pass
+
+        fast = parser.ExpatLoader()
+        for x in parser.parse_generator(path, fast):
+            pass
+
+        self.assertEqual(sax.gaphor_version, fast.gaphor_version)
+        self.assertEqual(dump(sax.elements), dump(fast.elements))
@@ -0,0 +1,98 @@
+"""
+Unittest model snapshots.
+"""
+
+import io
+import os.path
+import shutil
+import tempfile
+
+import pkg_resources
+
+from gaphor import UML
+from gaphor.misc.xmlwriter import XMLWriter
+from gaphor.storage import parser, snapshot, storage
+from gaphor.storage.tests.test_parser import MODEL, dump
+from gaphor.tests.testcase import TestCase
+
+
+class SnapshotTestCase(TestCase):
+    def setUp(self):
+        super(SnapshotTestCase, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.filename = self.write(MODEL)
+        self.snapshot = snapshot.Snapshot(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(SnapshotTestCase, self).tearDown()
+
+    def write(self, data):
+        filename = os.path.join(self.dir, "model.gaphor")
+        with io.open(filename, "w", encoding="utf-8") as out:
+            out.write(data)
+        return filename
+
+    def test_snapshot_equals_parsed_model(self):
+        dist = pkg_resources.get_distribution("gaphor")
+        with io.open(
+            os.path.join(dist.location, "test-diagrams/simple-items.gaphor"),
+            encoding="utf-8",
+        ) as f:
+            self.write(f.read())
+
+        loader = parser.ExpatLoader()
+        for x in parser.parse_generator(self.filename, loader):
+            pass
+        self.snapshot.write(loader.elements, loader.gaphor_version)
+
+        elements, gaphor_version = self.snapshot.read()
+        self.assertEqual(loader.gaphor_version, gaphor_version)
+        self.assertEqual(dump(loader.elements), dump(elements))
+
+    def test_changed_model_invalidates_snapshot(self):
+        self.snapshot.write(parser.parse(self.filename), "1.0.0")
+        self.assertTrue(self.snapshot.read())
+
+        self.write(MODEL.replace("pack &amp; age", "pack &amp; aeg"))
+        self.assertEqual(None, self.snapshot.read())
+
+    def test_invalid_snapshot(self):
+        with io.open(self.snapshot.filename, "wb") as out:
+            out.write(b"garbage")
+        self.assertEqual(None, self.snapshot.read())
+
+    def test_cache_dir(self):
+        cache_dir = os.path.join(self.dir, "cache")
+        cached = snapshot.Snapshot(self.filename, cache_dir)
+        self.assertEqual(cache_dir, os.path.dirname(cached.filename))
+
+        cached.write(parser.parse(self.filename), "1.0.0")
+        self.assertTrue(cached.exists())
+        self.assertFalse(self.snapshot.exists())
+        self.assertTrue(cached.read())
+
+    def test_load_with_snapshot(self):
+        package = self.element_factory.create(UML.Package)
+        package.name = "package"
+        cls = self.element_factory.create(UML.Class)
+        cls.package = package
+        with io.open(self.filename, "w", encoding="utf-8") as out:
+            storage.save(XMLWriter(out), factory=self.element_factory)
+        expected = self.save_data()
+
+        # The first load writes the snapshot, the second one reads it
+        storage.load(self.filename, self.element_factory, snapshot=self.snapshot)
+        self.assertTrue(self.snapshot.exists())
+        self.assertEqual(expected, self.save_data())
+
+        storage.load(self.filename, self.element_factory, snapshot=self.snapshot)
+        self.assertEqual(expected, self.save_data())
+
+    def save_data(self):
+        out = io.StringIO()
+        storage.save(XMLWriter(out), factory=self.element_factory)
+        return out.getvalue()
+
+
+# vim:sw=4:et:ai
@@ -17,8 +17,9 @@ from future import standard_library
 from gaphor import UML
 from gaphor.diagram import items
 from gaphor.misc.xmlwriter import XMLWriter
-from gaphor.storage import storage
+from gaphor.storage import parser, storage
 from gaphor.tests.testcase import TestCase
+from gaphor.transaction import Transaction
 
 standard_library.install_aliases()
 
@@ -297,6 +298,227 @@ class StorageTestCase(TestCase):
         self.maxDiff = None
         self.assertEqual(copy, orig, "Saved model does not match copy")
 
+    def load_lazy(self, path):
+        with io.open(path, "r") as ifile:
+            storage.load(ifile, factory=self.element_factory, lazy=True)
+        return self.element_factory.lselect(lambda e: e.isKindOf(UML.Diagram))
+
+    def test_lazy_load_defers_canvas_items(self):
+        self.create(items.ClassItem, UML.Class)
+        f = StringIO(self.save())
+        storage.load(f, factory=self.element_factory, lazy=True)
+
+        d = self.element_factory.lselect(lambda e: e.isKindOf(UML.Diagram))[0]
+        c = self.element_factory.lselect(lambda e: e.isKindOf(UML.Class))[0]
+        self.assertTrue(isinstance(d.canvas_loader, storage.LazyCanvas))
+
+        # Requesting the presentation loads the diagram
+        self.assertEqual(1, len(c.presentation))
+        self.assertTrue(d.canvas_loader is None)
+        self.assertTrue(c.presentation[0].subject is c)
+        self.assertTrue(c.presentation[0] in d.canvas.get_all_items())
+
+    def test_lazy_load_canvas(self):
+        self.create(items.ClassItem, UML.Class)
+        f = StringIO(self.save())
+        storage.load(f, factory=self.element_factory, lazy=True)
+
+        d = self.element_factory.lselect(lambda e: e.isKindOf(UML.Diagram))[0]
+        c = self.element_factory.lselect(lambda e: e.isKindOf(UML.Class))[0]
+        item = d.canvas.get_all_items()[0]
+        self.assertTrue(d.canvas_loader is None)
+        self.assertTrue(item.subject is c)
+        self.assertEqual([item], list(c.presentation))
+
+    def test_lazy_load_canvas_references(self):
+        self.create(items.ClassItem, UML.Class)
+        f = StringIO(self.save())
+        storage.load(f, factory=self.element_factory, lazy=True)
+
+        d = self.element_factory.lselect(lambda e: e.isKindOf(UML.Diagram))[0]
+        c = self.element_factory.lselect(lambda e: e.isKindOf(UML.Class))[0]
+        self.assertEqual([], self.element_factory.orphans())
+
+        # Items loaded with the canvas are added to the reference index
+        item = d.canvas.get_all_items()[0]
+        self.assertEqual([item], self.element_factory.referrers(c))
+        self.assertEqual([], self.element_factory.orphans())
+
+    def test_lazy_load_save(self):
+        """Saving a lazy loaded model without opening the diagrams"""
+        dist = pkg_resources.get_distribution("gaphor")
+        path = os.path.join(dist.location, "test-diagrams/simple-items.gaphor")
+
+        for d in self.load_lazy(path):
+            self.assertTrue(d.canvas_loader)
+
+        pf = PseudoFile()
+        storage.save(XMLWriter(pf), factory=self.element_factory)
+
+        with io.open(path, "r") as ifile:
+            orig = ifile.read()
+
+        expr = re.compile('gaphor-version="[^"]*"')
+        self.maxDiff = None
+        self.assertEqual(expr.sub("%VER%", pf.data), expr.sub("%VER%", orig))
+
+    def test_lazy_load_flush(self):
+        dist = pkg_resources.get_distribution("gaphor")
+        path = os.path.join(dist.location, "test-diagrams/simple-items.gaphor")
+
+        self.load_lazy(path)
+        self.element_factory.flush()
+        self.assertEqual(0, self.element_factory.size())
+
+
+class LazyLoadUndoTestCase(TestCase):
+
+    services = TestCase.services + ["undo_manager"]
+
+    def test_delete_lazy_diagram_and_undo(self):
+        comment = self.create(items.CommentItem, UML.Comment).subject
+        f = StringIO(self.save())
+        storage.load(f, factory=self.element_factory, lazy=True)
+
+        d = self.element_factory.lselect(lambda e: e.isKindOf(UML.Diagram))[0]
+        comment = self.element_factory.lselect(lambda e: e.isKindOf(UML.Comment))[0]
+        self.assertTrue(d.canvas_loader)
+
+        undo_manager = self.get_service("undo_manager")
+        undo_manager.clear_undo_stack()
+        with Transaction():
+            d.unlink()
+        self.assertEqual(0, len(comment.presentation))
+
+        undo_manager.undo_transaction()
+        d = self.element_factory.lookup(d.id)
+        self.assertEqual(1, len(comment.presentation))
+        self.assertEqual(list(comment.presentation), d.canvas.get_all_items())
+
+
+class SaveCacheTestCase(TestCase):
+    def setUp(self):
+        super(SaveCacheTestCase, self).setUp()
+        self.cache = storage.SaveCache()
+        self.cache.register(self.get_service("component_registry"))
+
+    def tearDown(self):
+        self.cache.unregister(self.get_service("component_registry"))
+        super(SaveCacheTestCase, self).tearDown()
+
+    def save_cached(self):
+        out = PseudoFile()
+        storage.save(XMLWriter(out), factory=self.element_factory, cache=self.cache)
+        return out.data
+
+    def save_uncached(self):
+        out = PseudoFile()
+        storage.save(XMLWriter(out), factory=self.element_factory)
+        return out.data
+
+    def test_cached_save_is_equal(self):
+        self.element_factory.create(UML.Package).name = "p"
+        self.create(items.ClassItem, UML.Class)
+        self.diagram.canvas.update_now()
+
+        self.assertEqual(self.save_uncached(), self.save_cached())
+        self.assertEqual(self.element_factory.size(), len(self.cache))
+        self.assertEqual(self.save_uncached(), self.save_cached())
+
+    def test_rename_invalidates(self):
+        p = self.element_factory.create(UML.Package)
+        p.name = "before"
+        self.save_cached()
+
+        rendered = []
+        self.cache.fragment(p, rendered.append)
+        self.assertEqual([], rendered)
+
+        p.name = "after"
+        data = self.save_cached()
+        self.assertTrue("after" in data, data)
+        self.assertFalse("before" in data, data)
+
+    def test_canvas_change_invalidates(self):
+        item = self.create(items.ClassItem, UML.Class)
+        self.diagram.canvas.update_now()
+        self.save_cached()
+
+        item.matrix.translate(10, 20)
+        self.diagram.canvas.request_matrix_update(item)
+        self.assertEqual(self.save_uncached(), self.save_cached())
+        self.assertTrue("10.0, 20.0" in self.save_cached())
+
+    def test_delete_and_flush(self):
+        c = self.element_factory.create(UML.Class)
+        self.save_cached()
+        self.assertEqual(2, len(self.cache))
+
+        c.unlink()
+        self.assertEqual(1, len(self.cache))
+
+        self.element_factory.flush()
+        self.assertEqual(0, len(self.cache))
+
+
+class MigrationTestCase(TestCase):
+    def names(self, gaphor_version):
+        return [m.func.__name__ for m in storage.applicable_migrations(gaphor_version)]
+
+    def test_no_migrations_for_recent_models(self):
+        self.assertEqual([], self.names(storage.FILE_FORMAT_VERSION))
+        self.assertEqual([], self.names("0.17.0"))
+        self.assertEqual([], self.names("1.0.0"))
+
+    def test_applicable_migrations(self):
+        self.assertEqual(["version_0_17_0"], self.names("0.16.1"))
+        self.assertEqual(
+            [
+                "version_0_14_0",
+                "version_0_15_0_pre",
+                "version_0_15_0_tagged_values",
+                "version_0_15_0_event_occurrence",
+                "version_0_15_0_post",
+                "version_0_15_0_messages",
+                "version_0_17_0",
+            ],
+            self.names("0.13.1"),
+        )
+        self.assertEqual(len(storage.MIGRATIONS), len(self.names("0.5.0")))
+
+    def test_element_index(self):
+        elements = {}
+        for id, type in (("1", "Class"), ("2", "EventOccurrence"), ("3", "Class")):
+            elements[id] = parser.element(id, type)
+        index = storage.ElementIndex(elements)
+
+        self.assertEqual(["1", "3"], sorted(e.id for e in index.select(("Class",))))
+        self.assertEqual(3, len(index.select()))
+
+        index.retype(elements["2"], "MessageOccurrenceSpecification")
+        self.assertEqual([], index.select(("EventOccurrence",)))
+        self.assertEqual(
+            [elements["2"]], index.select(("MessageOccurrenceSpecification",))
+        )
+
+        index.remove("1")
+        self.assertEqual([elements["3"]], index.select(("Class",)))
+        self.assertFalse("1" in elements)
+
+    def test_value_specification_migration(self):
+        elements = {}
+        prop = elements["1"] = parser.element("1", "Property")
+        literal = elements["2"] = parser.element("2", "LiteralString")
+        literal.values["value"] = "default"
+        prop.references["defaultValue"] = "2"
+
+        migrations = storage.applicable_migrations("0.16.0")
+        storage.apply_migrations(migrations, elements, self.element_factory)
+
+        self.assertEqual(["1"], list(elements.keys()))
+        self.assertEqual("default", prop.values["defaultValue"])
+        self.assertFalse("defaultValue" in prop.references)
+
 
 class FileUpgradeTestCase(TestCase):
     def test_association_upgrade(self):
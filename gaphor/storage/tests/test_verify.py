@@ -20,5 +20,16 @@ class VerifyTestCase(TestCase):
 
         assert orphan_references(factory)
 
+    def test_canvas_item_references(self):
+        from gaphor.diagram import items
+
+        line = self.create(items.DependencyItem)
+        assert not orphan_references(self.element_factory)
+
+        # Connected to an item that is not on the canvas
+        item = items.ClassItem("removed")
+        self.diagram.canvas.connect_item(line, line.head, item, item.ports()[0])
+        assert [item] == orphan_references(self.element_factory)
+
 
 # vim:sw=4:et:ai
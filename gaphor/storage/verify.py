@@ -1,12 +1,17 @@
 """
 Verify the content of an element factory before it is saved.
 
-
+The element factory keeps track of the references between elements, so
+only elements that were removed while still referred to, or referred to
+before they were added, have to be checked. Canvas items also refer to
+each other outside of the UML associations (e.g. the items a line is
+connected to): the loaded canvases are walked for those references.
 """
 
+import gaphas
+
 from gaphor import UML
 from gaphor.UML.collection import collection
-import gaphas
 
 
 def orphan_references(factory):
@@ -14,72 +19,54 @@ def orphan_references(factory):
     Verify the contents of the element factory. Only checks are done
     that ensure the model can be loaded back again.
 
+    Returns the elements that are referred to from the model, but are not
+    part of it.
+
     TODO: Okay, now I can predict if a model can be loaded after it's
     saved, but I have no means to correct or fix the model.
     """
+    # Canvases that are not loaded yet are saved as-is. Load those that
+    # refer to removed elements, so the references are dropped.
+    for diagram in factory.select_type(UML.Diagram):
+        loader = diagram.canvas_loader
+        if loader is not None and not all(
+            factory.lookup(id) for id in loader.references()
+        ):
+            loader.load()
 
-    # Maintain a set of id's, one for elements, one for references.
-    # Write only to file if references is a subset of elements
-
-    refs = set()
-    elements = set()
-
-    def verify_reference(name, value):
-        """
-        Store the reference
-        """
-        # Save a reference to the object:
-        if value.id:
-            refs.add((value.id, value))
-
-    def verify_collection(name, value):
-        """
-        Store a list of references.
-        """
-        for v in value:
-            if v.id:
-                refs.add((v.id, v))
-
-    def verify_element(name, value):
-        """
-        Store the element id.
-        """
-        if isinstance(value, (UML.Element, gaphas.Item)):
-            verify_reference(name, value)
-        elif isinstance(value, collection):
-            verify_collection(name, value)
-        elif isinstance(value, gaphas.Canvas):
-            value.save(verify_canvasitem)
+    return factory.orphans() + canvas_orphans(factory)
+
+
+def canvas_orphans(factory):
+    """
+    Return the canvas items referred to from the items on the loaded
+    canvases, that are not on a canvas themselves.
+    """
+    items = set()
+    refs = {}
 
     def verify_canvasitem(name, value, reference=False):
-        """
-        Verify attributes and references in a gaphor.diagram.* object.
-        The extra attribute reference can be used to force UML 
-        """
-        # log.debug('saving canvasitem: %s|%s %s' % (name, value, type(value)))
-        if isinstance(value, collection) or (
-            isinstance(value, (list, tuple)) and reference == True
-        ):
-            verify_collection(name, value)
-        elif reference:
-            verify_reference(name, value)
+        if reference:
+            if not isinstance(value, (collection, list, tuple)):
+                value = (value,)
+            for v in value:
+                if isinstance(v, gaphas.Item) and v.id:
+                    refs[v.id] = v
         elif isinstance(value, gaphas.Item):
-            elements.add(value.id)
+            items.add(value.id)
             value.save(verify_canvasitem)
 
-            # save subitems
             for child in value.canvas.get_children(value):
                 verify_canvasitem(None, child)
 
-        elif isinstance(value, UML.Element):
-            verify_reference(name, value)
-
-    for e in list(factory.values()):
-        assert e.id
-        elements.add(e.id)
-        e.save(verify_element)
+    for diagram in factory.select_type(UML.Diagram):
+        loader = diagram.canvas_loader
+        if loader is None:
+            diagram.canvas.save(verify_canvasitem)
+        else:
+            items.update(loader.item_ids())
 
-    return [r[1] for r in refs if not r[0] in elements]
+    return [v for id, v in refs.items() if id not in items]
 
 
 # vim:sw=4:et:ai
@@ -91,7 +91,7 @@ for model in args:
     storage.load(model, factory)
     message("\nready for rendering\n")
 
-    for diagram in factory.select(lambda e: e.isKindOf(UML.Diagram)):
+    for diagram in factory.select_type(UML.Diagram):
         odir = pkg2dir(diagram.package)
 
         # just diagram name
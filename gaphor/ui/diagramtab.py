@@ -23,7 +23,11 @@ from gi.repository import Gtk
 from past.utils import old_div
 
 from gaphor import UML
-from gaphor.UML.interfaces import IAttributeChangeEvent, IElementDeleteEvent
+from gaphor.UML.interfaces import (
+    IAttributeChangeEvent,
+    IElementDeleteEvent,
+    IElementsDeleteEvent,
+)
 from gaphor.core import _, inject, transactional, action, build_action_group
 from gaphor.diagram import get_diagram_item
 from gaphor.diagram.items import DiagramItem
@@ -89,6 +93,7 @@ class DiagramTab(object):
         self.toolbox = None
         self.component_registry.register_handler(self._on_element_change)
         self.component_registry.register_handler(self._on_element_delete)
+        self.component_registry.register_handler(self._on_elements_delete)
 
     title = property(lambda s: s.diagram and s.diagram.name or _("<None>"))
 
@@ -150,6 +155,11 @@ class DiagramTab(object):
         if event.element is self.diagram:
             self.close()
 
+    @component.adapter(IElementsDeleteEvent)
+    def _on_elements_delete(self, event):
+        if self.diagram in event.elements:
+            self.close()
+
     @action(name="diagram-close", stock_id="gtk-close")
     def close(self):
         """
@@ -158,6 +168,7 @@ class DiagramTab(object):
         """
         self.widget.destroy()
         self.component_registry.unregister_handler(self._on_element_delete)
+        self.component_registry.unregister_handler(self._on_elements_delete)
         self.component_registry.unregister_handler(self._on_element_change)
         self.view = None
 
@@ -25,8 +25,8 @@ class FileDialog(object):
         parameter should be set to true if sultiple files can be opened at once.
         This means that a list of filenames instead of a single filename string
         will be returned by the selection property.  The filters is a list
-        of dictionaries that have a name and pattern key.  This restricts what
-        is visible in the dialog."""
+        of dictionaries that have a name and pattern key.  The pattern may also
+        be a list of patterns.  This restricts what is visible in the dialog."""
 
         self.multiple = multiple
 
@@ -55,7 +55,11 @@ class FileDialog(object):
         for filter in filters:
             _filter = Gtk.FileFilter()
             _filter.set_name(filter["name"])
-            _filter.add_pattern(filter["pattern"])
+            patterns = filter["pattern"]
+            if isinstance(patterns, str):
+                patterns = [patterns]
+            for pattern in patterns:
+                _filter.add_pattern(pattern)
             self.dialog.add_filter(_filter)
 
     def get_selection(self):
@@ -396,10 +396,9 @@ class MainWindow(object):
         Open the toplevel element and load toplevel diagrams.
         """
         # TODO: Make handlers for ModelFactoryEvent from within the GUI obj
-        for diagram in self.element_factory.select(
-            lambda e: e.isKindOf(UML.Diagram)
-            and not (e.namespace and e.namespace.namespace)
-        ):
+        for diagram in self.element_factory.select_type(UML.Diagram):
+            if diagram.namespace and diagram.namespace.namespace:
+                continue
             # self.show_diagram(diagram)
             self.component_registry.handle(DiagramShow(diagram))
 
@@ -784,7 +783,7 @@ class Namespace(object):
     def tree_view_delete_package(self):
         package = self._namespace.get_selected_element()
         assert isinstance(package, UML.Package)
-        package.unlink()
+        self.element_factory.unlink_many([package])
 
     @action(name="tree-view-refresh", label=_("_Refresh"))
     def tree_view_refresh(self):
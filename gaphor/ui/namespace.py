@@ -23,12 +23,19 @@ from zope import component
 
 from gaphor import UML
 from gaphor.UML.event import (
+    ElementChangeSet,
     ElementCreateEvent,
+    ElementsCreateEvent,
     ModelFactoryEvent,
     FlushFactoryEvent,
     DerivedSetEvent,
 )
-from gaphor.UML.interfaces import IAttributeChangeEvent, IElementDeleteEvent
+from gaphor.UML.interfaces import (
+    IAttributeChangeEvent,
+    IElementChangeSetEvent,
+    IElementDeleteEvent,
+    IElementsDeleteEvent,
+)
 from gaphor.core import inject
 from gaphor.transaction import Transaction
 from gaphor.ui import stock
@@ -89,9 +96,13 @@ class NamespaceModel(Gtk.GenericTreeModel):
 
     NOTE: when a model is loaded no IAssociation*Event's are emitted.
 
+    Attribute changes, like name changes, are handled once per transaction,
+    as sent by the event coalescer service. Without that service they are
+    handled one by one.
     """
 
     component_registry = inject("component_registry")
+    event_coalescer = inject("event_coalescer")
 
     def __init__(self, factory):
         # Init parent:
@@ -111,12 +122,22 @@ class NamespaceModel(Gtk.GenericTreeModel):
 
         self.filter = _default_filter_list
 
+        try:
+            self.event_coalescer
+        except component.ComponentLookupError:
+            log.warning("No event coalescer: tree view updates are not coalesced")
+            self._change_handler = self._on_attribute_change
+        else:
+            self._change_handler = self._on_element_change
+
         cr = self.component_registry
         cr.register_handler(self.flush)
         cr.register_handler(self.refresh)
-        cr.register_handler(self._on_element_change)
+        cr.register_handler(self._change_handler)
         cr.register_handler(self._on_element_create)
         cr.register_handler(self._on_element_delete)
+        cr.register_handler(self._on_elements_create)
+        cr.register_handler(self._on_elements_delete)
         cr.register_handler(self._on_association_set)
 
         self._build_model()
@@ -128,9 +149,11 @@ class NamespaceModel(Gtk.GenericTreeModel):
         cr = self.component_registry
         cr.unregister_handler(self.flush)
         cr.unregister_handler(self.refresh)
-        cr.unregister_handler(self._on_element_change)
+        cr.unregister_handler(self._change_handler)
         cr.unregister_handler(self._on_element_create)
         cr.unregister_handler(self._on_element_delete)
+        cr.unregister_handler(self._on_elements_create)
+        cr.unregister_handler(self._on_elements_delete)
         cr.unregister_handler(self._on_association_set)
 
     def path_from_element(self, e):
@@ -158,37 +181,54 @@ class NamespaceModel(Gtk.GenericTreeModel):
             return None
 
     @component.adapter(IAttributeChangeEvent)
+    def _on_attribute_change(self, event):
+        """
+        Handle an attribute change as a change set of its own, used if
+        there is no event coalescer service.
+        """
+        changes = ElementChangeSet()
+        changes.add(event)
+        self._on_element_change(changes)
+
+    @component.adapter(IElementChangeSetEvent)
     @catchall
     def _on_element_change(self, event):
         """
-        Element changed, update appropriate row.
+        Elements changed, update the appropriate rows. Rows are sorted again
+        once for all name changes in the change set.
         """
-        element = event.element
-        if element not in self._nodes:
-            return
+        resort = []
+        for change in event:
+            element = change.element
+            if element not in self._nodes:
+                continue
 
-        if (
-            event.property is UML.Classifier.isAbstract
-            or event.property is UML.BehavioralFeature.isAbstract
-        ):
-            path = self.path_from_element(element)
-            if path:
-                self.row_changed(path, self.get_iter(path))
-
-        if event.property is UML.NamedElement.name:
-            try:
+            if (
+                change.property is UML.Classifier.isAbstract
+                or change.property is UML.BehavioralFeature.isAbstract
+            ):
                 path = self.path_from_element(element)
-            except KeyError:
-                # Element not visible in the tree view
-                return
+                if path:
+                    self.row_changed(path, self.get_iter(path))
 
-            if not path:
-                return
-            self.row_changed(path, self.get_iter(path))
-            parent_nodes = self._nodes[element.namespace]
-            parent_path = self.path_from_element(element.namespace)
+            if change.property is UML.NamedElement.name:
+                try:
+                    path = self.path_from_element(element)
+                except KeyError:
+                    # Element not visible in the tree view
+                    continue
+
+                if not path:
+                    continue
+                self.row_changed(path, self.get_iter(path))
+                if element.namespace not in resort:
+                    resort.append(element.namespace)
+
+        for namespace in resort:
+            parent_nodes = self._nodes[namespace]
+            parent_path = self.path_from_element(namespace)
             if not parent_path:
-                return
+                continue
 
             original = list(parent_nodes)
             parent_nodes.sort(key=_tree_sorter)
@@ -246,14 +286,33 @@ class NamespaceModel(Gtk.GenericTreeModel):
         if event.service is self.factory:
             self._add_elements(element)
 
+    @component.adapter(ElementsCreateEvent)
+    @catchall
+    def _on_elements_create(self, event):
+        if event.service is self.factory:
+            for element in event.elements:
+                self._add_elements(element)
+
     @component.adapter(IElementDeleteEvent)
     @catchall
     def _on_element_delete(self, event):
-        element = event.element
-
         # log.debug('Namespace received deleting element %s' % element)
 
-        if event.service is self.factory and type(element) in self.filter:
+        if event.service is self.factory:
+            self._element_deleted(event.element)
+
+    @component.adapter(IElementsDeleteEvent)
+    @catchall
+    def _on_elements_delete(self, event):
+        if event.service is self.factory:
+            for element in event.elements:
+                self._element_deleted(element)
+
+    def _element_deleted(self, element):
+        """
+        Remove a deleted element and its rows.
+        """
+        if type(element) in self.filter:
             path = self.path_from_element(element)
 
             # log.debug('Deleting element %s from path %s' % (element, path))
@@ -333,9 +392,9 @@ class NamespaceModel(Gtk.GenericTreeModel):
         self._nodes = {None: []}
 
     def _build_model(self):
-        toplevel = self.factory.select(
-            lambda e: isinstance(e, UML.Namespace) and not e.namespace
-        )
+        toplevel = [
+            e for e in self.factory.select_type(UML.Namespace) if not e.namespace
+        ]
 
         for element in toplevel:
             self._add_elements(element)
@@ -179,6 +179,43 @@ class NewNamespaceTestCase(TestCase):
         assert c not in ns._nodes[a]
 
 
+class NamespaceChangeSetTestCase(TestCase):
+
+    services = ["element_factory", "event_coalescer"]
+
+    def test_rename_in_transaction(self):
+        from gaphor.transaction import Transaction
+
+        factory = self.element_factory
+        ns = NamespaceModel(factory)
+        packages = []
+        classes = []
+        for p in range(2):
+            package = factory.create(UML.Package)
+            package.name = "p%d" % p
+            packages.append(package)
+            for n in range(3):
+                c = factory.create(UML.Class)
+                c.name = "c%d" % n
+                c.package = package
+                classes.append(c)
+
+        reordered = []
+        ns.rows_reordered = lambda path, iter, order: reordered.append(path)
+        with Transaction():
+            for n, c in enumerate(classes):
+                c.name = "z%d" % (len(classes) - n)
+
+        self.assertEqual(
+            sorted(ns.path_from_element(p) for p in packages), sorted(reordered)
+        )
+        for package in packages:
+            self.assertEqual(
+                sorted(package.ownedMember, key=lambda c: c.name), ns._nodes[package]
+            )
+        ns.close()
+
+
 if __name__ == "__main__":
     import unittest
 
@@ -98,6 +98,7 @@ It uses the GTK+ environment for user interaction.
             "copy = gaphor.services.copyservice:CopyService",
             "sanitizer = gaphor.services.sanitizerservice:SanitizerService",
             "element_dispatcher = gaphor.services.elementdispatcher:ElementDispatcher",
+            "event_coalescer = gaphor.services.eventcoalescer:EventCoalescer",
             # 'property_dispatcher = gaphor.services.propertydispatcher:PropertyDispatcher',
             "xmi_export = gaphor.plugins.xmiexport:XMIExport",
             "diagram_layout = gaphor.plugins.diagramlayout:DiagramLayout",
@@ -0,0 +1,8 @@
+"""
+Benchmarks for Gaphor.
+
+Each module in this package can be run as a script from the top level
+source directory, e.g.:
+
+    python -m utils.benchmarks.bench_parser
+"""
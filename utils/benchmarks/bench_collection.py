@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure associations with a large fan-out.
+
+Usage:
+    python -m utils.benchmarks.bench_collection [size ...]
+
+For each size (1k, 5k and 20k by default) a class gets that many owned
+attributes, and a comment is attached to that many elements. Adding the
+values, testing membership and removing them in random order are timed.
+All timings should grow linearly with the size.
+"""
+from __future__ import print_function
+
+import random
+import sys
+import time
+
+from gaphor import UML
+
+DEFAULT_SIZES = (1000, 5000, 20000)
+
+
+def bench(owner, name, values):
+    prop = getattr(type(owner), name)
+    t0 = time.time()
+    for v in values:
+        prop._set(owner, v)
+    t1 = time.time()
+    collection = getattr(owner, name)
+    for v in values:
+        assert v in collection
+    t2 = time.time()
+    values = list(values)
+    random.shuffle(values)
+    for v in values:
+        collection.remove(v)
+    t3 = time.time()
+    return t1 - t0, t2 - t1, t3 - t2
+
+
+def bench_attributes(factory, size):
+    cls = factory.create(UML.Class)
+    return bench(
+        cls, "ownedAttribute", [factory.create(UML.Property) for n in range(size)]
+    )
+
+
+def bench_annotated(factory, size):
+    comment = factory.create(UML.Comment)
+    return bench(
+        comment, "annotatedElement", [factory.create(UML.Class) for n in range(size)]
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(
+        "%-18s %8s %10s %10s %10s"
+        % ("association", "size", "add", "contains", "remove")
+    )
+    for name, func in (
+        ("ownedAttribute", bench_attributes),
+        ("annotatedElement", bench_annotated),
+    ):
+        for size in sizes:
+            factory = UML.ElementFactory()
+            add, contains, remove = func(factory, size)
+            print(
+                "%-18s %8d %9.3fs %9.3fs %9.3fs" % (name, size, add, contains, remove)
+            )
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure how fast model changes are dispatched as change events.
+
+Usage:
+    python -m utils.benchmarks.bench_events [count]
+
+Each change sends an event through zope.component, where the derived and
+redefined properties of the metamodel pick it up. Three kinds of changes
+are timed: setting an attribute, setting a [0..1] association (with its
+opposite) and adding to and removing from a [0..*] association.
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from gaphor import UML
+
+DEFAULT_COUNT = 20000
+
+
+def bench_attribute(factory, count):
+    c = factory.create(UML.Class)
+    t0 = time.time()
+    for n in range(count):
+        c.name = "name%d" % (n % 2)
+    return time.time() - t0
+
+
+def bench_set(factory, count):
+    c = factory.create(UML.Class)
+    p1 = factory.create(UML.Package)
+    p2 = factory.create(UML.Package)
+    t0 = time.time()
+    for n in range(count // 2):
+        c.package = p1
+        c.package = p2
+    return time.time() - t0
+
+
+def bench_add(factory, count):
+    c = factory.create(UML.Class)
+    a = factory.create(UML.Property)
+    t0 = time.time()
+    for n in range(count // 2):
+        c.ownedAttribute = a
+        del c.ownedAttribute[a]
+    return time.time() - t0
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if sys.argv[1:] else DEFAULT_COUNT
+    factory = UML.ElementFactory()
+
+    print("%-24s %10s %14s" % ("change", "time", "changes/s"))
+    for name, bench in (
+        ("attribute", bench_attribute),
+        ("[0..1] association", bench_set),
+        ("[0..*] association", bench_add),
+    ):
+        t = bench(factory, count)
+        print("%-24s %9.3fs %14d" % (name, t, count / t))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure how parse, load and flush times scale with the model size.
+
+Usage:
+    python -m utils.benchmarks.bench_factory [size ...]
+
+By default models of 10k, 100k and 1M elements are generated. All
+timings should grow linearly with the number of elements.
+"""
+from __future__ import print_function
+
+import sys
+import time
+from io import StringIO
+
+from gaphor import UML
+from gaphor.storage import parser, storage
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+
+def generate_model(size, package_size=100):
+    """Generate a model file with size elements: packages holding
+    package_size - 1 classes each. Packages are kept small, so the timings
+    reflect the element registry, not the association collections.
+    """
+    out = StringIO()
+    out.write(
+        u'<?xml version="1.0" encoding="utf-8"?>\n'
+        u'<gaphor xmlns="http://gaphor.sourceforge.net/model"'
+        u' version="3.0" gaphor-version="1.0.0">\n'
+    )
+    for p in range(0, size, package_size):
+        classes = range(p + 1, min(p + package_size, size))
+        out.write(u'<Package id="p%d">\n<ownedClassifier>\n<reflist>\n' % p)
+        for n in classes:
+            out.write(u'<ref refid="c%d"/>\n' % n)
+        out.write(u"</reflist>\n</ownedClassifier>\n</Package>\n")
+        for n in classes:
+            out.write(
+                u'<Class id="c%d">\n<name>\n<val>Class%d</val>\n</name>\n'
+                u'<package>\n<ref refid="p%d"/>\n</package>\n</Class>\n' % (n, n, p)
+            )
+    out.write(u"</gaphor>\n")
+    out.seek(0)
+    return out
+
+
+def bench(size):
+    data = generate_model(size)
+
+    t0 = time.time()
+    loader = parser.ExpatLoader()
+    for x in parser.parse_generator(data, loader):
+        pass
+    t1 = time.time()
+    factory = UML.ElementFactory()
+    for x in storage.load_elements_generator(
+        loader.elements, factory, loader.gaphor_version
+    ):
+        pass
+    t2 = time.time()
+    factory.flush()
+    t3 = time.time()
+
+    assert factory.size() == 0
+    return t1 - t0, t2 - t1, t3 - t2
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(
+        "%10s %10s %10s %10s %14s"
+        % ("elements", "parse", "load", "flush", "us/element")
+    )
+    for size in sizes:
+        parse, load, flush = bench(size)
+        print(
+            "%10d %9.2fs %9.2fs %9.2fs %14.1f"
+            % (size, parse, load, flush, (parse + load + flush) * 1e6 / size)
+        )
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure how many events per second the component registry dispatches.
+
+Usage:
+    python -m utils.benchmarks.bench_handle [count]
+
+The services that listen to model changes (element dispatcher, undo
+manager) are started. Count events (100k by default) are sent directly
+through the component registry, then count model changes are made, each of
+which sends several events. Both are timed with and without an event
+filter being registered.
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from gaphor import UML
+from gaphor.application import Application
+from gaphor.UML.event import AttributeChangeEvent
+from gaphor.UML.elementfactory import ElementChangedEventBlocker
+
+DEFAULT_COUNT = 100000
+
+
+class Blocker(ElementChangedEventBlocker):
+    """An event filter that blocks nothing."""
+
+    def filter(self):
+        return None
+
+
+def bench_events(registry, element, count):
+    event = AttributeChangeEvent(element, UML.NamedElement.name, None, "name")
+    handle = registry.handle
+    t0 = time.time()
+    for n in range(count):
+        handle(event)
+    return time.time() - t0
+
+
+def bench_changes(registry, element, count):
+    t0 = time.time()
+    for n in range(count):
+        element.name = "name%d" % (n % 2)
+    return time.time() - t0
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if sys.argv[1:] else DEFAULT_COUNT
+
+    Application.init(
+        ["element_factory", "component_registry", "element_dispatcher", "undo_manager"]
+    )
+    registry = Application.get_service("component_registry")
+    factory = Application.get_service("element_factory")
+    undo_manager = Application.get_service("undo_manager")
+    element = factory.create(UML.Class)
+
+    print("%-24s %9s %12s" % ("", "time", "per second"))
+    for filtered in (False, True):
+        suffix = filtered and ", with filter" or ""
+        if filtered:
+            registry.register_subscription_adapter(Blocker)
+        undo_manager.begin_transaction()
+        try:
+            for name, bench in (("events", bench_events), ("changes", bench_changes)):
+                t = bench(registry, element, count)
+                print("%-24s %8.3fs %12d" % (name + suffix, t, count / t))
+        finally:
+            undo_manager.rollback_transaction()
+            if filtered:
+                registry.unregister_subscription_adapter(Blocker)
+    Application.shutdown()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure element creation throughput with different id allocators.
+
+Usage:
+    python -m utils.benchmarks.bench_ids [count]
+
+Count elements (100k by default) are created in a factory, one by one and
+as a batch (create_many()), with uuid1 ids (the old ids) and with the
+default counter based ids. Allocating the ids alone is timed as well.
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from gaphor import UML
+from gaphor.UML.idallocator import IdAllocator, UuidAllocator, set_allocator
+
+DEFAULT_COUNT = 100000
+
+
+def bench_ids(allocator, count):
+    t0 = time.time()
+    new_id = allocator.new_id
+    for n in range(count):
+        new_id()
+    return time.time() - t0
+
+
+def bench_create(count):
+    factory = UML.ElementFactory()
+    t0 = time.time()
+    create = factory.create
+    for n in range(count):
+        create(UML.Class)
+    return time.time() - t0
+
+
+def bench_create_many(count):
+    factory = UML.ElementFactory()
+    t0 = time.time()
+    factory.create_many(UML.Class, [None] * count)
+    return time.time() - t0
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if sys.argv[1:] else DEFAULT_COUNT
+
+    print("%-10s %18s %18s %18s" % ("ids", "new_id", "create", "create_many"))
+    for name, allocator in (("uuid1", UuidAllocator()), ("counter", IdAllocator())):
+        previous = set_allocator(allocator)
+        try:
+            times = (
+                bench_ids(allocator, count),
+                bench_create(count),
+                bench_create_many(count),
+            )
+        finally:
+            set_allocator(previous)
+        print(
+            "%-10s %s"
+            % (name, " ".join("%7.3fs %8d/s" % (t, count / t) for t in times))
+        )
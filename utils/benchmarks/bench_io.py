@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure load and save wall time versus the I/O block size.
+
+Usage:
+    python -m utils.benchmarks.bench_io [size]
+
+A generated model (100k elements by default) is written to a temporary
+file. It is parsed with different read block sizes and the loaded model
+is saved with different XMLWriter buffer sizes. The number of progress
+reports (switches to the GUI main loop when loading from the GUI) is
+shown too.
+"""
+from __future__ import print_function
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from gaphor import UML
+from gaphor.misc.xmlwriter import XMLWriter
+from gaphor.storage import parser, storage
+
+from utils.benchmarks.bench_factory import generate_model
+
+DEFAULT_SIZE = 100000
+BLOCK_SIZES = (512, 4096, 64 * 1024, 256 * 1024, 1024 * 1024)
+BUFFER_SIZES = (1, 4096, 64 * 1024, 1024 * 1024)
+
+
+def parse(filename, block_size, interval):
+    loader = parser.ExpatLoader()
+    p = loader.make_parser()
+    t0 = time.time()
+    with io.open(filename, "rb") as f:
+        reports = len(list(parser.ProgressGenerator(f, p, block_size, None, interval)))
+    p.close()
+    return time.time() - t0, reports, loader
+
+
+def save(filename, factory, buffer_size):
+    t0 = time.time()
+    with io.open(filename, "w", encoding="utf-8") as out:
+        storage.save(XMLWriter(out, buffer_size=buffer_size), factory)
+    return time.time() - t0
+
+
+def bench(size):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, "model.gaphor")
+        with io.open(filename, "w", encoding="utf-8") as out:
+            shutil.copyfileobj(generate_model(size), out)
+        print("%d elements, %d bytes" % (size, os.path.getsize(filename)))
+
+        print()
+        print("%10s %20s %20s" % ("block", "parse (old reports)", "parse (throttled)"))
+        for block_size in BLOCK_SIZES:
+            t_all, n_all, loader = parse(filename, block_size, 0)
+            t_throttled, n_throttled, loader = parse(
+                filename, block_size, parser.PROGRESS_INTERVAL
+            )
+            print(
+                "%10d %11.3fs %7d %11.3fs %7d"
+                % (block_size, t_all, n_all, t_throttled, n_throttled)
+            )
+
+        factory = UML.ElementFactory()
+        for x in storage.load_elements_generator(
+            loader.elements, factory, loader.gaphor_version
+        ):
+            pass
+
+        print()
+        print("%10s %10s" % ("buffer", "save"))
+        for buffer_size in BUFFER_SIZES:
+            print("%10d %9.3fs" % (buffer_size, save(filename, factory, buffer_size)))
+        factory.flush()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if sys.argv[1:] else DEFAULT_SIZE)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure the memory used by model elements.
+
+Usage:
+    python -m utils.benchmarks.bench_memory [count]
+
+For a number of element types, count elements (10k by default) are
+created in a factory and given a name. The memory allocated per element is
+reported after creation, after reading all properties of every element
+(like the editors and the save code do) and after linking each element to
+an owner. A generated model of Packages and Classes is loaded as well.
+"""
+from __future__ import print_function
+
+import gc
+import sys
+import tracemalloc
+
+from gaphor import UML
+from gaphor.storage import parser, storage
+
+from utils.benchmarks.bench_factory import generate_model
+
+DEFAULT_COUNT = 10000
+
+TYPES = (
+    (UML.Class, "package"),
+    (UML.Package, "package"),
+    (UML.Property, "class_"),
+    (UML.Operation, "class_"),
+    (UML.Association, "package"),
+    (UML.Comment, None),
+)
+
+
+def allocated():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def read_all(elements):
+    for e in elements:
+        for prop in e.umlproperties():
+            try:
+                prop.__get__(e)
+            except Exception:
+                pass
+
+
+def bench_type(cls, owner_name, count):
+    factory = UML.ElementFactory()
+    owner_type = owner_name and getattr(cls, owner_name).type
+    start = allocated()
+    elements = [factory.create(cls) for n in range(count)]
+    for n, e in enumerate(elements):
+        if isinstance(e, UML.NamedElement):
+            e.name = "element%d" % n
+    created = allocated()
+    read_all(elements)
+    read = allocated()
+    if owner_type:
+        owner = factory.create(owner_type)
+        for e in elements:
+            setattr(e, owner_name, owner)
+    linked = allocated()
+    factory.flush()
+    return [(m - start) / count for m in (created, read, linked)]
+
+
+def bench_load(count):
+    data = generate_model(count)
+    loader = parser.ExpatLoader()
+    for x in parser.parse_generator(data, loader):
+        pass
+    start = allocated()
+    factory = UML.ElementFactory()
+    for x in storage.load_elements_generator(
+        loader.elements, factory, loader.gaphor_version
+    ):
+        pass
+    loaded = allocated()
+    read_all(factory.values())
+    read = allocated()
+    factory.flush()
+    return (loaded - start) / count, (read - start) / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if sys.argv[1:] else DEFAULT_COUNT
+
+    tracemalloc.start()
+    print("bytes per element, %d elements" % count)
+    print("%-16s %10s %10s %10s" % ("type", "created", "read", "linked"))
+    for cls, owner_name in TYPES:
+        print(
+            "%-16s %10d %10d %10d"
+            % ((cls.__name__,) + tuple(bench_type(cls, owner_name, count)))
+        )
+    print("%-16s %10d %10d" % (("loaded model",) + bench_load(count)))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Compare the SAX and pyexpat model loaders.
+
+Usage:
+    python -m utils.benchmarks.bench_parser [model.gaphor] [repeat]
+
+By default the UML meta model (gaphor/UML/uml2.gaphor) is parsed.
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+
+from gaphor.storage import parser
+
+DEFAULT_MODEL = "gaphor/UML/uml2.gaphor"
+
+
+def load(filename, loader_class):
+    loader = loader_class()
+    for x in parser.parse_generator(filename, loader):
+        pass
+    return loader.elements
+
+
+def bench(filename, repeat=5):
+    results = {}
+    for loader_class in (parser.GaphorLoader, parser.ExpatLoader):
+        timer = timeit.Timer(lambda: load(filename, loader_class))
+        results[loader_class.__name__] = min(timer.repeat(repeat, 1))
+    return results
+
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MODEL
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    results = bench(filename, repeat)
+    sax = results["GaphorLoader"]
+    fast = results["ExpatLoader"]
+    print("%-14s %8.3f s" % ("GaphorLoader", sax))
+    print("%-14s %8.3f s" % ("ExpatLoader", fast))
+    print("speedup        %8.1fx" % (sax / fast))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure the effect of the save cache on saving a large model.
+
+Usage:
+    python -m utils.benchmarks.bench_save [size]
+
+A model of 50k elements is loaded and saved without cache, with a cold
+cache and, after renaming a single class, with a warm cache. The last
+save should only render the renamed class.
+"""
+from __future__ import print_function
+
+import sys
+import time
+from io import StringIO
+
+from zope import component
+
+from gaphor import UML
+from gaphor.misc.xmlwriter import XMLWriter
+from gaphor.storage import parser, storage
+
+from utils.benchmarks.bench_factory import generate_model
+
+DEFAULT_SIZE = 50000
+
+
+class GlobalRegistry(object):
+    """The plain ElementFactory sends its events to the global registry."""
+
+    def register_handler(self, handler):
+        component.provideHandler(handler)
+
+    def unregister_handler(self, handler):
+        component.getGlobalSiteManager().unregisterHandler(handler)
+
+
+def save(factory, cache=None):
+    out = StringIO()
+    t0 = time.time()
+    storage.save(XMLWriter(out), factory, cache=cache)
+    return time.time() - t0, out.getvalue()
+
+
+def bench(size):
+    loader = parser.ExpatLoader()
+    for x in parser.parse_generator(generate_model(size), loader):
+        pass
+    factory = UML.ElementFactory()
+    for x in storage.load_elements_generator(
+        loader.elements, factory, loader.gaphor_version
+    ):
+        pass
+
+    registry = GlobalRegistry()
+    cache = storage.SaveCache()
+    cache.register(registry)
+    try:
+        plain, data = save(factory)
+        cold, cold_data = save(factory, cache)
+        assert cold_data == data
+
+        factory.lookup("c1").name = "Renamed"
+        warm, warm_data = save(factory, cache)
+        assert warm_data == save(factory)[1]
+        assert "Renamed" in warm_data
+    finally:
+        cache.unregister(registry)
+        factory.flush()
+
+    return plain, cold, warm
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if sys.argv[1:] else DEFAULT_SIZE
+
+    plain, cold, warm = bench(size)
+    print("%d elements" % size)
+    print("save without cache:   %7.3fs" % plain)
+    print("save with cold cache: %7.3fs" % cold)
+    print("save after a rename:  %7.3fs (%.1fx)" % (warm, plain / warm))
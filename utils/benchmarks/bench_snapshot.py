@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure reopening a model with and without a snapshot.
+
+Usage:
+    python -m utils.benchmarks.bench_snapshot [size]
+
+A generated model (50k elements by default) is written to a temporary
+file. It is opened by parsing the XML, once more to write the snapshot
+and then from the snapshot. Reading the parsed elements and the full
+load (including creating the model elements) are timed separately.
+"""
+from __future__ import print_function
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from gaphor import UML
+from gaphor.storage import parser, snapshot, storage
+
+from utils.benchmarks.bench_factory import generate_model
+
+DEFAULT_SIZE = 50000
+
+
+def parse(filename):
+    t0 = time.time()
+    loader = parser.ExpatLoader()
+    for x in parser.parse_generator(filename, loader):
+        pass
+    return time.time() - t0
+
+
+def read(model_snapshot):
+    t0 = time.time()
+    elements, gaphor_version = model_snapshot.read()
+    return time.time() - t0
+
+
+def load(filename, model_snapshot=None):
+    factory = UML.ElementFactory()
+    t0 = time.time()
+    storage.load(filename, factory, snapshot=model_snapshot)
+    t = time.time() - t0
+    factory.flush()
+    return t
+
+
+def bench(size):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmpdir, "model.gaphor")
+        with io.open(filename, "w", encoding="utf-8") as out:
+            shutil.copyfileobj(generate_model(size), out)
+        model_snapshot = snapshot.Snapshot(filename)
+
+        t_parse = parse(filename)
+        t_load = load(filename)
+        t_write = load(filename, model_snapshot)
+        t_read = read(model_snapshot)
+        t_reopen = load(filename, model_snapshot)
+
+        print(
+            "%d elements, model %d bytes, snapshot %d bytes"
+            % (
+                size,
+                os.path.getsize(filename),
+                os.path.getsize(model_snapshot.filename),
+            )
+        )
+        print("parse XML:              %7.3fs" % t_parse)
+        print("read snapshot:          %7.3fs (%.1fx)" % (t_read, t_parse / t_read))
+        print("load from XML:          %7.3fs" % t_load)
+        print("load, write snapshot:   %7.3fs" % t_write)
+        print("load from snapshot:     %7.3fs (%.1fx)" % (t_reopen, t_load / t_reopen))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if sys.argv[1:] else DEFAULT_SIZE)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# vim:sw=4:et:
+"""Measure the cost of recording, undoing and redoing a big transaction.
+
+Usage:
+    python -m utils.benchmarks.bench_undo [count]
+
+A scripted transaction creates count classes (10k by default) in a
+package, names them, and deletes half of them again. The transaction is
+then undone and redone. Every step sends thousands of events, each of
+which records an undo action.
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from gaphor import UML
+from gaphor.application import Application
+from gaphor.transaction import Transaction
+
+DEFAULT_COUNT = 10000
+
+
+def script(factory, count):
+    package = factory.create(UML.Package)
+    classes = [factory.create(UML.Class) for n in range(count)]
+    for n, c in enumerate(classes):
+        c.name = "Class%d" % n
+        c.package = package
+    factory.unlink_many(classes[::2])
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if sys.argv[1:] else DEFAULT_COUNT
+
+    Application.init(
+        ["element_factory", "component_registry", "element_dispatcher", "undo_manager"]
+    )
+    factory = Application.get_service("element_factory")
+    undo_manager = Application.get_service("undo_manager")
+
+    t0 = time.time()
+    with Transaction():
+        script(factory, count)
+    t1 = time.time()
+    actions = len(undo_manager._undo_stack[-1]._actions)
+    undo_manager.undo_transaction()
+    t2 = time.time()
+    undo_manager.redo_transaction()
+    t3 = time.time()
+
+    print("%d elements, %d undo actions" % (count, actions))
+    print("%-12s %8.3fs" % ("transaction", t1 - t0))
+    print("%-12s %8.3fs" % ("undo", t2 - t1))
+    print("%-12s %8.3fs" % ("redo", t3 - t2))
+    Application.shutdown()
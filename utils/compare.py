@@ -5,6 +5,10 @@
 This can be called as:
     python compare.py model1.gaphor model2.gaphor
 
+To compare only some elements, give their ids with -e. Only those
+elements are read from the model files, using a model index:
+    python compare.py -e id1 -e id2 model1.gaphor model2.gaphor
+
 This file is part of Gaphor.
 """
 from __future__ import print_function
@@ -20,20 +24,22 @@ except ImportError:
 
 import gaphor.storage
 import gaphor.storage.parser
-import gaphor.UML
+from gaphor.storage.modelindex import ModelIndex
 
 
 class Compare(object):
     """This class makes it possible to compare two files.
     By default reports are printed to stdout in a diff-like syntax.
+
+    If ids are given, only the elements with those ids are compared.
     """
 
-    def __init__(self, filename1, filename2):
+    def __init__(self, filename1, filename2, ids=None):
         self.filename1 = filename1
         self.filename2 = filename2
 
-        self.elements1, self.factory1 = self.load(self.filename1)
-        self.elements2, self.factory2 = self.load(self.filename2)
+        self.elements1, self.names1 = self.load(self.filename1, ids)
+        self.elements2, self.names2 = self.load(self.filename2, ids)
 
         self.show_id = True
 
@@ -42,12 +48,12 @@ class Compare(object):
         """
         print(msg)
 
-    def report(self, factory, element, name=None, value=None, isref=False):
+    def report(self, names, element, name=None, value=None, isref=False):
         """Report an element that has differences.
         The attribute show_id can be set to False to suppress element ids.
         A fancy diff message is send to method out(msg).
         """
-        if factory is self.factory1:
+        if names is self.names1:
             msg = "-"
         else:
             msg = "+"
@@ -75,27 +81,34 @@ class Compare(object):
                 if isref:
                     if self.show_id:
                         msg += " = %s" % value
-                    obj = factory.lookup(value)
-                    if hasattr(obj, "name"):
-                        msg += " (%s)" % obj.name
+                    refname = names(value)
+                    if refname:
+                        msg += " (%s)" % refname
                 else:
                     msg += " = %s" % value
 
         self.out(msg)
 
-    def load(self, filename):
-        """Load the model file and create a factory.
-        A tuple (elements, factory) is returned.
+    def load(self, filename, ids=None):
+        """Parse the model file, or only the elements in ids.
+        A tuple (elements, names) is returned, names is a function that
+        returns the name of the element with the given id.
         """
-        elements = gaphor.storage.parser.parse(filename)
-        factory = gaphor.UML.ElementFactory()
-        try:
-            gaphor.storage.load_elements(elements, factory)
-        except Exception as e:
-            self.out("! File %s could not be loaded completely." % filename)
-            self.out("! Trying to diff on parsed elements only.")
-            self.out(e)
-        return elements, factory
+        if ids is None:
+            elements = gaphor.storage.parser.parse(filename)
+
+            def names(id):
+                element = elements.get(id)
+                return element and element.get("name")
+
+        else:
+            index = ModelIndex.open(filename)
+            elements = index.parse([id for id in ids if id in index])
+
+            def names(id):
+                return id in index and index.entry(id).name or None
+
+        return elements, names
 
     def elements_in_both_files(self):
         """Generator function that returns tuples (element1, element2) of
@@ -114,11 +127,11 @@ class Compare(object):
         keys2 = list(self.elements2.keys())
         for key in keys1:
             if key not in keys2:
-                self.report(self.factory1, self.elements1[key])
+                self.report(self.names1, self.elements1[key])
 
         for key in keys2:
             if key not in keys1:
-                self.report(self.factory2, self.elements2[key])
+                self.report(self.names2, self.elements2[key])
 
     def check_missing_references(self, element1, element2):
         """Report references to other elements that are present in one
@@ -128,11 +141,11 @@ class Compare(object):
         keys2 = list(element2.references.keys())
         for key in keys1:
             if key not in keys2:
-                self.report(self.factory1, element1, key)
+                self.report(self.names1, element1, key)
 
         for key in keys2:
             if key not in keys1:
-                self.report(self.factory2, element2, key)
+                self.report(self.names2, element2, key)
 
     def check_differences_references(self, element1, element2):
         keys1 = list(element1.references.keys())
@@ -144,26 +157,26 @@ class Compare(object):
                 try:
                     for val in val1:
                         if val not in val2:
-                            self.report(self.factory1, element1, key, val, True)
+                            self.report(self.names1, element1, key, val, True)
 
                     for val in val2:
                         if val not in val1:
-                            self.report(self.factory2, element2, key, val, True)
+                            self.report(self.names2, element2, key, val, True)
                 except TypeError:
                     if val1 != val2:
-                        self.report(self.factory1, element1, key, val1, True)
-                        self.report(self.factory2, element2, key, val2, True)
+                        self.report(self.names1, element1, key, val1, True)
+                        self.report(self.names2, element2, key, val2, True)
 
     def check_missing_values(self, element1, element2):
         keys1 = list(element1.values.keys())
         keys2 = list(element2.values.keys())
         for key in keys1:
             if key not in keys2:
-                self.report(self.factory1, element1, key)
+                self.report(self.names1, element1, key)
 
         for key in keys2:
             if key not in keys1:
-                self.report(self.factory2, element2, key)
+                self.report(self.names2, element2, key)
 
     def check_differences_values(self, element1, element2):
         keys1 = list(element1.values.keys())
@@ -173,8 +186,8 @@ class Compare(object):
                 val1 = element1.values.get(key)
                 val2 = element2.values.get(key)
                 if val1 != val2:
-                    self.report(self.factory1, element1, key, val1)
-                    self.report(self.factory2, element2, key, val2)
+                    self.report(self.names1, element1, key, val1)
+                    self.report(self.names2, element2, key, val2)
 
     def compare(self):
         """Start the comparison of the files provided to the constructor.
@@ -191,14 +204,18 @@ class Compare(object):
 if __name__ == "__main__":
     import sys
 
-    usage = "usage: %s [-v][-h|--help] old_model new_model" % sys.argv[0]
+    usage = "usage: %s [-v][-h|--help][-e id ...] old_model new_model" % sys.argv[0]
     files = []
+    ids = None
     show_id = False
 
     # Parse command line arguments:
-    for arg in sys.argv[1:]:
+    args = iter(sys.argv[1:])
+    for arg in args:
         if arg.startswith("-"):
-            if arg == "-v":
+            if arg == "-e":
+                ids = (ids or []) + [next(args)]
+            elif arg == "-v":
                 show_id = True
             elif arg in ("-h", "--help"):
                 print(usage)
@@ -214,6 +231,6 @@ if __name__ == "__main__":
         print(usage)
         sys.exit(1)
 
-    c = Compare(files[0], files[1])
+    c = Compare(files[0], files[1], ids)
     c.show_id = show_id
     c.compare()